@@ -2,6 +2,7 @@
 ASGI config for akvrix_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``gunicorn -c akvrix_project/gunicorn_asgi.py`` (Uvicorn workers).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -0,0 +1,17 @@
+"""Gunicorn settings for serving the ASGI application with Uvicorn workers.
+
+    gunicorn akvrix_project.asgi:application -c akvrix_project/gunicorn_asgi.py
+
+The async JSON APIs (cart, wishlist, reviews, addresses) then share each
+worker's event loop instead of holding a whole worker for their queries. Sync
+page views still work; Django runs them in a thread. Gunicorn takes the bind
+address from PORT and the worker count from WEB_CONCURRENCY, as it does under
+WSGI.
+"""
+import os
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+keepalive = 5
+# Async ORM calls run on worker threads that come and go; a connection kept
+# open on one of them would never be reused or closed
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
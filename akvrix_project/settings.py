@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     # allauth
     'allauth',
     'allauth.account',
@@ -74,10 +75,84 @@ WSGI_APPLICATION = 'akvrix_project.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default='postgres://localhost:5432/akvrix_db',
-        conn_max_age=600,
+        # Persistent connections are per thread; the ASGI profile sets 0
+        # because async views run their queries on short-lived threads.
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '600')),
     )
 }
 
+# Cache
+# Local memory is per process; point REDIS_URL at a shared Redis so every
+# worker sees the same data.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'akvrix',
+        }
+    }
+
+# Keep each signed-in visitor's header summary (cart count, wishlist) in the
+# cache (store/summary.py). Only safe with a cache every worker shares: a
+# write clears the summary in that cache only, so per-process copies would
+# go stale in the other workers.
+SUMMARY_CACHE = bool(os.environ.get('REDIS_URL'))
+
+# Housekeeping (store/housekeeping.py)
+# Expired sessions and orphaned anonymous cart/wishlist rows are deleted by
+# ``manage.py purge_expired``. Set HOUSEKEEPING_INTERVAL (seconds) to also
+# have each web worker run it in a background thread; with a shared cache
+# only one worker does the work per interval.
+HOUSEKEEPING_INTERVAL = int(os.environ.get('HOUSEKEEPING_INTERVAL', '0'))
+HOUSEKEEPING_BATCH_SIZE = int(os.environ.get('HOUSEKEEPING_BATCH_SIZE', '1000'))
+HOUSEKEEPING_PAUSE = float(os.environ.get('HOUSEKEEPING_PAUSE', '0.05'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'store.housekeeping': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Request profiling (store/profiling.py)
+# Off by default. When on, a PROFILE_SAMPLE_RATE share of requests are timed:
+# staff (everyone under DEBUG) get a Server-Timing header, and any that take
+# longer than PROFILE_SLOW_REQUEST_MS are logged with their slowest queries
+# and EXPLAIN plans. Raise the rate for a focused profiling session.
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'False').lower() == 'true'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0.01'))
+PROFILE_SLOW_REQUEST_MS = int(os.environ.get('PROFILE_SLOW_REQUEST_MS', '500'))
+PROFILE_SLOW_QUERIES = int(os.environ.get('PROFILE_SLOW_QUERIES', '3'))
+# Query parameters, query strings and the literals in EXPLAIN plans hold
+# customer data (emails, addresses, session keys, password hashes), so the
+# slow log leaves them out unless this is on
+PROFILE_LOG_PARAMS = os.environ.get('PROFILE_LOG_PARAMS', str(DEBUG)).lower() == 'true'
+PROFILE_LOG_FILE = Path(os.environ.get('PROFILE_LOG_FILE', BASE_DIR / 'logs' / 'slow_requests.log'))
+if PROFILE_REQUESTS:
+    MIDDLEWARE.insert(0, 'store.profiling.ProfilingMiddleware')
+    TEMPLATES[0]['BACKEND'] = 'store.profiling.TimedDjangoTemplates'
+    PROFILE_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # Rotation is per process; give each worker its own file if several share a disk
+    LOGGING['handlers']['slow_requests'] = {
+        'class': 'logging.handlers.RotatingFileHandler',
+        'filename': PROFILE_LOG_FILE,
+        'maxBytes': 5 * 1024 * 1024,
+        'backupCount': 5,
+        'encoding': 'utf-8',
+    }
+    LOGGING['loggers']['store.profiling'] = {'handlers': ['slow_requests'], 'level': 'INFO', 'propagate': False}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
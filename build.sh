@@ -6,8 +6,15 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate
 
-# Seed products if DB is fresh
-python manage.py seed_data
+# Add any catalog products that are new by slug; existing ones, and edits made
+# on the dashboard, are left alone, so this is a no-op on a repeat deploy
+python manage.py import_catalog store/data/catalog.jsonl --insert-only
+
+# Backfill the sales rollups the first time they are deployed
+python manage.py rebuild_rollups --if-empty
+
+# Rank best sellers from those rollups; refresh it periodically (e.g. an hourly cron)
+python manage.py rank_bestsellers
 
 # Create/reset single superuser — Akhil / Akhil@123
 python manage.py shell -c "
@@ -1,6 +1,6 @@
 /* ===== AKVRIX — Shared App Logic ===== */
 document.addEventListener('DOMContentLoaded', () => {
-    initLoader(); initNav(); initDarkMode(); initSearch(); updateCartBadge(); initAOS();
+    initLoader(); initNav(); initDarkMode(); initSearch(); updateCartBadge(); initAOS(); initInfiniteScroll();
 });
 
 function initLoader() {
@@ -59,6 +59,30 @@ function initSearch() {
     btn.addEventListener('click', () => { modal.classList.add('open'); input && input.focus(); });
     close && close.addEventListener('click', () => modal.classList.remove('open'));
     modal.addEventListener('click', e => { if (e.target === modal) modal.classList.remove('open'); });
+    const results = document.getElementById('searchResults');
+    if (!input || !results) return;
+    let timer = null, seq = 0;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const q = input.value.trim(), mine = ++seq;
+            if (q.length < 2) { results.innerHTML = ''; return; }
+            try {
+                const r = await fetch('/api/search/?q=' + encodeURIComponent(q));
+                const d = await r.json();
+                if (mine !== seq) return;
+                const seen = new Set();
+                const items = [...d.suggestions, ...d.results].filter(p => !seen.has(p.id) && seen.add(p.id));
+                results.innerHTML = items.length ? items.map(p => `<a href="${p.url}" class="search-result-item">
+                    <img src="${escapeHTML(p.image)}" alt="${escapeHTML(p.name)}">
+                    <div><h4>${escapeHTML(p.name)}</h4><span>₹${escapeHTML(p.price)}</span></div></a>`).join('')
+                    : '<p class="search-empty">No products found</p>';
+            } catch (e) { /* keep the previous results */ }
+        }, 200);
+    });
+    input.addEventListener('keydown', e => {
+        if (e.key === 'Enter' && input.value.trim()) window.location.href = '/shop/?q=' + encodeURIComponent(input.value.trim());
+    });
 }
 
 function updateCartBadge() {
@@ -76,6 +100,62 @@ function initAOS() {
     els.forEach(el => obs.observe(el));
 }
 
+function escapeHTML(s) {
+    return String(s ?? '').replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
+function productCardHTML(p) {
+    const badgeCls = p.badge === 'Limited' ? 'limited' : p.badge === 'New' ? 'new' : '';
+    return `<div class="product-card">
+        <div class="product-img-wrap">
+            ${p.sold_out ? '<span class="product-badge sold-out">Sold Out</span>'
+                : p.badge ? `<span class="product-badge ${badgeCls}">${escapeHTML(p.badge)}</span>` : ''}
+            <div class="product-wish"><button onclick="toggleWishlistAPI(${p.id}, this)"><i class="ri-heart-line"></i></button></div>
+            <a href="${p.url}">
+                <img src="${escapeHTML(p.image)}" alt="${escapeHTML(p.name)}" class="img-main">
+                ${p.image_hover ? `<img src="${escapeHTML(p.image_hover)}" alt="${escapeHTML(p.name)}" class="img-hover">` : ''}
+            </a>
+        </div>
+        <div class="product-info">
+            <h3><a href="${p.url}">${escapeHTML(p.name)}</a></h3>
+            <div class="product-price">
+                <span class="current">₹${p.price}</span>
+                ${p.old_price ? `<span class="old">₹${p.old_price}</span><span class="discount">-${p.discount_percent}%</span>` : ''}
+            </div>
+            <div class="product-rating">${p.rating} <i class="ri-star-fill"></i> <span>(${p.reviews_count})</span></div>
+            <div class="product-actions"><a href="${p.url}" class="btn btn-primary btn-sm btn-full">View Product</a></div>
+        </div>
+    </div>`;
+}
+
+function initInfiniteScroll() {
+    const grid = document.querySelector('[data-next-cursor]'), sentinel = document.getElementById('loadMore');
+    if (!grid || !sentinel) return;
+    let loading = false;
+    const obs = new IntersectionObserver(async entries => {
+        if (!entries[0].isIntersecting || loading || !grid.dataset.nextCursor) return;
+        loading = true;
+        const params = new URLSearchParams(window.location.search);
+        params.set('cursor', grid.dataset.nextCursor);
+        params.set('format', 'json');
+        try {
+            const res = await fetch(window.location.pathname + '?' + params.toString());
+            const data = await res.json();
+            grid.insertAdjacentHTML('beforeend', data.products.map(productCardHTML).join(''));
+            grid.dataset.nextCursor = data.next_cursor || '';
+            const count = document.getElementById('productCount');
+            if (count) count.textContent = grid.querySelectorAll('.product-card').length;
+            if (!data.next_cursor) {
+                obs.disconnect(); sentinel.remove();
+                if (count && count.nextSibling) count.nextSibling.textContent = ' products';
+            }
+        } finally {
+            loading = false;
+        }
+    }, { rootMargin: '600px 0px' });
+    obs.observe(sentinel);
+}
+
 function starsHTML(r) {
     let s = ''; for (let i = 1; i <= 5; i++) s += `<i class="ri-star-${i <= Math.floor(r) ? 'fill' : i - .5 <= r ? 'half-fill' : 'line'}"></i>`; return s;
 }
@@ -108,6 +188,40 @@ async function apiCall(url, data) {
     return json;
 }
 
+// Cart changes are queued and sent together to /api/cart/batch/ once clicks
+// pause, in order; the reply carries the whole repriced cart, announced as a
+// `cart:updated` event when nothing newer is waiting.
+const CART_BATCH_DELAY = 350;
+let cartOps = [], cartTimer = null, cartChain = Promise.resolve();
+
+function queueCartOp(op) {
+    cartOps.push(op);
+    clearTimeout(cartTimer);
+    cartTimer = setTimeout(flushCartOps, CART_BATCH_DELAY);
+}
+
+function flushCartOps() {
+    clearTimeout(cartTimer);
+    cartChain = cartChain.then(async () => {
+        const operations = cartOps.splice(0);
+        if (!operations.length) return;
+        const r = await apiCall('/api/cart/batch/', { operations });
+        if (!r.success) showToast(r.error || 'Could not update your cart', 'error');
+        if (r.cart && !cartOps.length) document.dispatchEvent(new CustomEvent('cart:updated', { detail: r.cart }));
+    }).catch(() => showToast('Could not update your cart', 'error'));
+    return cartChain;
+}
+
+// Leaving the page before the delay is up still sends what is queued
+window.addEventListener('pagehide', () => {
+    if (!cartOps.length) return;
+    fetch('/api/cart/batch/', {
+        method: 'POST', keepalive: true,
+        headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCookie('csrftoken') },
+        body: JSON.stringify({ operations: cartOps.splice(0) })
+    });
+});
+
 async function addToCartAPI(productId, size, color, quantity) {
     const r = await apiCall('/api/cart/add/', { product_id: productId, size, color, quantity });
     if (r.success) showToast('Added to cart!');
@@ -1,7 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
-from .models import Product, CartItem, Wishlist, Order, OrderItem, Review
+from .models import Product, ProductVariant, CartItem, Wishlist, Order, OrderItem, Review
+
+
+class ProductVariantInline(admin.TabularInline):
+    # Generated from the sizes/colors fields on save; only stock is edited here
+    model = ProductVariant
+    extra = 0
+    can_delete = False
+    readonly_fields = ('size', 'color', 'position')
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Product)
@@ -17,8 +28,17 @@ class ProductAdmin(admin.ModelAdmin):
         ('Pricing', {'fields': ('price', 'old_price', 'in_stock')}),
         ('Media', {'fields': ('image', 'image_hover')}),
         ('Variants', {'fields': ('sizes', 'colors')}),
-        ('Stats', {'fields': ('rating', 'reviews_count'), 'classes': ('collapse',)}),
+        ('Stats', {'fields': ('rating', 'reviews_count', 'rating_sum', 'stars_5', 'stars_4', 'stars_3', 'stars_2', 'stars_1'), 'classes': ('collapse',)}),
     )
+    # Maintained from the reviews; see store/ratings.py
+    readonly_fields = ('rating', 'reviews_count', 'rating_sum', 'stars_5', 'stars_4', 'stars_3', 'stars_2', 'stars_1')
+    inlines = [ProductVariantInline]
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save_details()
+        else:
+            obj.save()
 
 
 class OrderItemInline(admin.TabularInline):
@@ -1,11 +1,17 @@
 """Custom AKVRIX Admin Dashboard — linked to Django backend auth."""
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.db.models import Sum, Count
+from django.db.models import Count, F, Q, OuterRef, Subquery, Prefetch
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import Product, CartItem, Wishlist, Order, OrderItem, Review, Address
+from . import exports, rollups
+from .pagination import keyset_page, cursor_querystring, estimated_count, sort_querystring
+from datetime import datetime, time, timedelta
 import json
 
 
@@ -18,6 +24,33 @@ def admin_required(view_func):
     return wrapper
 
 
+def list_page(request, queryset, sorts, default_sort):
+    """One keyset page of an admin listing, plus the sort/pager/count context the templates share."""
+    sort = request.GET.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    total_count, count_exact = estimated_count(queryset)
+    page, next_cursor = keyset_page(queryset, sorts[sort], request.GET.get('cursor'))
+    return page, {
+        'current_sort': sort,
+        'sort_links': {name: sort_querystring(request, name) for name in sorts},
+        'total_count': total_count,
+        'count_exact': count_exact,
+        'next_query': cursor_querystring(request, next_cursor) if next_cursor else '',
+    }
+
+
+def day_start(value, days=0):
+    """Aware start of the day in a ``YYYY-MM-DD`` parameter, or None if it is not a date."""
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+
+
 def admin_login(request):
     ctx = {'error': ''}
     if request.user.is_authenticated and request.user.is_staff:
@@ -38,31 +71,57 @@ def admin_logout(request):
     return redirect('admin_login')
 
 
+DASHBOARD_DAYS = 14
+DASHBOARD_LIST_SIZE = 5
+
+
 @admin_required
 def admin_dashboard(request):
+    # Order, revenue and customer totals come from the sales rollups
+    totals = rollups.totals()
     ctx = {
         'total_products': Product.objects.count(),
-        'total_orders': Order.objects.count(),
-        'total_revenue': Order.objects.aggregate(t=Sum('total'))['t'] or 0,
+        'total_orders': totals['orders'],
+        'total_revenue': totals['revenue'],
         'total_reviews': Review.objects.count(),
-        'total_customers': User.objects.filter(is_staff=False).count(),
-        'recent_orders': Order.objects.order_by('-created_at')[:5],
-        'low_stock': Product.objects.filter(in_stock=False),
-        'top_products': Product.objects.order_by('-rating')[:5],
+        'total_customers': totals['customers'],
+        'recent_orders': Order.objects.order_by('-created_at')[:DASHBOARD_LIST_SIZE],
+        'low_stock': Product.objects.filter(in_stock=False).order_by('name')[:DASHBOARD_LIST_SIZE],
+        'top_products': Product.objects.order_by('-rating')[:DASHBOARD_LIST_SIZE],
+        'sales_days': rollups.daily_series(DASHBOARD_DAYS),
+        'dashboard_days': DASHBOARD_DAYS,
     }
     return render(request, 'store/admin/dashboard.html', ctx)
 
 
+PRODUCT_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'name': ('name', 'id'),
+    'name_desc': ('-name', '-id'),
+    'price': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+    'rating': ('-rating', '-id'),
+    'rating_asc': ('rating', 'id'),
+}
+
+
 @admin_required
 def admin_products(request):
-    products = Product.objects.all().order_by('-created_at')
-    cat = request.GET.get('cat')
+    products = Product.objects.defer('description', 'search_vector')
+    cat = request.GET.get('cat', '')
     if cat:
         products = products.filter(category=cat)
+    stock = request.GET.get('stock', '')
+    if stock in ('in', 'out'):
+        products = products.filter(in_stock=stock == 'in')
+    page, listing = list_page(request, products, PRODUCT_SORTS, 'newest')
     ctx = {
-        'products': products,
+        'products': page,
         'categories': Product.CATEGORY_CHOICES,
-        'current_cat': cat or '',
+        'current_cat': cat,
+        'current_stock': stock,
+        **listing,
     }
     return render(request, 'store/admin/products.html', ctx)
 
@@ -83,15 +142,13 @@ def admin_product_edit(request, product_id=None):
             'image_hover': data.get('image_hover', ''),
             'sizes': data.get('sizes', 'S,M,L,XL'),
             'colors': data.get('colors', '#000,#FFF'),
-            'rating': data.get('rating', 4.5),
-            'reviews_count': data.get('reviews_count', 0),
             'badge': data.get('badge', ''),
             'in_stock': data.get('in_stock') == 'on',
         }
         if product:
             for k, v in fields.items():
                 setattr(product, k, v)
-            product.save()
+            product.save_details()
         else:
             product = Product.objects.create(**fields)
         return redirect('admin_products')
@@ -112,20 +169,79 @@ def admin_product_delete(request, product_id):
     return render(request, 'store/admin/product_delete.html', {'product': product})
 
 
+ORDER_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'total': ('total', 'id'),
+    'total_desc': ('-total', '-id'),
+}
+ORDER_LIST_FIELDS = (
+    'order_number', 'first_name', 'last_name', 'email', 'item_count', 'total',
+    'payment_method', 'status', 'created_at',
+)
+
+
 @admin_required
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-    status = request.GET.get('status')
+    # item_count is denormalized on Order, so the list never touches OrderItem
+    orders = Order.objects.only(*ORDER_LIST_FIELDS)
+    status = request.GET.get('status', '')
     if status:
         orders = orders.filter(status=status)
+    payment = request.GET.get('payment', '')
+    if payment:
+        orders = orders.filter(payment_method=payment)
+    date_from = day_start(request.GET.get('from'))
+    if date_from:
+        orders = orders.filter(created_at__gte=date_from)
+    # Inclusive: everything before the start of the next day
+    date_to = day_start(request.GET.get('to'), days=1)
+    if date_to:
+        orders = orders.filter(created_at__lt=date_to)
+    page, listing = list_page(request, orders, ORDER_SORTS, 'newest')
     ctx = {
-        'orders': orders,
+        'orders': page,
         'status_choices': Order.STATUS_CHOICES,
-        'current_status': status or '',
+        'payment_choices': Order.PAYMENT_CHOICES,
+        'current_status': status,
+        'current_payment': payment,
+        'current_from': request.GET.get('from', '') if date_from else '',
+        'current_to': request.GET.get('to', '') if date_to else '',
+        'export_query': export_querystring(request),
+        **listing,
     }
     return render(request, 'store/admin/orders.html', ctx)
 
 
+def export_querystring(request):
+    """The list's date/status filters, for the export links."""
+    params = request.GET.copy()
+    for name in list(params):
+        if name not in ('status', 'from', 'to'):
+            del params[name]
+    return params.urlencode()
+
+
+@admin_required
+def admin_order_export(request):
+    """Stream the orders matching ?status=&from=&to= as CSV (default) or ?format=jsonl."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        fmt = 'csv'
+    orders = exports.orders(
+        status=request.GET.get('status', ''),
+        start=day_start(request.GET.get('from')),
+        end=day_start(request.GET.get('to'), days=1),
+    )
+    response = StreamingHttpResponse(
+        exports.streaming_content(request, exports.chunks(orders, fmt)),
+        content_type=exports.FORMATS[fmt][1],
+    )
+    stamp = timezone.now().strftime('%Y%m%d-%H%M')
+    response['Content-Disposition'] = f'attachment; filename="orders-{stamp}.{fmt}"'
+    return response
+
+
 @admin_required
 def admin_order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id)
@@ -146,17 +262,36 @@ def admin_order_detail(request, order_id):
         return redirect('admin_order_detail', order_id=order.id)
     ctx = {
         'order': order,
-        'items': order.items.all().select_related('product'),
+        'items': order.items.all(),
         'status_choices': Order.STATUS_CHOICES,
         'tracking_steps': order.get_tracking_steps(),
     }
     return render(request, 'store/admin/order_detail.html', ctx)
 
 
+REVIEW_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'oldest': ('created_at', 'id'),
+    'rating_desc': ('-rating', '-created_at', '-id'),
+    'rating': ('rating', 'created_at', 'id'),
+}
+
+
 @admin_required
 def admin_reviews(request):
-    reviews = Review.objects.all().order_by('-created_at').select_related('product')
-    ctx = {'reviews': reviews}
+    reviews = Review.objects.select_related('product').only(
+        'name', 'rating', 'text', 'created_at', 'product__name', 'product__slug')
+    rating = request.GET.get('rating', '')
+    if rating in ('1', '2', '3', '4', '5'):
+        reviews = reviews.filter(rating=int(rating))
+    else:
+        rating = ''
+    page, listing = list_page(request, reviews, REVIEW_SORTS, 'newest')
+    ctx = {
+        'reviews': page,
+        'current_rating': rating,
+        **listing,
+    }
     return render(request, 'store/admin/reviews.html', ctx)
 
 
@@ -165,7 +300,12 @@ def admin_review_edit(request, review_id):
     review = get_object_or_404(Review, id=review_id)
     if request.method == 'POST':
         review.name = request.POST.get('name', review.name).strip()
-        review.rating = int(request.POST.get('rating', review.rating))
+        try:
+            rating = int(request.POST.get('rating', review.rating))
+        except ValueError:
+            rating = review.rating
+        if 1 <= rating <= 5:
+            review.rating = rating
         review.text = request.POST.get('text', review.text).strip()
         review.save()
         return redirect('admin_reviews')
@@ -181,23 +321,42 @@ def admin_review_delete(request, review_id):
     return redirect('admin_reviews')
 
 
+CUSTOMER_SORTS = {
+    'joined': ('-date_joined', '-id'),
+    'spend': ('-total_spent', '-id'),
+    'recent': ('-last_active', '-id'),
+}
+
+
 @admin_required
 def admin_customers(request):
-    customers = User.objects.filter(is_staff=False).order_by('-date_joined')
-    customer_data = []
-    for c in customers:
-        orders = Order.objects.filter(user=c)
-        total_spent = orders.aggregate(t=Sum('total'))['t'] or 0
-        addresses = Address.objects.filter(user=c)
-        recent_orders = orders.order_by('-created_at')[:3]
-        wishlist_count = Wishlist.objects.filter(user=c).count()
-        customer_data.append({
-            'user': c,
-            'order_count': orders.count(),
-            'total_spent': total_spent,
-            'addresses': addresses,
-            'recent_orders': recent_orders,
-            'wishlist_count': wishlist_count,
-        })
-    ctx = {'customers': customer_data}
+    # Order totals come from CustomerStats (kept by rollups.py), whose indexes serve the spend/recent sorts
+    customers = User.objects.filter(is_staff=False, stats__isnull=False).annotate(
+        order_count=F('stats__order_count'),
+        total_spent=F('stats__total_spent'),
+        last_active=F('stats__last_active'),
+        wishlist_count=Coalesce(Subquery(
+            Wishlist.objects.filter(user=OuterRef('pk')).order_by().values('user')
+            .annotate(n=Count('id')).values('n')
+        ), 0),
+    ).prefetch_related(
+        'addresses',
+        Prefetch('order_set', queryset=Order.objects.order_by('-created_at')[:3], to_attr='recent_orders'),
+    )
+    q = request.GET.get('q', '').strip()
+    if q:
+        customers = customers.filter(
+            Q(username__icontains=q) | Q(email__icontains=q)
+            | Q(first_name__icontains=q) | Q(last_name__icontains=q)
+        )
+    sort = request.GET.get('sort', 'joined')
+    if sort not in CUSTOMER_SORTS:
+        sort = 'joined'
+    page, next_cursor = keyset_page(customers, CUSTOMER_SORTS[sort], request.GET.get('cursor'))
+    ctx = {
+        'customers': page,
+        'current_q': q,
+        'current_sort': sort,
+        'next_query': cursor_querystring(request, next_cursor) if next_cursor else '',
+    }
     return render(request, 'store/admin/customers.html', ctx)
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class StoreConfig(AppConfig):
     name = 'store'
+
+    def ready(self):
+        from . import housekeeping, signals  # noqa: F401
+        request_started.connect(housekeeping.start_scheduler, dispatch_uid='store.housekeeping')
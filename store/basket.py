@@ -0,0 +1,161 @@
+"""Anonymous visitors' cart and wishlist, kept in a signed cookie.
+
+A visitor who is not logged in gets no session and no CartItem/Wishlist rows.
+The cookie holds the cart lines as ``[product_id, size, color, quantity]`` and
+the wishlist product ids. It is signed, so it cannot be edited client-side,
+and compressed. On login or registration :func:`merge_into_user` moves
+everything into the user's rows in bulk, and the cookie is dropped.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from .models import CartItem, Product, Wishlist
+
+COOKIE_NAME = 'akv_basket'
+SALT = 'store.basket'
+MAX_AGE = 60 * 60 * 24 * 30
+# Keeps the cookie well under the 4 KB browser limit
+MAX_CART_LINES = 40
+MAX_WISHLIST = 60
+MAX_QUANTITY = 99
+
+
+class Basket:
+    """The cookie's contents; changes are written back by :meth:`save`."""
+
+    def __init__(self, cart=(), wishlist=()):
+        self.cart = {}
+        for product_id, size, color, quantity in cart:
+            self.cart[(product_id, size, color)] = min(max(quantity, 1), MAX_QUANTITY)
+        self.wishlist = list(dict.fromkeys(wishlist))
+        self.changed = False
+
+    @classmethod
+    def from_request(cls, request):
+        if not hasattr(request, '_basket'):
+            request._basket = cls.load(request.COOKIES.get(COOKIE_NAME))
+        return request._basket
+
+    @classmethod
+    def load(cls, value):
+        if not value:
+            return cls()
+        try:
+            data = signing.loads(value, salt=SALT, max_age=MAX_AGE)
+            return cls(
+                [(int(p), str(s), str(c), int(q)) for p, s, c, q in data.get('c', [])[:MAX_CART_LINES]],
+                [int(p) for p in data.get('w', [])[:MAX_WISHLIST]],
+            )
+        except (signing.BadSignature, ValueError, TypeError, AttributeError):
+            return cls()
+
+    def __bool__(self):
+        return bool(self.cart or self.wishlist)
+
+    @property
+    def count(self):
+        return sum(self.cart.values())
+
+    @property
+    def lines(self):
+        return [(p, s, c, q) for (p, s, c), q in self.cart.items()]
+
+    @staticmethod
+    def line_id(product_id, size, color):
+        """What ``update_cart`` takes as ``item_id`` for a cookie cart line."""
+        return f'{product_id}|{size}|{color}'
+
+    def add(self, product_id, size, color, quantity=1):
+        """Add to the cart; returns False if the cart has no room for another line."""
+        key = (product_id, size, color)
+        if key not in self.cart and len(self.cart) >= MAX_CART_LINES:
+            return False
+        self.cart[key] = min(self.cart.get(key, 0) + max(quantity, 1), MAX_QUANTITY)
+        self.changed = True
+        return True
+
+    @staticmethod
+    def parse_line_id(line_id):
+        """The ``(product_id, size, color)`` key for a :meth:`line_id`, or None."""
+        try:
+            product_id, size, color = str(line_id).split('|', 2)
+            return int(product_id), size, color
+        except ValueError:
+            return None
+
+    def update(self, line_id, action):
+        key = self.parse_line_id(line_id)
+        if key not in self.cart:
+            return
+        if action == 'increase':
+            self.cart[key] = min(self.cart[key] + 1, MAX_QUANTITY)
+        elif action == 'decrease' and self.cart[key] > 1:
+            self.cart[key] -= 1
+        elif action in ('decrease', 'remove'):
+            del self.cart[key]
+        self.changed = True
+
+    def toggle_wishlist(self, product_id):
+        """Add or remove ``product_id``; returns True if it was added."""
+        self.changed = True
+        if product_id in self.wishlist:
+            self.wishlist.remove(product_id)
+            return False
+        # Full: the oldest entry makes room
+        self.wishlist = (self.wishlist + [product_id])[-MAX_WISHLIST:]
+        return True
+
+    def clear(self):
+        self.changed = bool(self)
+        self.cart, self.wishlist = {}, []
+
+    def save(self, response):
+        if not self.changed:
+            return
+        if not self:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+            return
+        value = signing.dumps(
+            {'c': [list(line) for line in self.lines], 'w': self.wishlist}, salt=SALT, compress=True)
+        response.set_cookie(
+            COOKIE_NAME, value, max_age=MAX_AGE, httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+
+def merge_into_user(basket, user, session_key):
+    """Move ``basket`` into ``user``'s cart and wishlist.
+
+    Runs a fixed handful of queries however big the basket is: one to drop
+    products that no longer exist, and then, for the cart and the wishlist
+    each, one read plus bulk writes. Quantities of lines the user already
+    has are added together.
+    """
+    if not basket:
+        return
+    live = set(Product.objects.filter(
+        id__in={p for p, _, _ in basket.cart} | set(basket.wishlist),
+    ).values_list('id', flat=True))
+    with transaction.atomic():
+        lines = {key: qty for key, qty in basket.cart.items() if key[0] in live}
+        if lines:
+            existing = CartItem.objects.select_for_update().filter(
+                user=user, product_id__in={p for p, _, _ in lines})
+            merged = []
+            for item in existing:
+                qty = lines.pop((item.product_id, item.size, item.color), None)
+                if qty:
+                    item.quantity = min(item.quantity + qty, MAX_QUANTITY)
+                    merged.append(item)
+            CartItem.objects.bulk_update(merged, ['quantity'])
+            CartItem.objects.bulk_create([
+                CartItem(user=user, session_key=session_key, product_id=p, size=s, color=c, quantity=q)
+                for (p, s, c), q in lines.items()
+            ])
+        wanted = [p for p in basket.wishlist if p in live]
+        if wanted:
+            have = set(Wishlist.objects.filter(user=user, product_id__in=wanted).values_list('product_id', flat=True))
+            Wishlist.objects.bulk_create([
+                Wishlist(user=user, session_key=session_key, product_id=p) for p in wanted if p not in have
+            ])
@@ -0,0 +1,85 @@
+"""Best sellers: products ranked by how fast they are selling now.
+
+A product's score is its units sold per day, each day weighted by
+``0.5 ** (age / HALF_LIFE_DAYS)``. A sale counts half as much a week later,
+and days older than :data:`WINDOW_DAYS` are left out. The units come from
+the per-product-day sales rollup (rollups.py), which follows the order
+lines and leaves out cancelled orders, so :func:`rebuild` reads at most one
+row per product and day rather than every order line.
+
+Each category is ranked, and so is the whole catalog (category ``''``).
+Products that sold nothing in the window are not ranked. Run
+``rank_bestsellers`` periodically, e.g. hourly. ``home`` shows the top of
+the catalog ranking, and the shop's ``sort=bestselling`` puts a category's
+ranking first and the products it leaves out after it.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BestSeller, Product, ProductSalesDaily
+
+HALF_LIFE_DAYS = 7
+WINDOW_DAYS = 90
+ALL = ''
+# Place given to products the ranking leaves out, after every ranked one
+UNRANKED = 2 ** 31 - 1
+
+
+def rebuild(half_life=HALF_LIFE_DAYS, window=WINDOW_DAYS):
+    """Recompute every ranking; returns the number of products ranked."""
+    today = timezone.localdate()
+    rows = ProductSalesDaily.objects.filter(
+        day__gt=today - timedelta(days=window), product__isnull=False, units__gt=0,
+    ).values_list('product_id', 'product__category', 'day', 'units')
+    scores, categories = defaultdict(float), {}
+    for product_id, category, day, units in rows.iterator(chunk_size=10000):
+        scores[product_id] += units * 0.5 ** ((today - day).days / half_life)
+        categories[product_id] = category
+    # Fastest first; the newer product wins a tie
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+    places = defaultdict(list)
+    for product_id, score in ranked:
+        for scope in (ALL, categories[product_id]):
+            places[scope].append(BestSeller(
+                category=scope, product_id=product_id, rank=len(places[scope]), score=score))
+    with transaction.atomic():
+        # Products deleted while the sales were read would fail the foreign key
+        live = set(Product.objects.filter(pk__in=scores.keys()).values_list('pk', flat=True))
+        BestSeller.objects.all().delete()
+        BestSeller.objects.bulk_create(
+            [row for rows in places.values() for row in rows if row.product_id in live], batch_size=1000)
+    return len(live)
+
+
+def ranking(category=None, limit=None):
+    """Product ids of ``category`` (or of the whole catalog), fastest-selling first; at most ``limit``."""
+    ids = BestSeller.objects.filter(category=category or ALL).order_by('rank').values_list('product_id', flat=True)
+    return list(ids[:limit] if limit is not None else ids)
+
+
+def places(category=None, after=-1, limit=None):
+    """``(rank, product_id)`` of the ranking of ``category`` after place ``after``, in order; at most ``limit``.
+
+    Read on the (category, rank) index, so a shop page reads a window of the
+    ranking rather than all of it.
+    """
+    rows = BestSeller.objects.filter(category=category or ALL, rank__gt=after).order_by('rank')
+    rows = rows.values_list('rank', 'product_id')
+    return list(rows[:limit] if limit is not None else rows)
+
+
+def ranked_among(product_ids, category=None):
+    """The ids in ``product_ids`` that the ranking of ``category`` holds."""
+    return set(BestSeller.objects.filter(category=category or ALL, product_id__in=product_ids)
+               .values_list('product_id', flat=True))
+
+
+def annotate_place(products, category=None):
+    """``products`` with ``bestseller_place``: their place in the ranking of ``category``, or UNRANKED."""
+    place = BestSeller.objects.filter(category=category or ALL, product_id=OuterRef('pk')).values('rank')[:1]
+    return products.annotate(bestseller_place=Coalesce(Subquery(place), Value(UNRANKED)))
@@ -0,0 +1,174 @@
+"""Batch cart mutations, answered with the repriced cart.
+
+The cart page queues quantity clicks and sends them together to
+``cart_batch``. :func:`apply` folds the whole list into net quantities in
+memory, under a lock on the user's cart rows. It then writes them with at
+most three statements: one UPDATE (a CASE over the changed rows), one
+DELETE and one INSERT. Nothing is re-read afterwards. :func:`state` prices
+the result from the products loaded with the rows.
+"""
+from django.db import transaction
+
+from . import checkout
+from .basket import MAX_CART_LINES, MAX_QUANTITY, Basket
+from .models import CartItem, Product
+
+MAX_OPERATIONS = 50
+ITEM_OPERATIONS = ('increase', 'decrease', 'remove', 'set')
+
+
+class InvalidOperation(ValueError):
+    pass
+
+
+def parse(operations):
+    """Validate a request's operation list; raises InvalidOperation.
+
+    Each one is ``{'op': 'add', 'product_id', 'size', 'color', 'quantity'}``
+    or ``{'op': 'increase'|'decrease'|'remove'|'set', 'item_id'}``, where
+    ``set`` also takes a ``quantity`` (0 removes the line).
+    """
+    if not isinstance(operations, list) or not 0 < len(operations) <= MAX_OPERATIONS:
+        raise InvalidOperation(f'Send between 1 and {MAX_OPERATIONS} operations.')
+    parsed = []
+    for op in operations:
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind != 'add' and kind not in ITEM_OPERATIONS:
+            raise InvalidOperation(f'Unknown operation {kind!r}.')
+        try:
+            if kind == 'add':
+                variant = (int(op['product_id']), str(op.get('size', 'M')), str(op.get('color', '#000')))
+                parsed.append((kind, variant, max(int(op.get('quantity', 1)), 1)))
+            else:
+                parsed.append((kind, op['item_id'], max(int(op.get('quantity', 0)), 0)))
+        except (KeyError, TypeError, ValueError) as exc:
+            raise InvalidOperation('Malformed operation.') from exc
+    return parsed
+
+
+def _fold(quantities, operations, resolve):
+    """Apply parsed ``operations`` in order to ``quantities``, in place.
+
+    ``quantities`` maps a line key to its quantity, and 0 means removed.
+    ``resolve.item`` turns an ``item_id`` into a key (None if unknown).
+    ``resolve.variant`` gives the key of the line already holding a
+    ``(product_id, size, color)``, so adding it again tops that line up.
+    """
+    for kind, target, quantity in operations:
+        if kind == 'add':
+            key = resolve.variant(target)
+            quantities[key] = quantities.get(key, 0) + quantity
+            continue
+        key = resolve.item(target)
+        if not quantities.get(key):
+            continue
+        if kind == 'increase':
+            quantities[key] += 1
+        elif kind == 'decrease':
+            quantities[key] -= 1
+        elif kind == 'remove':
+            quantities[key] = 0
+        else:
+            quantities[key] = quantity
+
+
+class _ItemKeys:
+    """Keys of a user's cart rows: the row id, or the variant for a line not yet created."""
+
+    def __init__(self, items):
+        self.ids = {item.pk for item in items}
+        self.variants = {}
+        for item in items:
+            self.variants.setdefault((item.product_id, item.size, item.color), item.pk)
+
+    def variant(self, variant):
+        return self.variants.get(variant, variant)
+
+    def item(self, item_id):
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        return item_id if item_id in self.ids else None
+
+
+class _BasketKeys:
+    @staticmethod
+    def variant(variant):
+        return variant
+
+    @staticmethod
+    def item(line_id):
+        return Basket.parse_line_id(line_id)
+
+
+def apply(user, operations, session_key=''):
+    """Apply parsed ``operations`` to ``user``'s cart in one transaction; returns :func:`state`."""
+    with transaction.atomic():
+        items = list(CartItem.objects.filter(user=user).select_related('product')
+                     .select_for_update(of=('self',)).order_by('pk'))
+        quantities = {item.pk: item.quantity for item in items}
+        _fold(quantities, operations, _ItemKeys(items))
+
+        # Same limits as the cookie basket (see apply_to_basket)
+        kept, changed = [], []
+        for item in items:
+            quantity = min(quantities[item.pk], MAX_QUANTITY)
+            if quantity and quantity != item.quantity:
+                item.quantity = quantity
+                changed.append(item)
+            if quantity:
+                kept.append(item)
+        removed = [item.pk for item in items if not quantities[item.pk]]
+        wanted = {key: q for key, q in quantities.items() if isinstance(key, tuple) and q}
+        products = Product.objects.in_bulk({key[0] for key in wanted}) if wanted else {}
+        created = [
+            CartItem(user=user, session_key=session_key, product=products[p], size=s, color=c,
+                     quantity=min(q, MAX_QUANTITY))
+            for (p, s, c), q in wanted.items() if p in products
+        ][:max(MAX_CART_LINES - len(kept), 0)]
+
+        if changed:
+            CartItem.objects.bulk_update(changed, ['quantity'])
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if created:
+            CartItem.objects.bulk_create(created)
+    return state(kept + created)
+
+
+def apply_to_basket(basket, operations):
+    """:func:`apply` for an anonymous visitor's cookie basket; the caller saves it."""
+    quantities = dict(basket.cart)
+    _fold(quantities, operations, _BasketKeys)
+    products = Product.objects.in_bulk({key[0] for key, q in quantities.items() if q})
+    cart = {}
+    for key, quantity in quantities.items():
+        if quantity and key[0] in products and len(cart) < MAX_CART_LINES:
+            cart[key] = min(quantity, MAX_QUANTITY)
+    basket.cart = cart
+    basket.changed = True
+    return state([
+        CartItem(product=products[p], size=s, color=c, quantity=q) for (p, s, c), q in cart.items()
+    ])
+
+
+def state(lines):
+    """The cart as JSON: its lines, item count, subtotal, shipping and total."""
+    subtotal = sum(line.total for line in lines)
+    shipping = checkout.shipping_for(subtotal)
+    return {
+        'lines': [
+            {
+                'id': line.pk or Basket.line_id(line.product_id, line.size, line.color),
+                'product_id': line.product_id, 'name': line.product.name, 'slug': line.product.slug,
+                'image': line.product.image, 'price': line.product.price,
+                'size': line.size, 'color': line.color, 'quantity': line.quantity, 'total': line.total,
+            }
+            for line in lines
+        ],
+        'count': sum(line.quantity for line in lines),
+        'subtotal': subtotal,
+        'shipping': shipping,
+        'total': subtotal + shipping,
+    }
@@ -0,0 +1,53 @@
+"""Storefront catalog listing: sort orders, card projection and JSON shape."""
+from django.urls import reverse
+
+from . import inventory
+from .models import Product
+from .pagination import keyset_page
+
+# Columns rendered by the product card, plus the sort keys and ``updated_at``
+# (the fragment-cache version). Leaves out the long ``description`` and
+# anything only the detail page needs.
+CARD_FIELDS = (
+    'id', 'name', 'slug', 'price', 'old_price', 'category', 'image', 'image_hover',
+    'rating', 'reviews_count', 'badge', 'in_stock', 'created_at', 'updated_at',
+)
+
+# Keyset orderings per ``?sort=``; each ends in ``id`` so the cursor is unique.
+SORT_ORDERINGS = {
+    'featured': ('id',),
+    'low': ('price', 'id'),
+    'high': ('-price', '-id'),
+    'newest': ('-created_at', '-id'),
+    'rating': ('-rating', '-id'),
+}
+
+
+def listing_queryset(category=None):
+    products = Product.objects.only(*CARD_FIELDS).annotate(sold_out=inventory.sold_out())
+    if category:
+        products = products.filter(category=category)
+    return products
+
+
+def product_page(products, sort, cursor=None):
+    """Return ``(products, next_cursor)`` for one page of the listing."""
+    ordering = SORT_ORDERINGS.get(sort, SORT_ORDERINGS['featured'])
+    return keyset_page(products, ordering, cursor)
+
+
+def card_json(p):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'url': reverse('product_detail', args=[p.slug]),
+        'price': str(p.price),
+        'old_price': str(p.old_price) if p.old_price else None,
+        'discount_percent': p.discount_percent,
+        'image': p.image,
+        'image_hover': p.image_hover,
+        'rating': p.rating,
+        'reviews_count': p.reviews_count,
+        'badge': p.badge,
+        'sold_out': p.sold_out,
+    }
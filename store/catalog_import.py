@@ -0,0 +1,193 @@
+"""Catalog import: upsert products by ``slug`` from CSV or JSON Lines.
+
+The file is read one row at a time, and rows are applied in batches of
+:data:`BATCH_SIZE`. For each batch, one query loads the products that already
+have those slugs. New slugs go in with one bulk INSERT. Products that differ
+get one bulk UPDATE of the changed columns. Identical rows are not written,
+so their ``updated_at``, and with it every cached fragment, stays as it is.
+Nothing is ever deleted, so orders, reviews and carts keep their products.
+
+A row needs a ``slug``. New products also need every :data:`REQUIRED` field.
+Any :data:`FIELDS` column that is missing, or an empty cell in a column that
+cannot be blank, keeps its current value (or the model default). Other columns are ignored. The review aggregates are
+derived, so they cannot be imported.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CatalogVersion, Product, ProductVariant
+
+BATCH_SIZE = 500
+FIELDS = (
+    'slug', 'name', 'category', 'price', 'old_price', 'badge', 'sizes', 'colors',
+    'image', 'image_hover', 'description', 'in_stock',
+)
+REQUIRED = ('name', 'category', 'price', 'image', 'description')
+FORMATS = ('csv', 'jsonl')
+TRUE, FALSE = {'1', 'true', 't', 'yes', 'y'}, {'0', 'false', 'f', 'no', 'n'}
+
+
+def read(stream, fmt):
+    """Yield ``(line number, raw row dict)`` from an open text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Line the row ends on, so quoted multi-line descriptions still point right
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = exc
+        yield number, row
+
+
+def clean(row):
+    """The importable values of a raw row as Python values; raises ValidationError."""
+    if not isinstance(row, dict):
+        raise ValidationError(f'Not a JSON object ({row})' if isinstance(row, ValueError) else 'Not a JSON object')
+    values, errors = {}, {}
+    for name in FIELDS:
+        if name not in row:
+            continue
+        field, value = Product._meta.get_field(name), row[name]
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '' and not field.blank:
+                # An empty CSV cell where a value is required means "no change"
+                continue
+            if field.get_internal_type() == 'BooleanField':
+                if value.lower() not in TRUE | FALSE:
+                    errors[name] = [f'Expected true or false, not {value!r}.']
+                    continue
+                value = value.lower() in TRUE
+            elif value == '' and field.null:
+                value = None
+        try:
+            values[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    if 'slug' not in values and 'slug' not in errors:
+        errors['slug'] = ['This field is required.']
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def validate(rows):
+    """Check every raw row before anything is written.
+
+    Returns ``(count, errors)`` where errors are ``(line, message)`` pairs.
+    A slug that appears twice is an error on its second line, and so is a
+    row for a new product that lacks a :data:`REQUIRED` field.
+    """
+    seen, partial, errors, count = {}, {}, [], 0
+    for line, row in rows:
+        count += 1
+        try:
+            values = clean(row)
+        except ValidationError as exc:
+            errors.append((line, ' '.join(
+                f'{name}: {" ".join(messages)}' for name, messages in exc.message_dict.items()
+            ) if hasattr(exc, 'error_dict') else ' '.join(exc.messages)))
+            continue
+        first = seen.setdefault(values['slug'], line)
+        if first != line:
+            errors.append((line, f'slug: {values["slug"]!r} already appears on line {first}.'))
+        elif not set(REQUIRED) <= values.keys():
+            partial[values['slug']] = line
+    # Rows without every required field are only valid as updates
+    slugs = list(partial)
+    for i in range(0, len(slugs), BATCH_SIZE):
+        known = set(Product.objects.filter(slug__in=slugs[i:i + BATCH_SIZE]).values_list('slug', flat=True))
+        errors += [
+            (partial[slug], f'A new product needs {", ".join(REQUIRED)}.')
+            for slug in slugs[i:i + BATCH_SIZE] if slug not in known
+        ]
+    return count, sorted(errors)
+
+
+def _batches(rows, size):
+    batch = []
+    for line, row in rows:
+        batch.append((line, clean(row)))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _describe(value):
+    return '-' if value is None or value == '' else str(value)
+
+
+def upsert(rows, batch_size=BATCH_SIZE, dry_run=False, insert_only=False, diff=None):
+    """Apply raw ``rows`` (from :func:`read`, already passed through :func:`validate`).
+
+    Returns ``{'inserted', 'updated', 'unchanged'}`` counts. With ``dry_run``
+    nothing is written, and the counts say what would have been. ``diff`` is
+    called with one line per inserted product and per changed field.
+    With ``insert_only``, products that already exist are left as they are
+    and counted as unchanged.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            existing = Product.objects.only('id', *FIELDS).in_bulk(
+                [values['slug'] for _, values in batch], field_name='slug')
+            created, changed, resized, fields = [], [], [], set()
+            for line, values in batch:
+                product = existing.get(values['slug'])
+                if product is None:
+                    missing = [name for name in REQUIRED if name not in values]
+                    if missing:
+                        raise ValidationError(f'Line {line}: a new product needs {", ".join(missing)}.')
+                    created.append(Product(**values))
+                    if diff:
+                        diff(f'+ {values["slug"]}')
+                    continue
+                if insert_only:
+                    counts['unchanged'] += 1
+                    continue
+                updates = {name: value for name, value in values.items() if getattr(product, name) != value}
+                if not updates:
+                    counts['unchanged'] += 1
+                    continue
+                for name, value in updates.items():
+                    if diff:
+                        diff(f'~ {product.slug}: {name} {_describe(getattr(product, name))} -> {_describe(value)}')
+                    setattr(product, name, value)
+                changed.append(product)
+                fields |= updates.keys()
+                if {'sizes', 'colors'} & updates.keys():
+                    resized.append(product)
+            counts['inserted'] += len(created)
+            counts['updated'] += len(changed)
+            if dry_run:
+                continue
+            if created:
+                Product.objects.bulk_create(created)
+            if changed:
+                # bulk_update leaves auto_now alone; the fragment caches key on it
+                now = timezone.now()
+                for product in changed:
+                    product.updated_at = now
+                Product.objects.bulk_update(changed, sorted(fields) + ['updated_at'])
+            if created or resized:
+                ProductVariant.sync(created + resized)
+            if created or changed:
+                CatalogVersion.bump()
+    return counts
+
+
+def report(counts, seconds, dry_run=False):
+    summary = ', '.join(f'{count} {kind}' for kind, count in counts.items())
+    return f'{"Dry run, would have: " if dry_run else ""}{summary} in {seconds:.2f}s'
@@ -0,0 +1,110 @@
+"""Checkout pipeline: turns a cart into an order inside one transaction."""
+import uuid
+
+from django.db import transaction
+
+from . import inventory, rollups
+from .models import CartItem, Order, OrderItem, Product
+
+FREE_SHIPPING_OVER = 150
+SHIPPING_FEE = 12
+
+CUSTOMER_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone', 'address',
+    'city', 'state', 'zip_code',
+)
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def shipping_for(subtotal):
+    return 0 if subtotal > FREE_SHIPPING_OVER else SHIPPING_FEE
+
+
+def customer_fields(data):
+    """Pick the Order contact/shipping columns out of a checkout payload."""
+    fields = {name: data.get(name, '') for name in CUSTOMER_FIELDS}
+    fields['country'] = data.get('country', 'India')
+    fields['payment_method'] = data.get('payment_method', 'card')
+    return fields
+
+
+def format_order_number(order_id):
+    """Derive the public order number from the primary key.
+
+    Unique by construction (no random draw to collide and retry) and sorts in
+    creation order. Eight digits keeps it clear of the legacy ``AKV-123456``
+    numbers.
+    """
+    return f'AKV-{order_id:08d}'
+
+
+def place_order(cart_items, customer, user=None, session_key=''):
+    """Create an Order from ``cart_items`` (a CartItem queryset) and empty the cart.
+
+    The cart rows are locked for the whole transaction, so a double-submitted
+    checkout finds an empty cart instead of creating a second order. Products
+    are not locked. Only the rows of stock-tracked variants are, and only by
+    the UPDATE that takes their stock, so buyers wait only for buyers of the
+    same variant. Raises inventory.OutOfStock, leaving the cart as it was.
+    """
+    with transaction.atomic():
+        items = list(cart_items.select_related('product').select_for_update(of=('self',))
+                     .annotate(available=inventory.units_left()))
+        if not items:
+            raise EmptyCart
+        order = _create_order(items, customer, user, session_key)
+        CartItem.objects.filter(pk__in=[i.pk for i in items]).delete()
+    return order
+
+
+def place_guest_order(lines, customer):
+    """Create an Order from a basket cookie's ``(product_id, size, color, quantity)`` lines.
+
+    Lines whose product no longer exists are dropped. Nothing is written for
+    the cart itself; the caller clears the cookie.
+    """
+    products = Product.objects.in_bulk({line[0] for line in lines})
+    items = [
+        CartItem(product=products[product_id], size=size, color=color, quantity=quantity)
+        for product_id, size, color, quantity in lines if product_id in products
+    ]
+    if not items:
+        raise EmptyCart
+    left = inventory.availability((i.product_id, i.size, i.color) for i in items)
+    for i in items:
+        i.available = left.get((i.product_id, i.size, i.color))
+    with transaction.atomic():
+        return _create_order(items, customer)
+
+
+def _create_order(items, customer, user=None, session_key=''):
+    """Order and order lines for ``items`` (CartItems with their products loaded)."""
+    inventory.reserve(items)
+    subtotal = sum(i.total for i in items)
+    shipping = shipping_for(subtotal)
+    order = Order.objects.create(
+        session_key=session_key, user=user,
+        # Placeholder until the id exists; replaced before the transaction commits
+        order_number=uuid.uuid4().hex[:20],
+        subtotal=subtotal, shipping=shipping, total=subtotal + shipping,
+        item_count=sum(i.quantity for i in items),
+        items_preview=Order.build_preview((i.product.name, i.quantity) for i in items),
+        **customer,
+    )
+    order.order_number = format_order_number(order.pk)
+    Order.objects.filter(pk=order.pk).update(order_number=order.order_number)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order, product=i.product, product_name=i.product.name,
+            product_slug=i.product.slug, product_image=i.product.image,
+            price=i.product.price, size=i.size, color=i.color, quantity=i.quantity,
+        )
+        for i in items
+    ])
+    rollups.order_placed(order, [
+        (i.product_id, i.product.category, i.quantity, i.total) for i in items
+    ])
+    return order
@@ -0,0 +1,109 @@
+"""Conditional GET (ETag / Last-Modified) for the pages customers reload most.
+
+Each page has a version that one small query reads, before any of the
+page's own queries run:
+
+* ``shop`` and ``product_detail`` use the catalog version, a counter that
+  every write to products or variants bumps in its own transaction (see
+  CatalogVersion): edits, imports, deletes, reviews (ratings.py) and
+  selling out or restocking (inventory.py).
+* ``shop`` sorted by best sellers also uses the newest BestSeller id,
+  which every rebuild of the ranking moves (bestsellers.py).
+  ``product_detail`` likewise uses the newest ProductNeighbour id for its
+  related products (recommendations.py).
+* ``order_detail_page`` uses the order's ``updated_at``, which every status
+  or tracking change moves, and the newest ``updated_at`` of its products,
+  whose current slugs it links to.
+
+The ETag also covers what the page shows about the viewer: who is signed
+in, the cart count and wishlist from the cached summary, and the CSRF
+cookie that the page's token was made for. When ``If-None-Match`` matches,
+the view does not run and the answer is a 304. Responses are
+``Cache-Control: private, no-cache`` with ``Vary: Cookie``. Browsers keep
+them but revalidate every time, and shared caches never serve one visitor's
+page to another.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import BestSeller, CatalogVersion, Order, ProductNeighbour
+from .summary import get_summary
+
+
+def catalog_version(request, *args, **kwargs):
+    # Read once per request: the catalog snapshot (snapshot.py) checks it too
+    if not hasattr(request, '_catalog_version'):
+        request._catalog_version = CatalogVersion.current()
+    return request._catalog_version
+
+
+# The catalog version is a counter, not a time, so catalog pages send no
+# Last-Modified: only the ETag can match.
+
+def listing_version(request, *args, **kwargs):
+    if request.GET.get('sort') == 'bestselling':
+        return None, catalog_version(request), BestSeller.objects.aggregate(ranked=Max('id'))['ranked']
+    return None, catalog_version(request)
+
+
+def product_version(request, *args, **kwargs):
+    return None, catalog_version(request), ProductNeighbour.objects.aggregate(built=Max('id'))['built']
+
+
+def order_version(request, order_number):
+    if not request.user.is_authenticated:
+        return None
+    # The page links to its products by their current slugs, so their edits count too
+    stamp = Order.objects.filter(order_number=order_number, user=request.user).annotate(
+        products=Max('items__product__updated_at')).values_list('updated_at', 'products').first()
+    if stamp is None:
+        return None
+    latest, products = stamp
+    return max(latest, products or latest), latest, products
+
+
+def _viewer(request):
+    summary = get_summary(request)
+    user = request.user
+    who = (user.pk, user.get_full_name(), user.email) if user.is_authenticated else None
+    return who, summary['cart_count'], sorted(summary['wishlist_ids']), request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+
+
+def conditional(version):
+    """Answer GETs of the view with 304 while ``version(request, *args)`` and the viewer are unchanged.
+
+    ``version`` returns a tuple whose first item is the Last-Modified time,
+    or None when there is nothing to compare (the view then runs as usual).
+    """
+    def read(request, *args, **kwargs):
+        # Read once per request, shared by the ETag and Last-Modified checks
+        if not hasattr(request, '_page_version'):
+            request._page_version = version(request, *args, **kwargs)
+        return request._page_version
+
+    def etag(request, *args, **kwargs):
+        stamp = read(request, *args, **kwargs)
+        if stamp is None:
+            return None
+        return hashlib.blake2b(repr((stamp, _viewer(request))).encode(), digest_size=16).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        stamp = read(request, *args, **kwargs)
+        return stamp[0] if stamp else None
+
+    def decorator(view):
+        conditioned = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditioned(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapped
+    return decorator
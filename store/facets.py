@@ -0,0 +1,163 @@
+"""Shop sidebar filters (size, color, price, discount) and their facet counts.
+
+Size and color filters run against the indexed ``ProductVariant`` rows. The
+sidebar counts for every facet come back from a single UNION ALL of grouped
+counts. Each facet is counted with the other facets' filters applied but not
+its own, so picking one size still shows what the other sizes would add.
+
+:func:`matcher` and :func:`card_facet_counts` do the same over the cards of
+the in-memory catalog snapshot (snapshot.py), without a query.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, CharField, Count, Exists, F, OuterRef, Q, Value, When
+
+from .models import Product, ProductVariant
+
+# (key, label, lower bound, upper bound) -- the bounds are half-open
+PRICE_BUCKETS = (
+    ('0-100', 'Under ₹100', None, 100),
+    ('100-200', '₹100 – ₹200', 100, 200),
+    ('200-300', '₹200 – ₹300', 200, 300),
+    ('300-', '₹300 & above', 300, None),
+)
+PRICE_LABELS = {key: label for key, label, _, _ in PRICE_BUCKETS}
+
+# Display order for the size facet; unknown sizes sort after these
+SIZE_ORDER = ('XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', 'XXXL')
+
+def parse_filters(params):
+    """Read the filter selection out of ``request.GET``."""
+    return {
+        'sizes': params.getlist('size'),
+        'colors': params.getlist('color'),
+        'prices': [p for p in params.getlist('price') if p in PRICE_LABELS],
+        'sale': params.get('sale') == '1',
+    }
+
+
+def _price_q(keys):
+    q = Q()
+    for key, _, low, high in PRICE_BUCKETS:
+        if key in keys:
+            bucket = Q()
+            if low is not None:
+                bucket &= Q(price__gte=Decimal(low))
+            if high is not None:
+                bucket &= Q(price__lt=Decimal(high))
+            q |= bucket
+    return q
+
+
+def apply_filters(products, filters):
+    if filters['sizes'] or filters['colors']:
+        # Size and color must match on the same variant
+        variants = ProductVariant.objects.filter(product=OuterRef('pk'))
+        if filters['sizes']:
+            variants = variants.filter(size__in=filters['sizes'])
+        if filters['colors']:
+            variants = variants.filter(color__in=filters['colors'])
+        products = products.filter(Exists(variants))
+    if filters['prices']:
+        products = products.filter(_price_q(filters['prices']))
+    if filters['sale']:
+        products = products.filter(old_price__gt=F('price'))
+    return products
+
+
+def _ids(products, filters, **drop):
+    return apply_filters(products, {**filters, **drop}).values('pk')
+
+
+def facet_counts(products, filters):
+    """Facet counts for the sidebar, read in one query.
+
+    ``products`` is the listing before the sidebar filters (category and
+    search already applied).
+    """
+    label = CharField()
+    size_rows = ProductVariant.objects.filter(
+        product__in=_ids(products, filters, sizes=[], colors=[]))
+    if filters['colors']:
+        size_rows = size_rows.filter(color__in=filters['colors'])
+    color_rows = ProductVariant.objects.filter(
+        product__in=_ids(products, filters, sizes=[], colors=[]))
+    if filters['sizes']:
+        color_rows = color_rows.filter(size__in=filters['sizes'])
+    price_bucket = Case(
+        *[When(_price_q([key]), then=Value(key)) for key, _, _, _ in PRICE_BUCKETS],
+        output_field=label,
+    )
+    rows = size_rows.values(facet=Value('size', output_field=label), value=F('size')).annotate(
+        n=Count('product_id', distinct=True),
+    ).union(
+        color_rows.values(facet=Value('color', output_field=label), value=F('color')).annotate(
+            n=Count('product_id', distinct=True)),
+        Product.objects.filter(pk__in=_ids(products, filters, prices=[])).values(
+            facet=Value('price', output_field=label), value=price_bucket).annotate(n=Count('pk')),
+        Product.objects.filter(pk__in=_ids(products, filters, sale=False), old_price__gt=F('price')).values(
+            facet=Value('sale', output_field=label), value=Value('1', output_field=label)).annotate(n=Count('pk')),
+        all=True,
+    )
+    counts = {'size': {}, 'color': {}, 'price': {}, 'sale': {}}
+    for row in rows:
+        counts[row['facet']][row['value']] = row['n']
+    return _sidebar(counts, filters)
+
+
+def _price_bucket(price):
+    for key, _, low, high in PRICE_BUCKETS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return key
+    return None
+
+
+def matcher(filters):
+    """Predicate for snapshot cards (see snapshot.py); the in-memory twin of :func:`apply_filters`."""
+    sizes, colors, prices = set(filters['sizes']), set(filters['colors']), set(filters['prices'])
+
+    def match(card):
+        if (sizes or colors) and not any(
+                (not sizes or size in sizes) and (not colors or color in colors) for size, color in card.variants):
+            return False
+        if prices and _price_bucket(card.price) not in prices:
+            return False
+        return not filters['sale'] or (card.old_price is not None and card.old_price > card.price)
+    return match
+
+
+def card_facet_counts(cards, filters):
+    """:func:`facet_counts` over snapshot ``cards``, counted in memory."""
+    counts = {'size': {}, 'color': {}, 'price': {}, 'sale': {}}
+    unsized = matcher({**filters, 'sizes': [], 'colors': []})
+    unpriced = matcher({**filters, 'prices': []})
+    unsold = matcher({**filters, 'sale': False})
+    sizes, colors = set(filters['sizes']), set(filters['colors'])
+    for card in cards:
+        if unsized(card):
+            for size in {size for size, color in card.variants if not colors or color in colors}:
+                counts['size'][size] = counts['size'].get(size, 0) + 1
+            for color in {color for size, color in card.variants if not sizes or size in sizes}:
+                counts['color'][color] = counts['color'].get(color, 0) + 1
+        if unpriced(card):
+            bucket = _price_bucket(card.price)
+            counts['price'][bucket] = counts['price'].get(bucket, 0) + 1
+        if unsold(card) and card.old_price is not None and card.old_price > card.price:
+            counts['sale']['1'] = counts['sale'].get('1', 0) + 1
+    return _sidebar(counts, filters)
+
+
+def _sidebar(counts, filters):
+    """Shape ``{facet: {value: count}}`` for the sidebar template."""
+    # Keep selected values visible even when nothing else matches them
+    for value in filters['sizes']:
+        counts['size'].setdefault(value, 0)
+    for value in filters['colors']:
+        counts['color'].setdefault(value, 0)
+    rank = {size: i for i, size in enumerate(SIZE_ORDER)}
+    return {
+        'sizes': sorted(counts['size'].items(), key=lambda kv: (rank.get(kv[0], len(rank)), kv[0])),
+        'colors': sorted(counts['color'].items(), key=lambda kv: (-kv[1], kv[0])),
+        'prices': [(key, label, counts['price'].get(key, 0)) for key, label, _, _ in PRICE_BUCKETS],
+        'sale': counts['sale'].get('1', 0),
+    }
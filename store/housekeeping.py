@@ -0,0 +1,147 @@
+"""Garbage collection of expired sessions and orphaned anonymous cart rows.
+
+Nothing else deletes expired ``django_session`` rows, or CartItem/Wishlist
+rows left behind by anonymous sessions that are gone, so both grow without
+bound. :func:`collect` removes them in small batches, each its own short
+DELETE by primary key, with an optional pause in between, so locks are held
+only briefly and a big backlog never turns into one long transaction.
+
+It walks indexes: ``expire_date`` for sessions, and the partial
+``session_key WHERE user_id IS NULL`` indexes for the cart and wishlist.
+
+Run it with the ``purge_expired`` command, or set HOUSEKEEPING_INTERVAL to
+have web workers run it in a background thread (see :func:`start_scheduler`).
+"""
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import CartItem, Wishlist
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Sessions stored in the database; with other engines there is nothing to purge
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+LOCK_KEY = 'housekeeping:lock'
+
+
+def _batches(next_batch, pause):
+    """Call ``next_batch()`` until it deletes nothing; returns rows deleted."""
+    total = 0
+    while True:
+        deleted = next_batch()
+        if not deleted:
+            return total
+        total += deleted
+        if pause:
+            time.sleep(pause)
+
+
+def purge_sessions(batch_size=BATCH_SIZE, pause=0, now=None):
+    """Delete expired sessions, oldest first."""
+    if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+        return 0
+    now = now or timezone.now()
+
+    def next_batch():
+        keys = list(Session.objects.filter(expire_date__lt=now)
+                    .order_by('expire_date').values_list('pk', flat=True)[:batch_size])
+        return Session.objects.filter(pk__in=keys).delete()[0] if keys else 0
+
+    return _batches(next_batch, pause)
+
+
+def purge_orphans(model, batch_size=BATCH_SIZE, pause=0, now=None):
+    """Delete anonymous ``model`` rows whose session has expired or no longer exists.
+
+    Session keys are walked in order from the last one seen, so rows that are
+    kept (live sessions) are never scanned twice.
+    """
+    now = now or timezone.now()
+    anonymous = model.objects.filter(user__isnull=True)
+    last = ''
+
+    def next_batch():
+        nonlocal last
+        while True:
+            keys = list(anonymous.filter(session_key__gt=last).order_by('session_key')
+                        .values_list('session_key', flat=True).distinct()[:batch_size])
+            if not keys:
+                return 0
+            last = keys[-1]
+            live = set(Session.objects.filter(session_key__in=keys, expire_date__gte=now)
+                       .values_list('session_key', flat=True))
+            dead = [key for key in keys if key not in live]
+            if dead:
+                return anonymous.filter(session_key__in=dead).delete()[0]
+
+    return _batches(next_batch, pause)
+
+
+def collect(batch_size=BATCH_SIZE, pause=0):
+    """Run every purge; returns ``{table: rows deleted}`` and the seconds taken.
+
+    Sessions go first so that carts they leave behind are caught in the same run.
+    """
+    start = time.perf_counter()
+    now = timezone.now()
+    deleted = {
+        'sessions': purge_sessions(batch_size, pause, now),
+        'cart items': purge_orphans(CartItem, batch_size, pause, now),
+        'wishlist items': purge_orphans(Wishlist, batch_size, pause, now),
+    }
+    return deleted, time.perf_counter() - start
+
+
+def report(deleted, seconds):
+    rows = ', '.join(f'{count} {table}' for table, count in deleted.items())
+    return f'Purged {rows} in {seconds:.2f}s'
+
+
+# ===== In-process scheduler =====
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _run_forever(interval, batch_size, pause):
+    while True:
+        # Jitter keeps workers that started together from all waking at once
+        time.sleep(interval * random.uniform(0.9, 1.1))
+        # Only one worker per interval does the work, if the cache is shared
+        if not cache.add(LOCK_KEY, True, timeout=interval):
+            continue
+        close_old_connections()
+        try:
+            logger.info(report(*collect(batch_size, pause)))
+        except Exception:
+            logger.exception('Housekeeping run failed')
+        finally:
+            connection.close()
+
+
+def start_scheduler(**kwargs):
+    """Start the background purge thread once per process, if HOUSEKEEPING_INTERVAL is set.
+
+    Hooked to ``request_started`` so it runs in web workers and not in
+    management commands.
+    """
+    global _scheduler
+    interval = settings.HOUSEKEEPING_INTERVAL
+    if not interval or _scheduler is not None:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(
+                target=_run_forever, name='store-housekeeping', daemon=True,
+                args=(interval, settings.HOUSEKEEPING_BATCH_SIZE, settings.HOUSEKEEPING_PAUSE),
+            )
+            _scheduler.start()
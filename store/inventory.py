@@ -0,0 +1,151 @@
+"""Per-variant stock: reservation at checkout, restocking, availability reads.
+
+``ProductVariant.stock`` counts the units left of one size/color. NULL means
+the variant is not tracked and never sells out. That is the default, so stock
+is switched on variant by variant. A cart line whose variant row does not
+exist is treated the same way.
+
+:func:`reserve` takes the stock for a whole order with one conditional
+UPDATE. Each variant is decremented only if it still has enough. The row
+locks last until checkout commits, so only buyers of the same variant wait
+for each other, and they re-check the condition against the committed row.
+Stock therefore never goes below zero. If any line is short, the order fails
+and its transaction rolls back. Cancelling an order puts its units back.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, Exists, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CatalogVersion, OrderItem, Product, ProductVariant
+from .rollups import CANCELLED
+
+
+class OutOfStock(Exception):
+    """A checkout asked for more of some variant than is left."""
+
+    def __init__(self, wanted):
+        super().__init__('Not enough stock')
+        self.wanted = wanted
+
+    def shortages(self):
+        """``[(product_id, size, color, wanted, available)]`` for the short lines.
+
+        Read it after the checkout transaction has rolled back, so it shows
+        what other buyers have left.
+        """
+        available = availability(self.wanted)
+        return [
+            (*key, quantity, available[key])
+            for key, quantity in self.wanted.items() if key in available and available[key] < quantity
+        ]
+
+
+def _wanted(lines):
+    """``{(product_id, size, color): units}`` for the tracked ones among ``lines``."""
+    wanted = {}
+    for line in lines:
+        if line.available is not None:
+            key = (line.product_id, line.size, line.color)
+            wanted[key] = wanted.get(key, 0) + line.quantity
+    return wanted
+
+
+def units_left():
+    """Annotation for rows with ``product_id``/``size``/``color``: their variant's stock.
+
+    NULL when the variant is untracked or missing. Annotated as
+    ``available`` on cart lines, it saves the cart page and checkout a
+    separate stock read.
+    """
+    return Subquery(ProductVariant.objects.filter(
+        product_id=OuterRef('product_id'), size=OuterRef('size'), color=OuterRef('color'),
+    ).values('stock')[:1])
+
+
+def reserve(lines):
+    """Take the stock for cart ``lines``; raises OutOfStock.
+
+    ``lines`` carry ``available`` as read with the cart (see
+    :func:`units_left`). Call it inside the checkout transaction. A line
+    already short by that read fails at once, without locking anything.
+    Otherwise one UPDATE takes every tracked line's units, and there is no
+    query at all if no line is tracked.
+    """
+    wanted = _wanted(lines)
+    if not wanted:
+        return
+    read = {(line.product_id, line.size, line.color): line.available for line in lines}
+    if any(read[key] < units for key, units in wanted.items()):
+        raise OutOfStock(wanted)
+    units = Case(
+        *(When(product_id=p, size=s, color=c, then=Value(q)) for (p, s, c), q in wanted.items()),
+        output_field=IntegerField(),
+    )
+    taken = ProductVariant.objects.filter(
+        reduce(or_, (Q(product_id=p, size=s, color=c) for p, s, c in wanted)), stock__gte=units,
+    ).update(stock=F('stock') - units)
+    if taken < len(wanted):
+        raise OutOfStock(wanted)
+    # Products this order sold out change how they are listed
+    if Product.objects.filter(pk__in={p for p, _, _ in wanted}).exclude(Exists(_left())).update(
+            updated_at=timezone.now()):
+        CatalogVersion.bump()
+
+
+def order_status_changed(order, was_cancelled):
+    """Return a cancelled order's units to stock, or take them again if it is un-cancelled.
+
+    One UPDATE, summing the order's lines per variant in a subquery. Taking
+    them again is not checked and stops at zero.
+    """
+    is_cancelled = order.status == CANCELLED
+    if is_cancelled == was_cancelled:
+        return
+    lines = OrderItem.objects.filter(
+        order=order, product_id=OuterRef('product_id'), size=OuterRef('size'), color=OuterRef('color'))
+    units = Subquery(lines.values('order_id').annotate(units=Sum('quantity')).values('units'))
+    restocked = ProductVariant.objects.filter(Exists(lines), stock__isnull=False).update(
+        stock=F('stock') + units if is_cancelled else Greatest(F('stock') - units, 0))
+    if restocked:
+        # They may have sold out, or come back; either way their listings change
+        with transaction.atomic(savepoint=False):
+            Product.objects.filter(pk__in=OrderItem.objects.filter(order=order).values('product_id')).update(
+                updated_at=timezone.now())
+            CatalogVersion.bump()
+
+
+def availability(keys):
+    """``{(product_id, size, color): units left}`` for the tracked variants among ``keys``.
+
+    One query however many keys; untracked or unknown variants are left out.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = ProductVariant.objects.filter(
+        product_id__in={p for p, _, _ in keys}, stock__isnull=False,
+    ).values_list('product_id', 'size', 'color', 'stock')
+    return {(p, s, c): stock for p, s, c, stock in rows if (p, s, c) in keys}
+
+
+def sold_out():
+    """Annotation: True when every variant of the product is tracked and at zero.
+
+    Two EXISTS probes per row, on the (product, size, color) index, so a
+    listing page finds its sold-out products in the same query.
+    """
+    return ExpressionWrapper(
+        Exists(ProductVariant.objects.filter(product=OuterRef('pk'))) & ~Exists(_left()),
+        output_field=BooleanField(),
+    )
+
+
+def _left():
+    """The variants of the outer product that can still be bought."""
+    return ProductVariant.objects.filter(product=OuterRef('pk')).filter(Q(stock__isnull=True) | Q(stock__gt=0))
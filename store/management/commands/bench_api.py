@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from store.models import Address, CartItem, Product
+
+SERVERS = {
+    # Sync workers: one request per worker at a time
+    'wsgi': ['akvrix_project.wsgi:application'],
+    'asgi': ['akvrix_project.asgi:application', '-c', 'akvrix_project/gunicorn_asgi.py'],
+}
+
+
+async def _send(conn, host, method, path, body, headers):
+    """One HTTP/1.1 request on ``conn`` (reader, writer), reconnecting if needed."""
+    if conn[0] is None:
+        conn[:] = await asyncio.open_connection(*host)
+    reader, writer = conn
+    payload = body.encode()
+    head = [f'{method} {path} HTTP/1.1', f'Host: {host[0]}:{host[1]}', f'Content-Length: {len(payload)}']
+    head += [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + payload)
+    status = int((await reader.readline()).split()[1])
+    length, close = None, False
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            close = value.strip().lower() == 'close'
+    if length is None:
+        await reader.read()
+        close = True
+    else:
+        await reader.readexactly(length)
+    if close:
+        writer.close()
+        conn[:] = [None, None]
+    return status
+
+
+class Command(BaseCommand):
+    help = ('Compare requests/s and p99 of the JSON cart/wishlist/address APIs under gunicorn '
+            'with sync workers (WSGI) and Uvicorn workers (ASGI) (run against PostgreSQL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi', help='Comma-separated: wsgi, asgi')
+        parser.add_argument('--workers', type=int, default=4, help='Gunicorn workers for each server')
+        parser.add_argument('--concurrency', type=int, default=200, help='Clients, each with its own user')
+        parser.add_argument('--requests', type=int, default=5000, help='Requests per server')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **opts):
+        servers = [s.strip() for s in opts['servers'].split(',') if s.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Unknown server(s): {", ".join(sorted(unknown))}')
+        products = list(Product.objects.order_by('id').values_list('id', flat=True)[:20])
+        if not products:
+            raise CommandError('No products to add to carts; run seed_data first.')
+        clients = self.make_clients(opts['concurrency'], products)
+        try:
+            for name in servers:
+                self.stdout.write(f'{name}: {opts["workers"]} workers, {opts["concurrency"]} clients, '
+                                  f'{opts["requests"]} requests')
+                with self.server(name, opts['workers'], opts['port']):
+                    wall, latencies, errors = asyncio.run(
+                        self.load(('127.0.0.1', opts['port']), clients, opts['requests']))
+                self.report(wall, latencies, errors)
+        finally:
+            Session.objects.filter(pk__in=[c['session'] for c in clients]).delete()
+            User.objects.filter(pk__in=[c['user'] for c in clients]).delete()
+        self.stdout.write(self.style.SUCCESS('API benchmark complete'))
+
+    def make_clients(self, count, products):
+        """A signed-in user per client with a cart line and an address, plus session cookies."""
+        stamp = int(time.time())
+        clients = []
+        for i in range(count):
+            user = User.objects.create_user(f'bench-api-{i}-{stamp}', password=None)
+            item = CartItem.objects.create(user=user, session_key=f'bench-{user.pk}',
+                                           product_id=products[i % len(products)], size='M', color='#000')
+            Address.objects.create(user=user, full_name='Bench', phone='0', address_line='1 Bench Road',
+                                   city='Bench', state='Bench', pincode='000000', is_default=True)
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            csrf = get_random_string(32)
+            clients.append({
+                'user': user.pk, 'session': session.session_key, 'item': item.pk,
+                'product': products[i % len(products)],
+                'headers': {
+                    'Cookie': f'{settings.SESSION_COOKIE_NAME}={session.session_key}; '
+                              f'{settings.CSRF_COOKIE_NAME}={csrf}',
+                    'X-CSRFToken': csrf, 'Content-Type': 'application/json',
+                },
+            })
+        return clients
+
+    def server(self, name, workers, port):
+        command = self
+
+        class Server:
+            def __enter__(self):
+                env = {**os.environ, 'DEBUG': 'False'}
+                self.process = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', *SERVERS[name], '--workers', str(workers),
+                     '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+                    cwd=settings.BASE_DIR, env=env,
+                )
+                deadline = time.monotonic() + 30
+                while time.monotonic() < deadline:
+                    if self.process.poll() is not None:
+                        raise CommandError(f'{name} server exited with code {self.process.returncode}')
+                    try:
+                        socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                        return self
+                    except OSError:
+                        time.sleep(0.2)
+                self.__exit__()
+                raise CommandError(f'{name} server did not start on port {port}')
+
+            def __exit__(self, *exc):
+                self.process.send_signal(signal.SIGTERM)
+                try:
+                    self.process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    command.stdout.write(command.style.WARNING(f'{name} server killed'))
+
+        return Server()
+
+    async def load(self, host, clients, total):
+        """Each client loops over the API mix on one keep-alive connection until ``total`` are sent."""
+        remaining = itertools.count(total, -1)
+        latencies, errors = [], []
+
+        async def client(c):
+            conn = [None, None]
+            calls = itertools.cycle([
+                ('POST', reverse('add_to_cart'), {'product_id': c['product']}),
+                ('POST', reverse('update_cart'), {'item_id': c['item'], 'action': 'increase'}),
+                ('POST', reverse('toggle_wishlist'), {'product_id': c['product']}),
+                ('GET', reverse('address_list'), None),
+            ])
+            # Warm up the connection and the worker before timing
+            await _send(conn, host, 'GET', reverse('address_list'), '', c['headers'])
+            for method, path, body in calls:
+                if next(remaining) <= 0:
+                    break
+                start = time.perf_counter()
+                try:
+                    status = await _send(conn, host, method, path, json.dumps(body) if body else '', c['headers'])
+                except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+                    conn[:] = [None, None]
+                    errors.append(repr(exc))
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(f'{method} {path} -> {status}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in clients))
+        return time.perf_counter() - start, latencies, errors
+
+    def report(self, wall, latencies, errors):
+        self.stdout.write(f'  completed: {len(latencies)}  errors: {len(errors)}  wall: {wall:.2f}s')
+        if latencies:
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f'  throughput: {len(latencies) / wall:.1f} req/s  '
+                f'p50: {statistics.median(latencies) * 1000:.1f}ms  p99: {p99 * 1000:.1f}ms'
+            )
+        for err in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.WARNING(f'  {err}'))
@@ -0,0 +1,84 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store import checkout
+from store.models import CartItem, Order, Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark checkout throughput with N buyers checking out in parallel (run against PostgreSQL; SQLite serializes writers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=8, help='Parallel buyers (threads)')
+        parser.add_argument('--orders', type=int, default=20, help='Orders placed by each buyer')
+        parser.add_argument('--lines', type=int, default=3, help='Cart lines per order')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users and orders')
+
+    def handle(self, *args, **opts):
+        products = list(Product.objects.order_by('id')[:max(opts['lines'], 1)])
+        if not products:
+            raise CommandError('No products to buy; run seed_data first.')
+        buyers = [
+            User.objects.create_user(f'bench-buyer-{i}-{int(time.time())}', password=None)
+            for i in range(opts['buyers'])
+        ]
+        latencies, order_ids, errors = [], [], []
+        lock = threading.Lock()
+        customer = checkout.customer_fields({'first_name': 'Bench', 'last_name': 'Buyer', 'email': 'bench@akvrix.com'})
+
+        def buyer(user):
+            try:
+                for _ in range(opts['orders']):
+                    try:
+                        CartItem.objects.bulk_create([
+                            CartItem(user=user, session_key=f'bench-{user.pk}', product=p,
+                                     size='M', color='#000', quantity=1)
+                            for p in products[:opts['lines']]
+                        ])
+                        start = time.perf_counter()
+                        order = checkout.place_order(CartItem.objects.filter(user=user), customer, user=user)
+                    except Exception as exc:
+                        with lock:
+                            errors.append(repr(exc))
+                        CartItem.objects.filter(user=user).delete()
+                        continue
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        order_ids.append(order.pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(u,)) for u in buyers]
+        wall_start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - wall_start
+
+        numbers = Order.objects.filter(pk__in=order_ids).values_list('order_number', flat=True)
+        unique_numbers = len(set(numbers))
+        self.stdout.write(f'Buyers: {len(buyers)}  orders: {len(order_ids)}  errors: {len(errors)}  wall: {wall:.2f}s')
+        if latencies:
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f'Throughput: {len(latencies) / wall:.1f} orders/s  '
+                f'p50: {statistics.median(latencies) * 1000:.1f}ms  p99: {p99 * 1000:.1f}ms'
+            )
+        self.stdout.write(f'Unique order numbers: {unique_numbers}/{len(order_ids)}')
+        for err in errors[:5]:
+            self.stdout.write(self.style.WARNING(err))
+
+        if not opts['keep']:
+            Order.objects.filter(pk__in=order_ids).delete()
+            User.objects.filter(pk__in=[u.pk for u in buyers]).delete()
+        if unique_numbers != len(order_ids):
+            raise CommandError('Duplicate order numbers detected')
+        self.stdout.write(self.style.SUCCESS('Checkout benchmark complete'))
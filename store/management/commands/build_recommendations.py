@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the "related products" table from co-purchases (and optionally wishlists); '
+            'run it from cron, e.g. nightly')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K,
+                            help='Neighbours kept per product')
+        parser.add_argument('--wishlist-weight', type=float, default=0,
+                            help='Also count each customer wishlist as a basket of this weight (0 leaves them out)')
+
+    def handle(self, *args, **opts):
+        if opts['top_k'] < 1:
+            raise CommandError('--top-k must be positive')
+        if opts['wishlist_weight'] < 0:
+            raise CommandError('--wishlist-weight cannot be negative')
+        start = time.perf_counter()
+        products, rows = recommendations.rebuild(opts['top_k'], opts['wishlist_weight'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {rows} neighbours for {products} products in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import catalog_import
+
+MAX_ERRORS_SHOWN = 20
+
+
+class Command(BaseCommand):
+    help = ('Upsert products by slug from a CSV or JSON Lines file, in batches; '
+            'reports inserted, updated and unchanged products')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file; one product per row')
+        parser.add_argument('--format', choices=catalog_import.FORMATS,
+                            help='File format; taken from the extension if omitted')
+        parser.add_argument('--batch-size', type=int, default=catalog_import.BATCH_SIZE,
+                            help='Products per bulk INSERT/UPDATE')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print what would change, field by field, without writing anything')
+        parser.add_argument('--insert-only', action='store_true',
+                            help='Only add products whose slug is new; leave existing ones as they are')
+
+    def handle(self, *args, **opts):
+        fmt = opts['format'] or os.path.splitext(opts['path'])[1].lstrip('.').lower()
+        if fmt not in catalog_import.FORMATS:
+            raise CommandError('Pass --format csv or --format jsonl for a file without either extension')
+        if opts['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        start = time.perf_counter()
+        # Two passes: nothing is written unless every row is valid
+        with self.open(opts['path']) as stream:
+            count, errors = catalog_import.validate(catalog_import.read(stream, fmt))
+        for line, message in errors[:MAX_ERRORS_SHOWN]:
+            self.stderr.write(f'line {line}: {message}')
+        if errors:
+            raise CommandError(f'{len(errors)} of {count} rows are invalid; nothing was imported')
+        with self.open(opts['path']) as stream:
+            counts = catalog_import.upsert(
+                catalog_import.read(stream, fmt), batch_size=opts['batch_size'], dry_run=opts['dry_run'],
+                insert_only=opts['insert_only'], diff=self.stdout.write if opts['dry_run'] else None,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            catalog_import.report(counts, time.perf_counter() - start, opts['dry_run'])))
+
+    def open(self, path):
+        try:
+            # utf-8-sig: spreadsheet CSV exports often start with a BOM
+            return open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc.strerror}')
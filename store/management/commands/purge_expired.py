@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store import housekeeping
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions and orphaned anonymous cart/wishlist rows in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.HOUSEKEEPING_BATCH_SIZE,
+                            help='Rows per DELETE (default: HOUSEKEEPING_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=settings.HOUSEKEEPING_PAUSE,
+                            help='Seconds to sleep between batches, to go easy on a busy database '
+                                 '(default: HOUSEKEEPING_PAUSE)')
+
+    def handle(self, *args, **opts):
+        deleted, seconds = housekeeping.collect(opts['batch_size'], opts['pause'])
+        self.stdout.write(self.style.SUCCESS(housekeeping.report(deleted, seconds)))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import bestsellers
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the best-seller rankings (per category and overall) from time-decayed recent sales; '
+            'run it periodically, e.g. hourly')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float, default=bestsellers.HALF_LIFE_DAYS,
+                            help='Days after which a sale counts half as much')
+        parser.add_argument('--window', type=int, default=bestsellers.WINDOW_DAYS,
+                            help='Only count sales from the last N days')
+
+    def handle(self, *args, **opts):
+        if opts['half_life'] <= 0 or opts['window'] < 1:
+            raise CommandError('--half-life and --window must be positive')
+        start = time.perf_counter()
+        ranked = bestsellers.rebuild(opts['half_life'], opts['window'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ranked {ranked} products in {time.perf_counter() - start:.2f}s'
+        ))
@@ -0,0 +1,42 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store import rollups
+from store.models import Order, SalesDaily
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the daily/hourly sales rollups from the orders table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild from this date (YYYY-MM-DD) onwards')
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days')
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Do nothing if the rollups already hold data (for deploy scripts)')
+
+    def handle(self, *args, **opts):
+        if opts['if_empty']:
+            # Signups write SalesDaily rows of their own, so only a day with
+            # orders shows that the orders have been rolled up
+            if SalesDaily.objects.filter(orders__gt=0).exists():
+                self.stdout.write('Sales rollups already populated; skipping')
+                return
+            if not Order.objects.exists():
+                self.stdout.write('No orders yet; nothing to roll up')
+                return
+        since = None
+        if opts['since']:
+            try:
+                since = date.fromisoformat(opts['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        elif opts['days']:
+            since = timezone.localdate() - timedelta(days=opts['days'] - 1)
+        start = time.perf_counter()
+        days = rollups.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {days} days of sales rollups in {time.perf_counter() - start:.2f}s'
+        ))
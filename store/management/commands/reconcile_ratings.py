@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating aggregates and star histograms from the reviews table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        fixed = ratings.reconcile(batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled ratings: {fixed} product(s) repaired in {time.perf_counter() - start:.2f}s'
+        ))
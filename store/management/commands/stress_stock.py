@@ -0,0 +1,114 @@
+import queue
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from store import checkout, inventory
+from store.models import CartItem, CatalogVersion, Order, OrderItem, Product, ProductVariant
+
+
+class Command(BaseCommand):
+    help = ('Race many buyers for the last units of one variant and check that nothing is oversold '
+            '(run against PostgreSQL; SQLite serializes writers)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=300, help='Buyers, each with their own cart')
+        parser.add_argument('--stock', type=int, default=50, help='Units of the drop in stock')
+        parser.add_argument('--quantity', type=int, default=1, help='Units in each cart')
+        parser.add_argument('--connections', type=int, default=64,
+                            help='Threads checking out at once, each with its own database connection')
+
+    def handle(self, *args, **opts):
+        if min(opts['buyers'], opts['stock'], opts['quantity'], opts['connections']) < 1:
+            raise CommandError('--buyers, --stock, --quantity and --connections must be positive')
+        stamp = int(time.time())
+        product = Product.objects.create(
+            name=f'Stress Drop {stamp}', slug=f'stress-drop-{stamp}', price=99, category='limited',
+            description='Stock stress test', image='https://example.com/stress.jpg', sizes='M', colors='#000',
+        )
+        ProductVariant.objects.filter(product=product).update(stock=opts['stock'])
+        CatalogVersion.bump()
+        buyers = User.objects.bulk_create([
+            User(username=f'stress-buyer-{i}-{stamp}') for i in range(opts['buyers'])
+        ])
+        CartItem.objects.bulk_create([
+            CartItem(user=user, session_key=f'stress-{user.pk}', product=product, size='M', color='#000',
+                     quantity=opts['quantity'])
+            for user in buyers
+        ])
+        try:
+            sold, refused, errors, latencies, wall = self.race(buyers, opts['connections'])
+            self.report(product, opts, sold, refused, errors, latencies, wall)
+        finally:
+            Order.objects.filter(user__in=buyers).delete()
+            User.objects.filter(pk__in=[u.pk for u in buyers]).delete()
+            product.delete()
+
+    def race(self, buyers, connections):
+        """Check every buyer out from ``connections`` threads released together."""
+        pending = queue.SimpleQueue()
+        for user in buyers:
+            pending.put(user)
+        customer = checkout.customer_fields({'first_name': 'Stress', 'last_name': 'Buyer'})
+        start = threading.Barrier(min(connections, len(buyers)) + 1)
+        lock = threading.Lock()
+        sold, refused, errors, latencies = [], [], [], []
+
+        def worker():
+            try:
+                start.wait()
+                while True:
+                    try:
+                        user = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    began = time.perf_counter()
+                    try:
+                        order = checkout.place_order(CartItem.objects.filter(user=user), customer, user=user)
+                        outcome = sold, order.pk
+                    except inventory.OutOfStock:
+                        outcome = refused, user.pk
+                    except Exception as exc:
+                        outcome = errors, repr(exc)
+                    with lock:
+                        outcome[0].append(outcome[1])
+                        latencies.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(start.parties - 1)]
+        for t in threads:
+            t.start()
+        start.wait()
+        began = time.perf_counter()
+        for t in threads:
+            t.join()
+        return sold, refused, errors, latencies, time.perf_counter() - began
+
+    def report(self, product, opts, sold, refused, errors, latencies, wall):
+        left = ProductVariant.objects.get(product=product).stock
+        units = OrderItem.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+        self.stdout.write(
+            f'Buyers: {opts["buyers"]}  stock: {opts["stock"]}  sold: {len(sold)}  '
+            f'refused: {len(refused)}  errors: {len(errors)}  wall: {wall:.2f}s'
+        )
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'Throughput: {len(latencies) / wall:.1f} checkouts/s  '
+            f'p50: {statistics.median(latencies) * 1000:.1f}ms  p99: {p99 * 1000:.1f}ms'
+        )
+        self.stdout.write(f'Units ordered: {units}  left in stock: {left}')
+        for err in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.WARNING(err))
+        expected = min(opts['stock'] // opts['quantity'], opts['buyers'])
+        if units + left != opts['stock'] or units > opts['stock']:
+            raise CommandError(f'Oversold: {units} units ordered from a stock of {opts["stock"]}')
+        if not errors and len(sold) != expected:
+            raise CommandError(f'Expected {expected} orders to go through, got {len(sold)}')
+        self.stdout.write(self.style.SUCCESS('No oversell: every unit went to exactly one order'))
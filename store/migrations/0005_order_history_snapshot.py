@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:48
+
+import itertools
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from store.models import Order as CurrentOrder
+
+BATCH_SIZE = 1000
+
+
+def backfill_snapshots(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+    # Slug and image: one set-based UPDATE
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    OrderItem.objects.filter(product__isnull=False).update(
+        product_slug=Subquery(product.values('slug')[:1]),
+        product_image=Subquery(product.values('image')[:1]),
+    )
+    # Count and preview: streamed in order, written a batch of orders at a time
+    lines = OrderItem.objects.order_by('order_id', 'id').values_list('order_id', 'product_name', 'quantity')
+    orders = (
+        Order(
+            id=order_id, item_count=sum(qty for _, qty in order_lines),
+            # The same truncation checkout applies
+            items_preview=CurrentOrder.build_preview(order_lines),
+        )
+        for order_id, group in itertools.groupby(lines.iterator(chunk_size=2000), key=lambda line: line[0])
+        for order_lines in [[(name, qty) for _, name, qty in group]]
+    )
+    while batch := list(itertools.islice(orders, BATCH_SIZE)):
+        Order.objects.bulk_update(batch, ['item_count', 'items_preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_alter_review_unique_together_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_preview',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.URLField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.SlugField(blank=True),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:05
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Search objects are PostgreSQL-only; on SQLite the column stays NULL and
+# store.search falls back to LIKE matching.
+SEARCH_SQL = """
+CREATE FUNCTION store_product_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER store_product_search_trigger
+    BEFORE INSERT OR UPDATE OF name, category, description ON store_product
+    FOR EACH ROW EXECUTE FUNCTION store_product_search_update();
+
+UPDATE store_product SET name = name;
+
+CREATE INDEX store_product_search_gin ON store_product USING gin (search_vector);
+CREATE INDEX store_product_name_trgm ON store_product USING gin (upper(name::text) gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX IF EXISTS store_product_name_trgm;
+DROP INDEX IF EXISTS store_product_search_gin;
+DROP TRIGGER IF EXISTS store_product_search_trigger ON store_product;
+DROP FUNCTION IF EXISTS store_product_search_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_order_history_snapshot'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split(value):
+    return list(dict.fromkeys(v.strip() for v in value.split(',') if v.strip()))
+
+
+def backfill_variants(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductVariant = apps.get_model('store', 'ProductVariant')
+    batch = []
+    for product in Product.objects.only('id', 'sizes', 'colors').iterator(chunk_size=2000):
+        colors = split(product.colors)
+        for i, size in enumerate(split(product.sizes)):
+            for j, color in enumerate(colors):
+                batch.append(ProductVariant(product_id=product.id, size=size, color=color,
+                                            position=i * len(colors) + j))
+        if len(batch) >= 5000:
+            ProductVariant.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ProductVariant.objects.bulk_create(batch, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=10)),
+                ('color', models.CharField(max_length=20)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['size', 'product'], name='store_variant_size_idx'), models.Index(fields=['color', 'product'], name='store_variant_color_idx')],
+                'unique_together': {('product', 'size', 'color')},
+            },
+        ),
+        migrations.RunPython(backfill_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+                ('new_customers', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalesHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=50)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'day'], name='store_prodsales_cat_day_idx')],
+                'unique_together': {('day', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    stars = {f'stars_{n}': Count('id', filter=Q(rating=n)) for n in range(1, 6)}
+    counts = {
+        row.pop('product_id'): row
+        for row in Review.objects.values('product_id').annotate(
+            reviews_count=Count('id'), rating_sum=Sum('rating'), **stars,
+        ).order_by()
+    }
+    fields = ['reviews_count', 'rating_sum', 'rating', *stars]
+    batch = []
+    for product in Product.objects.only('id').iterator(chunk_size=2000):
+        row = counts.get(product.id, {})
+        for field in fields:
+            setattr(product, field, row.get(field, 0))
+        product.rating = round(product.rating_sum / product.reviews_count, 1) if product.reviews_count else 0.0
+        batch.append(product)
+    Product.objects.bulk_update(batch, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stars_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+from store.migration_ops import AddIndexConcurrentlyIfPostgres
+
+# auth.User is not ours to declare indexes on; login_page looks users up by email
+EMAIL_INDEX = 'store_auth_user_email_idx'
+
+
+def create_email_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS {EMAIL_INDEX} ON auth_user (email)')
+
+
+def drop_email_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {EMAIL_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('store', '0010_review_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='cartitem',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['session_key'], name='store_cart_anon_session_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='store_order_user_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='store_order_status_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='store_order_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='store_product_cat_id_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='store_product_price_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='store_product_cat_price_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['rating', 'id'], name='store_product_rating_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['category', 'rating', 'id'], name='store_product_cat_rating_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='store_product_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='product',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='store_product_cat_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='wishlist',
+            index=models.Index(fields=['user', 'product'], name='store_wishlist_user_prod_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='wishlist',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['session_key'], name='store_wishlist_anon_sess_idx'),
+        ),
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
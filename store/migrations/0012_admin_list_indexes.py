@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+from store.migration_ops import AddIndexConcurrentlyIfPostgres, RemoveIndexConcurrentlyIfPostgres
+
+# admin_customers pages through auth_user by (date_joined, id); not our model to index
+JOINED_INDEX = 'store_auth_user_joined_idx'
+
+
+def create_joined_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'CREATE INDEX {concurrently}IF NOT EXISTS {JOINED_INDEX} ON auth_user (date_joined, id)')
+
+
+def drop_joined_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {JOINED_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('store', '0011_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Build the replacement (now ending in id for the keyset) before dropping the old one
+        AddIndexConcurrentlyIfPostgres(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='store_order_status_key_idx'),
+        ),
+        RemoveIndexConcurrentlyIfPostgres(
+            model_name='order',
+            name='store_order_status_created_idx',
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='order',
+            index=models.Index(fields=['total', 'id'], name='store_order_total_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='review',
+            index=models.Index(fields=['created_at', 'id'], name='store_review_created_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='review',
+            index=models.Index(fields=['rating', 'created_at', 'id'], name='store_review_rating_idx'),
+        ),
+        migrations.RunPython(create_joined_index, drop_joined_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_neighbour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BestSeller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'unique_together': {('category', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_bestseller'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='reviews_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stars_1',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stars_2',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stars_3',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stars_4',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stars_5',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # One INSERT ... SELECT: the database totals every customer's orders without a row leaving it
+    qn = schema_editor.quote_name
+    stats, user, order = (apps.get_model(*name)._meta.db_table for name in (
+        ('store', 'CustomerStats'), ('auth', 'User'), ('store', 'Order')))
+    schema_editor.execute(
+        f'INSERT INTO {qn(stats)} (user_id, order_count, total_spent, last_active) '
+        f'SELECT u.id, COUNT(o.id), COALESCE(SUM(o.total), 0), COALESCE(MAX(o.created_at), u.date_joined) '
+        f'FROM {qn(user)} u LEFT JOIN {qn(order)} o ON o.user_id = u.id GROUP BY u.id, u.date_joined'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0017_rating_fields_not_editable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_active', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total_spent', '-user'], name='store_custstats_spend_idx'), models.Index(fields=['-last_active', '-user'], name='store_custstats_recent_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:19
+
+from django.db import migrations, models
+
+
+def create_row(apps, schema_editor):
+    apps.get_model('store', 'CatalogVersion').objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_customer_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_row, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+import secrets
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.utils.functional import cached_property
 
 
 class Product(models.Model):
@@ -20,20 +24,87 @@ class Product(models.Model):
     image_hover = models.URLField(blank=True)
     sizes = models.CharField(max_length=100, default='S,M,L,XL')
     colors = models.CharField(max_length=200, default='#000,#FFF')
-    rating = models.FloatField(default=4.5)
-    reviews_count = models.IntegerField(default=0)
+    # Review aggregates, maintained on every review write by store/ratings.py.
+    # Not editable, so model forms leave them out; see save_details()
+    rating = models.FloatField(default=0, editable=False)
+    reviews_count = models.IntegerField(default=0, editable=False)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    stars_1 = models.IntegerField(default=0, editable=False)
+    stars_2 = models.IntegerField(default=0, editable=False)
+    stars_3 = models.IntegerField(default=0, editable=False)
+    stars_4 = models.IntegerField(default=0, editable=False)
+    stars_5 = models.IntegerField(default=0, editable=False)
     badge = models.CharField(max_length=50, blank=True)
     in_stock = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Version for cached fragments; also bumped when the product's reviews change
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0006)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        # Keyset orders of the shop listing (catalog.SORT_ORDERINGS), with and
+        # without a category filter; B-trees serve both scan directions
+        indexes = [
+            models.Index(fields=['category', 'id'], name='store_product_cat_id_idx'),
+            models.Index(fields=['price', 'id'], name='store_product_price_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='store_product_cat_price_idx'),
+            models.Index(fields=['rating', 'id'], name='store_product_rating_idx'),
+            models.Index(fields=['category', 'rating', 'id'], name='store_product_cat_rating_idx'),
+            models.Index(fields=['created_at', 'id'], name='store_product_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='store_product_cat_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    # Only ever written through store/ratings.py's database-side updates
+    RATING_FIELDS = (
+        'rating', 'reviews_count', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5',
+    )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or {'sizes', 'colors'} & set(update_fields):
+                self.sync_variants()
+            CatalogVersion.bump()
+
+    def save_details(self):
+        """Save an edit of an existing product, leaving out the review aggregates.
+
+        Use it for catalog edits (dashboard, admin). The aggregates in this
+        copy may be stale by the time it is saved, and a plain ``save()``
+        would overwrite counts that reviews changed meanwhile.
+        """
+        skip = set(self.RATING_FIELDS) | self.get_deferred_fields()
+        self.save(update_fields=[
+            f.name for f in self._meta.concrete_fields if not f.primary_key and f.attname not in skip
+        ])
+
+    def sync_variants(self):
+        """Make the variant rows match the ``sizes`` x ``colors`` text fields."""
+        ProductVariant.sync([self])
+        self.__dict__.pop('ordered_variants', None)
+
+    @cached_property
+    def ordered_variants(self):
+        return sorted(self.variants.all(), key=lambda v: v.position)
+
     def get_sizes_list(self):
-        return [s.strip() for s in self.sizes.split(',')]
+        return list(dict.fromkeys(v.size for v in self.ordered_variants))
 
     def get_colors_list(self):
-        return [c.strip() for c in self.colors.split(',')]
+        return list(dict.fromkeys(v.color for v in self.ordered_variants))
+
+    def star_histogram(self):
+        """``[(stars, count, percent), ...]`` from 5 stars down to 1."""
+        total = self.reviews_count or 1
+        return [
+            (stars, getattr(self, f'stars_{stars}'), round(getattr(self, f'stars_{stars}') * 100 / total))
+            for stars in range(5, 0, -1)
+        ]
 
     @property
     def discount_percent(self):
@@ -42,6 +113,94 @@ class Product(models.Model):
         return 0
 
 
+class CatalogVersion(models.Model):
+    """One row whose value changes with every catalog write; conditional.py and snapshot.py key on it.
+
+    Every write to products or variants calls :meth:`bump` last, in the same
+    transaction, so each commit moves the version whatever the writers'
+    clocks say. A bump stores a fresh random value rather than adding one:
+    after a rollback or a restored backup, later writes still never repeat
+    a version that a worker may have cached.
+    """
+    version = models.BigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls):
+        version = secrets.randbits(63)
+        if not cls.objects.filter(pk=1).update(version=version):
+            # Only if the row the migration creates has been deleted (e.g. a flushed test database)
+            cls.objects.update_or_create(pk=1, defaults={'version': version})
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+class ProductVariant(models.Model):
+    """One size/color combination of a product; the indexed form of ``sizes``/``colors``."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
+    size = models.CharField(max_length=10)
+    color = models.CharField(max_length=20)
+    position = models.PositiveSmallIntegerField(default=0)
+    # Units left; NULL means not tracked (never sells out). See store/inventory.py
+    stock = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('product', 'size', 'color')
+        indexes = [
+            models.Index(fields=['size', 'product'], name='store_variant_size_idx'),
+            models.Index(fields=['color', 'product'], name='store_variant_color_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} ({self.size}, {self.color})"
+
+    @staticmethod
+    def split(value):
+        return list(dict.fromkeys(v.strip() for v in value.split(',') if v.strip()))
+
+    @classmethod
+    def combinations(cls, sizes, colors):
+        """``{(size, color): position}`` in authored order, sizes first."""
+        colors = cls.split(colors)
+        return {
+            (size, color): i * len(colors) + j
+            for i, size in enumerate(cls.split(sizes))
+            for j, color in enumerate(colors)
+        }
+
+    @classmethod
+    def sync(cls, products):
+        """Make the variant rows of ``products`` match their ``sizes``/``colors``.
+
+        At most one query each to read, delete, reorder and insert, however
+        many products there are.
+        """
+        existing = {p.pk: {} for p in products}
+        for v in cls.objects.filter(product_id__in=list(existing)):
+            existing[v.product_id][(v.size, v.color)] = v
+        stale, moved, created = [], [], []
+        for product in products:
+            wanted = cls.combinations(product.sizes, product.colors)
+            have = existing[product.pk]
+            for key, v in have.items():
+                if key not in wanted:
+                    stale.append(v.pk)
+                elif v.position != wanted[key]:
+                    v.position = wanted[key]
+                    moved.append(v)
+            created += [
+                cls(product=product, size=size, color=color, position=pos)
+                for (size, color), pos in wanted.items() if (size, color) not in have
+            ]
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+        if moved:
+            cls.objects.bulk_update(moved, ['position'])
+        if created:
+            cls.objects.bulk_create(created, ignore_conflicts=True)
+
+
 class CartItem(models.Model):
     session_key = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -52,6 +211,11 @@ class CartItem(models.Model):
 
     class Meta:
         unique_together = ('session_key', 'product', 'size', 'color')
+        indexes = [
+            # Anonymous carts are looked up by session only
+            models.Index(fields=['session_key'], condition=models.Q(user__isnull=True),
+                         name='store_cart_anon_session_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
@@ -68,6 +232,11 @@ class Wishlist(models.Model):
 
     class Meta:
         unique_together = ('session_key', 'product')
+        indexes = [
+            models.Index(fields=['user', 'product'], name='store_wishlist_user_prod_idx'),
+            models.Index(fields=['session_key'], condition=models.Q(user__isnull=True),
+                         name='store_wishlist_anon_sess_idx'),
+        ]
 
 
 class Order(models.Model):
@@ -79,6 +248,12 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # What the checkout page offers; the column itself stays free text
+    PAYMENT_CHOICES = [
+        ('card', 'Card'),
+        ('upi', 'UPI'),
+        ('cod', 'Cash on Delivery'),
+    ]
     session_key = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     first_name = models.CharField(max_length=100)
@@ -102,11 +277,42 @@ class Order(models.Model):
     shipped_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Version of the tracking page (conditional GET); moved by every save
+    updated_at = models.DateTimeField(auto_now=True)
     order_number = models.CharField(max_length=20, unique=True)
+    # Denormalized summary so order history lists never touch OrderItem
+    item_count = models.IntegerField(default=0)
+    items_preview = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            # my_orders keyset order per user; admin list filtered by status
+            # and sorted by date or total; recent orders on the dashboard
+            models.Index(fields=['user', '-created_at', '-id'], name='store_order_user_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='store_order_status_key_idx'),
+            models.Index(fields=['-created_at', '-id'], name='store_order_created_idx'),
+            models.Index(fields=['total', 'id'], name='store_order_total_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the sales rollups see status transitions on save (see signals.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    @staticmethod
+    def build_preview(lines):
+        """Comma-separated "name x qty" summary of ``(name, quantity)`` pairs, cut to fit the column."""
+        preview = ', '.join(f"{name} x {qty}" for name, qty in lines)
+        max_length = Order._meta.get_field('items_preview').max_length
+        if len(preview) > max_length:
+            preview = preview[:max_length - 1].rstrip(', ') + '…'
+        return preview
+
     def get_tracking_steps(self):
         """Returns list of tracking steps with their completed status."""
         status_order = ['processing', 'confirmed', 'shipped', 'out_for_delivery', 'delivered']
@@ -133,6 +339,9 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     product_name = models.CharField(max_length=200)
+    # Snapshot taken at checkout; survives the product being edited or deleted
+    product_slug = models.SlugField(blank=True)
+    product_image = models.URLField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     size = models.CharField(max_length=10)
     color = models.CharField(max_length=20)
@@ -150,10 +359,22 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ('user', 'product')
+        indexes = [
+            # Keyset orders of the admin review list, with and without a rating filter
+            models.Index(fields=['created_at', 'id'], name='store_review_created_idx'),
+            models.Index(fields=['rating', 'created_at', 'id'], name='store_review_rating_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the product aggregates currently include for this review (see signals.py)
+        instance._counted = (instance.__dict__.get('product_id'), instance.__dict__.get('rating'))
+        return instance
+
 
 class Address(models.Model):
     LABEL_CHOICES = [
@@ -178,3 +399,100 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.label.title()} - {self.full_name} ({self.city})"
 
+
+
+# ===== SALES ROLLUPS (maintained by store/rollups.py) =====
+
+class SalesDaily(models.Model):
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    # Revenue and units leave out cancelled orders
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    new_customers = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders"
+
+
+class SalesHourly(models.Model):
+    hour = models.DateTimeField(unique=True)
+    orders = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00}: {self.orders} orders"
+
+
+class ProductSalesDaily(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    # Copied from the product so category totals survive product deletion
+    category = models.CharField(max_length=50)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'product')
+        indexes = [models.Index(fields=['category', 'day'], name='store_prodsales_cat_day_idx')]
+
+    def __str__(self):
+        return f"{self.day}: product {self.product_id} x{self.units}"
+
+
+class CustomerStats(models.Model):
+    """A customer's order totals, which the dashboard's customer list sorts by."""
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    # Every order, cancelled or not
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # The latest order, or when the customer joined if there is none
+    last_active = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_spent', '-user'], name='store_custstats_spend_idx'),
+            models.Index(fields=['-last_active', '-user'], name='store_custstats_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"user {self.user_id}: {self.order_count} orders"
+
+
+class BestSeller(models.Model):
+    """A product's place in the sales-velocity ranking of its category; rebuilt by store/bestsellers.py."""
+    # '' is the ranking of the whole catalog
+    category = models.CharField(max_length=50, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    # 0 sells fastest
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # Also the index a ranking is read from, in order
+        unique_together = ('category', 'rank')
+
+    def __str__(self):
+        return f"{self.category or 'all'} #{self.rank}: product {self.product_id}"
+
+
+
+# ===== RECOMMENDATIONS (rebuilt by store/recommendations.py) =====
+
+class ProductNeighbour(models.Model):
+    """One of the products most often bought together with ``product``."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    neighbour = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    # 0 is the closest
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # Also the index the product page reads its neighbours from, in rank order
+        unique_together = ('product', 'rank')
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbour_id} ({self.score:.3f})"
@@ -0,0 +1,128 @@
+"""Keyset (cursor) pagination shared by storefront and dashboard listings.
+
+Instead of OFFSET, each page remembers the sort-key values of its last row and
+the next page filters past them, so page N costs the same as page 1. Every
+ordering must end in a unique column (normally ``id``) and the keyed columns
+must be non-null.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+PAGE_SIZE = 24
+# Results the planner expects to be smaller than this are counted exactly
+EXACT_COUNT_BELOW = 10000
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keep full microsecond precision; DjangoJSONEncoder rounds datetimes to ms."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Return the list of key values in ``cursor``, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _field_name(key):
+    return key.lstrip('-')
+
+
+def _row_value(row, key):
+    name = _field_name(key)
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def keyset_filter(ordering, values):
+    """Build ``(a, b, c) > (va, vb, vc)`` for a mixed asc/desc ordering."""
+    condition = Q()
+    for i, key in enumerate(ordering):
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        term = Q(**{f'{_field_name(key)}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(ordering[:i], values[:i]):
+            term &= Q(**{_field_name(prev_key): prev_value})
+        condition |= term
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset``.
+
+    ``next_cursor`` is None on the last page. One extra row is fetched to
+    detect whether another page exists, so no COUNT query is needed.
+    """
+    values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        try:
+            queryset = queryset.filter(keyset_filter(ordering, values))
+        except (ValidationError, ValueError, TypeError):
+            # Tampered cursor values: fall back to the first page
+            pass
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_row_value(rows[-1], key) for key in ordering)
+    return rows, next_cursor
+
+
+def cursor_querystring(request, cursor):
+    """The current query string with ``cursor`` swapped in, for "next page" links."""
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return params.urlencode()
+
+
+def sort_querystring(request, sort):
+    """The current query string with ``sort`` swapped in, back on the first page."""
+    params = request.GET.copy()
+    params['sort'] = sort
+    params.pop('cursor', None)
+    return params.urlencode()
+
+
+def estimated_count(queryset, exact_below=EXACT_COUNT_BELOW):
+    """Return ``(count, exact)`` for a listing's "N results" label.
+
+    COUNT(*) reads every matching row, which on a table of millions costs
+    more than the page itself. On PostgreSQL the planner's row estimate for
+    the filtered query is used instead, unless it is small enough to count
+    exactly. Other databases always count.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= exact_below:
+            return estimate, False
+    return queryset.count(), True
@@ -0,0 +1,172 @@
+"""Opt-in request profiling: a Server-Timing header and a slow-request log.
+
+Turned on with PROFILE_REQUESTS=true (see settings). For each sampled request
+the middleware records:
+
+- every database query, through ``connection.execute_wrapper``, so DEBUG is
+  not needed;
+- the time spent rendering templates, through :class:`TimedDjangoTemplates`;
+- the total time.
+
+These are sent back as a ``Server-Timing`` header, which browser dev tools
+show under the request's timing tab. The header only goes to staff users, or
+to everyone when DEBUG is on, since timings let an outsider tell how much
+work a request caused. A request slower than
+PROFILE_SLOW_REQUEST_MS is also written to the ``store.profiling`` logger (a
+rotating file) along with its slowest queries and their EXPLAIN plans.
+Unless PROFILE_LOG_PARAMS is on, the log leaves out the query string, the
+bound parameters and the string literals in plans, since those carry
+customer data. Unsampled requests skip all of this.
+"""
+import contextvars
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('store_profile', default=None)
+
+# Only reads are explained; EXPLAIN never runs the statement itself
+EXPLAINABLE = ('select', 'with')
+# Quoted literals in a plan line, such as a filter's bound value
+LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+class Profile:
+    """What one request spent, filled in while it runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (seconds, alias, sql, params)
+        self.template = 0.0
+
+    def query_recorder(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                # executemany params are a whole batch; not worth keeping
+                self.queries.append((time.perf_counter() - start, alias, sql, None if many else params))
+        return record
+
+    @property
+    def db_time(self):
+        return sum(q[0] for q in self.queries)
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{len(self.queries)} queries", '
+            f'tpl;dur={self.template * 1000:.1f};desc="templates", '
+            f'app;dur={total * 1000:.1f};desc="total"'
+        )
+
+
+def explain(alias, sql, params):
+    """The database's plan for a read query, as lines of text."""
+    if params is None or not sql.lstrip().lower().startswith(EXPLAINABLE):
+        return []
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except DatabaseError as exc:
+        return [f'(EXPLAIN failed: {exc})']
+
+
+def redact(plan_line):
+    return LITERAL.sub("'?'", plan_line)
+
+
+class ProfilingMiddleware:
+    """Times sampled requests; put it first in MIDDLEWARE so it sees everything."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.slow_ms = settings.PROFILE_SLOW_REQUEST_MS
+        self.slow_queries = settings.PROFILE_SLOW_QUERIES
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.query_recorder(connection.alias)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - profile.started
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = profile.server_timing(total)
+        if total * 1000 >= self.slow_ms:
+            self.log_slow(request, response, profile, total)
+        return response
+
+    def log_slow(self, request, response, profile, total):
+        log_params = settings.PROFILE_LOG_PARAMS
+        path = request.get_full_path() if log_params else request.path
+        lines = [
+            f'{request.method} {path} -> {response.status_code} in {total * 1000:.0f}ms: '
+            f'{len(profile.queries)} queries in {profile.db_time * 1000:.1f}ms, '
+            f'templates {profile.template * 1000:.1f}ms'
+        ]
+        repeated = Counter(sql for _, _, sql, _ in profile.queries).most_common(1)
+        if repeated and repeated[0][1] > 1:
+            sql, count = repeated[0]
+            lines.append(f'  most repeated ({count}x): {sql}')
+        slowest = sorted(profile.queries, key=itemgetter(0), reverse=True)[:self.slow_queries]
+        for seconds, alias, sql, params in slowest:
+            if log_params:
+                lines.append(f'  {seconds * 1000:.1f}ms [{alias}] {sql} {params!r}')
+                lines.extend(f'    {row}' for row in explain(alias, sql, params))
+            else:
+                lines.append(f'  {seconds * 1000:.1f}ms [{alias}] {sql}')
+                lines.extend(f'    {redact(row)}' for row in explain(alias, sql, params))
+        logger.warning('\n'.join(lines))
+
+
+class TimedTemplate:
+    """Wraps a backend template to add its render time to the current profile."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times reported to ProfilingMiddleware.
+
+    Only top-level renders are timed; includes and extends happen inside them.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,94 @@
+"""Live review aggregates on Product: count, sum, average and star histogram.
+
+Every review write applies its change in one UPDATE using database-side
+arithmetic. Concurrent reviews cannot lose increments, and the listing and
+its ``rating`` sort keep reading plain columns. ``reconcile_ratings``
+recomputes everything from the Review table to repair drift.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from .models import CatalogVersion, Product, Review
+
+STARS = (1, 2, 3, 4, 5)
+AGGREGATE_FIELDS = Product.RATING_FIELDS
+
+
+def star_field(rating):
+    return f'stars_{min(max(int(rating), 1), 5)}'
+
+
+def average(total, count):
+    """Mean rating to one decimal, or 0 with no reviews, as a DB expression."""
+    return Coalesce(
+        Round(Cast(total, FloatField()) / NullIf(count, Value(0)), 1),
+        Value(0.0), output_field=FloatField(),
+    )
+
+
+def _update(product_id, count=0, total=0, stars=None):
+    new_count = F('reviews_count') + count
+    new_total = F('rating_sum') + total
+    histogram = {}
+    for rating, step in (stars or {}).items():
+        field = star_field(rating)
+        histogram[field] = histogram.get(field, F(field)) + step
+    # One statement: the right-hand sides all see the row as it was
+    with transaction.atomic(savepoint=False):
+        Product.objects.filter(pk=product_id).update(
+            reviews_count=new_count, rating_sum=new_total, rating=average(new_total, new_count),
+            updated_at=timezone.now(), **histogram,
+        )
+        CatalogVersion.bump()
+
+
+def review_added(product_id, rating):
+    _update(product_id, count=1, total=rating, stars={rating: 1})
+
+
+def review_removed(product_id, rating):
+    _update(product_id, count=-1, total=-rating, stars={rating: -1})
+
+
+def review_changed(product_id, old_rating, new_rating):
+    if old_rating == new_rating:
+        # Text-only edit: still moves updated_at so cached fragments refresh
+        _update(product_id)
+        return
+    _update(product_id, total=new_rating - old_rating, stars={old_rating: -1, new_rating: 1})
+
+
+def reconcile(batch_size=1000):
+    """Recompute every product's aggregates from its reviews.
+
+    Returns the number of products whose stored values had drifted.
+    """
+    counts = {
+        row['product_id']: row
+        for row in Review.objects.values('product_id').annotate(
+            reviews_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'stars_{n}': Count('id', filter=Q(rating=n)) for n in STARS},
+        ).order_by()
+    }
+    drifted = []
+    for product in Product.objects.only('id', *AGGREGATE_FIELDS).iterator(chunk_size=batch_size):
+        row = counts.get(product.id, {})
+        expected = {field: row.get(field, 0) for field in AGGREGATE_FIELDS if field != 'rating'}
+        expected['rating'] = (
+            round(expected['rating_sum'] / expected['reviews_count'], 1) if expected['reviews_count'] else 0.0
+        )
+        # Python and SQL may round the last digit differently
+        if (abs(product.rating - expected['rating']) > 0.051
+                or any(getattr(product, f) != v for f, v in expected.items() if f != 'rating')):
+            for field, value in expected.items():
+                setattr(product, field, value)
+            product.updated_at = timezone.now()
+            drifted.append(product)
+    if drifted:
+        with transaction.atomic(savepoint=False):
+            Product.objects.bulk_update(drifted, AGGREGATE_FIELDS + ('updated_at',), batch_size=batch_size)
+            CatalogVersion.bump()
+    return len(drifted)
@@ -0,0 +1,101 @@
+"""Co-purchase recommendations: the "related products" on a product page.
+
+:func:`rebuild` mines the order lines offline (the ``build_recommendations``
+command, run from cron). Two products are related when the same orders
+contain both, and optionally when the same customers wishlisted both. Those
+counts are the sparse matrix product BᵀB of the basket x product incidence
+matrix B. The database computes it as one grouped self-join, so only the
+non-zero pairs ever leave it, streamed in chunks. Each pair is scored by
+cosine similarity, ``together / sqrt(baskets with a * baskets with b)``, so
+best-sellers do not become everyone's neighbour. The best :data:`TOP_K` per
+product are stored in ProductNeighbour.
+
+:func:`related` reads them for a product page with one indexed lookup and
+fills any gap from the product's category.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import OrderItem, Product, ProductNeighbour, Wishlist
+from .rollups import CANCELLED
+
+TOP_K = 8
+RELATED_SHOWN = 4
+CHUNK_SIZE = 10000
+
+
+def _baskets(lines, basket):
+    """``{product_id: baskets containing it}``."""
+    return dict(lines.values('product_id').annotate(n=Count(basket, distinct=True)).order_by().values_list(
+        'product_id', 'n'))
+
+
+def _pairs(lines, basket, other):
+    """``(product_id, neighbour_id, baskets with both)`` for every pair of products sharing a basket.
+
+    ``other`` reaches the product of another line in the same basket, which
+    makes the self-join.
+    """
+    return lines.annotate(neighbour=F(other)).filter(neighbour__isnull=False).exclude(
+        neighbour=F('product_id'),
+    ).values('product_id', 'neighbour').annotate(together=Count(basket, distinct=True)).order_by().values_list(
+        'product_id', 'neighbour', 'together')
+
+
+def rebuild(top_k=TOP_K, wishlist_weight=0):
+    """Recompute every product's neighbours; returns ``(products, rows)`` written.
+
+    Orders count once per basket. With ``wishlist_weight``, every customer's
+    wishlist is also a basket that counts that much.
+    """
+    orders = OrderItem.objects.filter(product__isnull=False).exclude(order__status=CANCELLED)
+    sizes = defaultdict(float, _baskets(orders, 'order_id'))
+    # Wishlist pairs are few next to order pairs; held in memory and merged into the order stream
+    extra = defaultdict(float)
+    if wishlist_weight:
+        wishlists = Wishlist.objects.filter(user__isnull=False)
+        for product_id, n in _baskets(wishlists, 'user_id').items():
+            sizes[product_id] += wishlist_weight * n
+        for a, b, n in _pairs(wishlists, 'user_id', 'user__wishlist__product_id').iterator(chunk_size=CHUNK_SIZE):
+            extra[a, b] += wishlist_weight * n
+
+    best = defaultdict(list)  # product -> min-heap of its top_k (score, -neighbour)
+
+    def offer(a, b, together):
+        entry = (together / math.sqrt(sizes[a] * sizes[b]), -b)
+        if len(best[a]) < top_k:
+            heapq.heappush(best[a], entry)
+        elif entry > best[a][0]:
+            heapq.heapreplace(best[a], entry)
+
+    for a, b, n in _pairs(orders, 'order_id', 'order__items__product_id').iterator(chunk_size=CHUNK_SIZE):
+        offer(a, b, n + extra.pop((a, b), 0))
+    for (a, b), n in extra.items():
+        offer(a, b, n)
+
+    with transaction.atomic():
+        # Products deleted while the pairs were read would fail the foreign keys
+        live = set(Product.objects.filter(pk__in=best.keys()).values_list('pk', flat=True))
+        rows = [
+            ProductNeighbour(product_id=a, neighbour_id=-b, rank=rank, score=score)
+            for a, heap in best.items() if a in live
+            for rank, (score, b) in enumerate(sorted((e for e in heap if -e[1] in live), reverse=True))
+        ]
+        ProductNeighbour.objects.all().delete()
+        ProductNeighbour.objects.bulk_create(rows, batch_size=1000)
+    return len({row.product_id for row in rows}), len(rows)
+
+
+def related(catalog_snapshot, card, limit=RELATED_SHOWN):
+    """Cards to show as related to ``card``: its neighbours, then others from its category."""
+    ids = ProductNeighbour.objects.filter(product_id=card.id).order_by('rank').values_list(
+        'neighbour_id', flat=True)[:limit]
+    picked = [catalog_snapshot.by_id[i] for i in ids if i in catalog_snapshot.by_id]
+    if len(picked) < limit:
+        taken = {p.id for p in picked}
+        picked += [p for p in catalog_snapshot.related(card, limit + len(picked)) if p.id not in taken]
+    return picked[:limit]
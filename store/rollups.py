@@ -0,0 +1,226 @@
+"""Sales rollups: per-day, per-hour and per-product-day counters, and per-customer totals.
+
+Checkout adds each order as it is placed. Cancelling, un-cancelling or
+deleting an order applies the matching correction. ``rebuild_rollups``
+recomputes the rows from the orders table. Dashboard totals and charts read
+these rows, so their cost grows with the number of days, not orders. The
+customer list sorts by the indexed CustomerStats columns rather than
+totalling every customer's orders for each page.
+
+A cancelled order still counts in ``orders`` (and in ``cancelled``) but not
+in ``revenue`` or ``units``.
+"""
+import itertools
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import CustomerStats, Order, OrderItem, ProductSalesDaily, SalesDaily, SalesHourly
+
+CANCELLED = 'cancelled'
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+BATCH_SIZE = 1000
+
+
+def _buckets(when):
+    local = timezone.localtime(when)
+    return local.date(), local.replace(minute=0, second=0, microsecond=0)
+
+
+def _bump(model, key, defaults=None, **deltas):
+    """Add ``deltas`` to the row at ``key``, creating it if needed."""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **(defaults or {}), **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**key).update(**updates)
+
+
+def order_lines(order):
+    """``(product_id, category, units, revenue)`` per product still in the catalog."""
+    rows = OrderItem.objects.filter(order=order, product__isnull=False).values(
+        'product_id', 'product__category',
+    ).annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+    ).order_by()
+    return [(r['product_id'], r['product__category'], r['units'], r['revenue']) for r in rows]
+
+
+def _apply(order, lines, orders=0, cancelled=0, sales=0):
+    # ``sales`` is +1/-1 to add or remove the order's revenue and units
+    day, hour = _buckets(order.created_at)
+    totals = {
+        'orders': orders, 'cancelled': cancelled,
+        'revenue': sales * order.total, 'units': sales * order.item_count,
+    }
+    _bump(SalesDaily, {'day': day}, **totals)
+    _bump(SalesHourly, {'hour': hour}, **totals)
+    if sales:
+        for product_id, category, units, revenue in lines:
+            _bump(ProductSalesDaily, {'day': day, 'product_id': product_id},
+                  defaults={'category': category}, units=sales * units, revenue=sales * revenue)
+
+
+def order_placed(order, lines):
+    """Record a new order.
+
+    ``lines`` are ``(product_id, category, units, revenue)`` tuples, as from
+    :func:`order_lines`; a product may appear more than once.
+    """
+    _apply(order, lines, orders=1, sales=1)
+    if order.user_id and not CustomerStats.objects.filter(user_id=order.user_id).update(
+            order_count=F('order_count') + 1, total_spent=F('total_spent') + order.total,
+            last_active=Greatest('last_active', Value(order.created_at))):
+        # A user created without the post_save signal (bulk inserts)
+        customer_refreshed(order.user_id)
+
+
+def order_status_changed(order, was_cancelled):
+    is_cancelled = order.status == CANCELLED
+    if is_cancelled == was_cancelled:
+        return
+    step = 1 if is_cancelled else -1
+    _apply(order, order_lines(order), cancelled=step, sales=-step)
+
+
+def order_deleted(order, lines):
+    if order.status == CANCELLED:
+        _apply(order, lines, orders=-1, cancelled=-1)
+    else:
+        _apply(order, lines, orders=-1, sales=-1)
+    if order.user_id:
+        # Runs before the delete; the customer's latest order may be this one
+        customer_refreshed(order.user_id, exclude=order.pk)
+
+
+def customer_joined(user, step=1):
+    if step > 0:
+        CustomerStats.objects.create(user=user, last_active=user.date_joined)
+    if not user.is_staff:
+        _bump(SalesDaily, {'day': timezone.localdate(user.date_joined)}, new_customers=step)
+
+
+def _customer_rows(users, orders=Q()):
+    """CustomerStats for ``users``, totalled from their orders that match ``orders``."""
+    rows = users.values('pk', 'date_joined').annotate(
+        n=Count('order', filter=orders),
+        spent=Coalesce(Sum('order__total', filter=orders), Decimal('0'), output_field=MONEY),
+        last=Max('order__created_at', filter=orders),
+    ).order_by('pk').values_list('pk', 'n', 'spent', 'last', 'date_joined')
+    for pk, n, spent, last, joined in rows.iterator(chunk_size=BATCH_SIZE):
+        yield CustomerStats(user_id=pk, order_count=n, total_spent=spent, last_active=last or joined)
+
+
+def customer_refreshed(user_id, exclude=None):
+    """Recount one customer's totals from their orders, leaving out the order ``exclude``."""
+    for stats in _customer_rows(User.objects.filter(pk=user_id), ~Q(order__pk=exclude) if exclude else Q()):
+        stats.save()
+
+
+# ----- Reads -----
+
+def totals():
+    """All-time ``orders``, ``revenue`` and ``customers``."""
+    return SalesDaily.objects.aggregate(
+        orders=Coalesce(Sum('orders'), 0),
+        revenue=Coalesce(Sum('revenue'), Decimal('0'), output_field=MONEY),
+        customers=Coalesce(Sum('new_customers'), 0),
+    )
+
+
+def daily_series(days):
+    """The last ``days`` days, oldest first, with empty days filled in."""
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = {r.day: r for r in SalesDaily.objects.filter(day__gte=start)}
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        series.append({
+            'day': day,
+            'orders': row.orders if row else 0,
+            'revenue': row.revenue if row else Decimal('0'),
+        })
+    peak = max((d['revenue'] for d in series), default=0) or 1
+    for d in series:
+        d['percent'] = int(d['revenue'] * 100 / peak)
+    return series
+
+
+# ----- Rebuild -----
+
+def rebuild(since=None):
+    """Recompute the rollups from orders (and users) on or after the date ``since``.
+
+    Customer totals cover all time, so they are always recomputed in full.
+    Returns the number of daily rows written.
+    """
+    orders = Order.objects.all()
+    items = OrderItem.objects.filter(product__isnull=False).exclude(order__status=CANCELLED)
+    users = User.objects.filter(is_staff=False)
+    daily, hourly, products = SalesDaily.objects.all(), SalesHourly.objects.all(), ProductSalesDaily.objects.all()
+    if since:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        orders = orders.filter(created_at__gte=start)
+        items = items.filter(order__created_at__gte=start)
+        users = users.filter(date_joined__gte=start)
+        daily, hourly, products = daily.filter(day__gte=since), hourly.filter(hour__gte=start), products.filter(day__gte=since)
+
+    with transaction.atomic():
+        sold = ~Q(status=CANCELLED)
+        counters = {
+            'orders': Count('id'),
+            'cancelled': Count('id', filter=Q(status=CANCELLED)),
+            'revenue': Coalesce(Sum('total', filter=sold), Decimal('0'), output_field=MONEY),
+            'units': Coalesce(Sum('item_count', filter=sold), 0, output_field=IntegerField()),
+        }
+        day_rows = {
+            r['bucket']: SalesDaily(day=r['bucket'], **{k: r[k] for k in counters})
+            for r in orders.annotate(bucket=TruncDate('created_at')).values('bucket').annotate(**counters).order_by()
+        }
+        for r in users.annotate(bucket=TruncDate('date_joined')).values('bucket').annotate(n=Count('id')).order_by():
+            day_rows.setdefault(r['bucket'], SalesDaily(day=r['bucket'])).new_customers = r['n']
+        hour_rows = [
+            SalesHourly(hour=r['bucket'], **{k: r[k] for k in counters})
+            for r in orders.annotate(bucket=TruncHour('created_at')).values('bucket').annotate(**counters).order_by()
+        ]
+        product_rows = [
+            ProductSalesDaily(day=r['bucket'], product_id=r['product_id'], category=r['product__category'],
+                              units=r['units'], revenue=r['revenue'])
+            for r in items.annotate(bucket=TruncDate('order__created_at')).values(
+                'bucket', 'product_id', 'product__category',
+            ).annotate(
+                units=Sum('quantity'),
+                revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+            ).order_by()
+        ]
+        daily.delete()
+        hourly.delete()
+        products.delete()
+        SalesDaily.objects.bulk_create(day_rows.values(), batch_size=1000)
+        SalesHourly.objects.bulk_create(hour_rows, batch_size=1000)
+        ProductSalesDaily.objects.bulk_create(product_rows, batch_size=1000)
+        rebuild_customers()
+        return len(day_rows)
+
+
+def rebuild_customers():
+    """Recompute every customer's totals from all of their orders, in batches."""
+    CustomerStats.objects.all().delete()
+    rows = _customer_rows(User.objects.all())
+    while batch := list(itertools.islice(rows, BATCH_SIZE)):
+        CustomerStats.objects.bulk_create(batch)
@@ -0,0 +1,64 @@
+"""Product search.
+
+On PostgreSQL, search uses the trigger-maintained ``search_vector`` column and
+its GIN index. Autocomplete uses the trigram index on ``upper(name)``. Other
+databases, such as SQLite in local testing, fall back to LIKE matching with
+the same call signatures.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+from .models import Product
+from .pagination import keyset_page
+
+SEARCH_LIMIT = 48
+# Most relevant first; ``id`` makes the order total, so it can be keyset-paged
+RELEVANCE = ('-rank', 'id')
+SUGGEST_LIMIT = 6
+MIN_QUERY_LENGTH = 2
+
+
+def _postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_products(products, q):
+    """Filter ``products`` to matches for ``q``, annotated with a ``rank`` (higher is better)."""
+    if _postgres():
+        query = SearchQuery(q, config='english', search_type='websearch')
+        # ts_rank is a float4; as a double it survives the round trip through a cursor exactly
+        return products.filter(search_vector=query).annotate(
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+    condition = Q()
+    for term in q.split():
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return products.filter(condition).annotate(rank=Case(
+        When(name__icontains=q, then=Value(1.0)),
+        default=Value(0.5), output_field=FloatField(),
+    ))
+
+
+def ranked_page(matches, cursor=None, ordering=RELEVANCE):
+    """``(rows, next_cursor)`` for one page of an already-searched queryset, most relevant first.
+
+    ``ordering`` may put other keys before :data:`RELEVANCE`.
+    """
+    return keyset_page(matches, ordering, cursor)
+
+
+def ranked(products, q, limit=SEARCH_LIMIT):
+    """Best ``limit`` matches for ``q``, most relevant first."""
+    return list(search_products(products, q).order_by(*RELEVANCE)[:limit])
+
+
+def suggest(prefix, limit=SUGGEST_LIMIT):
+    """Autocomplete: products whose name contains ``prefix``, closest first."""
+    products = Product.objects.only('id', 'name', 'slug', 'price', 'image').filter(name__icontains=prefix)
+    if _postgres():
+        products = products.annotate(
+            similarity=TrigramWordSimilarity(prefix, 'name')).order_by('-similarity', 'name')
+    else:
+        products = products.order_by('name')
+    return list(products[:limit])
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import inventory, ratings, rollups
+from .models import CatalogVersion, Order, Product, ProductVariant, Review
+
+
+# Review writes keep the product's rating aggregates current. The same
+# UPDATE moves Product.updated_at, which keys the cached detail fragments.
+
+# Product.save() bumps the catalog version itself; deletes and direct
+# variant edits (the admin's inline) do it here.
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def catalog_changed(sender, **kwargs):
+    CatalogVersion.bump()
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    counted = getattr(instance, '_counted', None)
+    if created or counted is None:
+        ratings.review_added(instance.product_id, instance.rating)
+    elif counted[0] != instance.product_id:
+        ratings.review_removed(*counted)
+        ratings.review_added(instance.product_id, instance.rating)
+    else:
+        ratings.review_changed(instance.product_id, counted[1], instance.rating)
+    instance._counted = (instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    counted = getattr(instance, '_counted', None) or (instance.product_id, instance.rating)
+    ratings.review_removed(*counted)
+
+
+@receiver(post_save, sender=Order)
+def rollup_status_change(sender, instance, created, **kwargs):
+    # New orders are recorded by checkout.place_order once their lines exist
+    loaded = getattr(instance, '_loaded_status', None)
+    if not created and loaded is not None:
+        rollups.order_status_changed(instance, was_cancelled=loaded == rollups.CANCELLED)
+        inventory.order_status_changed(instance, was_cancelled=loaded == rollups.CANCELLED)
+    instance._loaded_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def rollup_order_deleted(sender, instance, **kwargs):
+    # pre_delete: the order's items are still there to read
+    rollups.order_deleted(instance, rollups.order_lines(instance))
+
+
+@receiver(post_save, sender=User)
+def rollup_new_customer(sender, instance, created, **kwargs):
+    if created:
+        rollups.customer_joined(instance)
+
+
+@receiver(post_delete, sender=User)
+def rollup_removed_customer(sender, instance, **kwargs):
+    rollups.customer_joined(instance, step=-1)
@@ -0,0 +1,233 @@
+"""In-memory catalog snapshot, one per worker process.
+
+The catalog is small next to the traffic that reads it, so every process
+keeps all of it in memory. Each product is one read-only :class:`Card`, with
+its sizes and colors already split and its discount already worked out. The
+cards are indexed by id, by slug, by category, and by every sort key of
+:data:`catalog.SORT_ORDERINGS`, both over the whole catalog and within each
+category. ``home``, ``shop`` (unless it is a search) and ``product_detail``
+filter, sort, page and count facets from them without a query.
+:meth:`Snapshot.ranked_page` pages through the best-seller ranking, reading
+from the database only the window of it that the page needs.
+
+A snapshot never changes. Each request reads the catalog version, the
+counter in CatalogVersion that every catalog write bumps as it commits (see
+conditional.py). That is one small query, and a conditional view has already
+made it. If the version differs from the snapshot's, a new snapshot is built
+from two queries, one for products and one for variants. Anything a card
+shows moves the version: edits, imports, reviews, and selling out or
+restocking.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+
+from . import bestsellers, facets
+from .catalog import CARD_FIELDS, SORT_ORDERINGS
+from .conditional import catalog_version
+from .models import Product, ProductVariant
+from .pagination import PAGE_SIZE, decode_cursor, encode_cursor
+
+# Card columns plus what the detail page shows
+ROW_FIELDS = CARD_FIELDS + ('description', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
+
+
+class Card:
+    """One product as the storefront shows it; read-only."""
+    __slots__ = ROW_FIELDS + ('discount_percent', 'sold_out', 'sizes', 'colors', 'variants')
+
+    def __init__(self, row, variants):
+        """``row`` holds :data:`ROW_FIELDS`; ``variants`` is ``[(size, color, stock)]`` in position order."""
+        put = object.__setattr__
+        for name, value in zip(ROW_FIELDS, row):
+            put(self, name, value)
+        put(self, 'discount_percent', Product.discount_percent.fget(self))
+        put(self, 'sizes', tuple(dict.fromkeys(size for size, _, _ in variants)))
+        put(self, 'colors', tuple(dict.fromkeys(color for _, color, _ in variants)))
+        put(self, 'variants', frozenset((size, color) for size, color, _ in variants))
+        # Same rule as inventory.sold_out(): every variant tracked and at zero
+        put(self, 'sold_out', bool(variants) and all(stock == 0 for _, _, stock in variants))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Snapshot cards are read-only')
+
+    def __repr__(self):
+        return f'<Card {self.id} {self.slug}>'
+
+    @property
+    def pk(self):
+        return self.id
+
+    star_histogram = Product.star_histogram
+
+    def get_sizes_list(self):
+        return list(self.sizes)
+
+    def get_colors_list(self):
+        return list(self.colors)
+
+
+def _names(ordering):
+    return tuple(key.lstrip('-') for key in ordering)
+
+
+class Snapshot:
+    def __init__(self, version, cards):
+        self.version = version
+        self.cards = cards
+        self.by_id = {card.id: card for card in cards}
+        self.by_slug = {card.slug: card for card in cards}
+        by_category = {}
+        for card in cards:
+            by_category.setdefault(card.category, []).append(card)
+        self.by_category = {category: tuple(members) for category, members in by_category.items()}
+        # (category or None, sort key names) -> (keys, cards), ascending by the keys
+        self._sorted = {}
+        for scope, members in [(None, cards), *self.by_category.items()]:
+            for names in {_names(ordering) for ordering in SORT_ORDERINGS.values()}:
+                ordered = sorted(members, key=lambda card: tuple(getattr(card, name) for name in names))
+                keys = [tuple(getattr(card, name) for name in names) for card in ordered]
+                self._sorted[scope, names] = keys, tuple(ordered)
+
+    def listing(self, category=None):
+        """The cards of one category (or all of them), in id order."""
+        return self.by_category.get(category, ()) if category else self.cards
+
+    def ordered(self, sort, category=None):
+        """Every card of ``category`` in the ``?sort=`` order."""
+        ordering = SORT_ORDERINGS.get(sort, SORT_ORDERINGS['featured'])
+        _, cards = self._sorted.get((category or None, _names(ordering)), ((), ()))
+        return cards[::-1] if ordering[0].startswith('-') else cards
+
+    def page(self, category, filters, sort, cursor=None, page_size=PAGE_SIZE):
+        """``(cards, next_cursor)`` like :func:`catalog.product_page`, and with the same cursors.
+
+        Walks the sort index from the cursor and keeps cards that pass the
+        filters, stopping one past a full page.
+        """
+        ordering = SORT_ORDERINGS.get(sort, SORT_ORDERINGS['featured'])
+        names = _names(ordering)
+        keys, cards = self._sorted.get((category or None, names), ((), ()))
+        after = None
+        values = decode_cursor(cursor, len(names))
+        if values is not None:
+            try:
+                after = tuple(Product._meta.get_field(name).to_python(v) for name, v in zip(names, values))
+            except (ValidationError, ValueError, TypeError):
+                # Tampered cursor values: fall back to the first page
+                pass
+        rows, more = _walk(keys, cards, after, filters, page_size, descending=ordering[0].startswith('-'))
+        return rows, encode_cursor(getattr(rows[-1], name) for name in names) if more else None
+
+    def ranked_page(self, category, filters, cursor=None, page_size=PAGE_SIZE):
+        """:meth:`page` in best-seller order: the ranking of ``category`` first, then the rest by id.
+
+        The cursor holds the last card's place in the ranking
+        (bestsellers.UNRANKED for the rest) and its id.
+        """
+        values = decode_cursor(cursor, 2)
+        place, last_id = values if values and all(type(v) is int for v in values) else (-1, 0)
+        match = facets.matcher(filters)
+        rows = list(islice(
+            ((place, card) for place, card in self._best_selling(category, place, last_id, page_size + 1)
+             if match(card)),
+            page_size + 1))
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        return [card for _, card in rows], encode_cursor((rows[-1][0], rows[-1][1].id)) if more else None
+
+    def _best_selling(self, category, place, last_id, window):
+        """``(place, card)`` in best-seller order after ``(place, last_id)``.
+
+        Only as much is read as the caller takes: the ranking a window at a
+        time from ``place`` on, then the cards after ``last_id`` with one
+        query per window for which of them are ranked (none if this walk
+        read the whole ranking). The window doubles with each read, so a
+        heavily filtered page still takes few queries.
+        """
+        read = set() if place < 0 else None
+        while place < bestsellers.UNRANKED:
+            rows = bestsellers.places(category, place, window)
+            for place, product_id in rows:
+                if read is not None:
+                    read.add(product_id)
+                card = self.by_id.get(product_id)
+                # Deleted, or moved to another category, since the ranking was built
+                if card is not None and (not category or card.category == category):
+                    yield place, card
+            if len(rows) < window:
+                place, last_id = bestsellers.UNRANKED, 0
+            window *= 2
+        keys, cards = self._sorted.get((category or None, ('id',)), ((), ()))
+        start = bisect_right(keys, (last_id,))
+        while start < len(cards):
+            chunk = cards[start:start + window]
+            ranked = read if read is not None else bestsellers.ranked_among([card.id for card in chunk], category)
+            for card in chunk:
+                if card.id not in ranked:
+                    yield bestsellers.UNRANKED, card
+            start += window
+            window *= 2
+
+    def related(self, card, limit=4):
+        """Other cards of ``card``'s category, as the detail page lists them."""
+        return [other for other in self.by_category.get(card.category, ()) if other.id != card.id][:limit]
+
+
+def _walk(keys, cards, after, filters, page_size, descending=False):
+    """Up to ``page_size`` of ``cards`` (ascending by ``keys``) that come after ``after`` and pass the filters.
+
+    Returns ``(rows, more)``; ``descending`` walks the cards backwards.
+    """
+    start, stop = 0, len(cards)
+    if after is not None:
+        try:
+            if descending:
+                stop = bisect_left(keys, after)
+            else:
+                start = bisect_right(keys, after)
+        except TypeError:
+            pass
+    match = facets.matcher(filters)
+    rows = []
+    for i in range(stop - 1, start - 1, -1) if descending else range(start, stop):
+        if match(cards[i]):
+            rows.append(cards[i])
+            if len(rows) > page_size:
+                break
+    return rows[:page_size], len(rows) > page_size
+
+
+def build(version):
+    variants = {}
+    for product_id, size, color, stock in ProductVariant.objects.order_by('product_id', 'position').values_list(
+            'product_id', 'size', 'color', 'stock'):
+        variants.setdefault(product_id, []).append((size, color, stock))
+    rows = Product.objects.order_by('id').values_list(*ROW_FIELDS)
+    return Snapshot(version, tuple(Card(row, variants.get(row[0], ())) for row in rows))
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def clear():
+    """Drop this process's snapshot; the next request builds a new one."""
+    global _current
+    _current = None
+
+
+def current(request):
+    """The snapshot for the catalog version ``request`` sees, rebuilt if it moved."""
+    global _current
+    version = catalog_version(request)
+    snapshot = _current
+    if snapshot is None or snapshot.version != version:
+        # One thread rebuilds; the others wait for it rather than build the same thing
+        with _lock:
+            if _current is None or _current.version != version:
+                _current = build(version)
+            snapshot = _current
+    return snapshot
@@ -0,0 +1,98 @@
+"""Per-visitor header summary (cart count + wishlist ids).
+
+For logged-in users it is kept in the cache when ``settings.SUMMARY_CACHE``
+is on, which needs a cache shared by every worker. Storefront pages then do
+not aggregate CartItem/Wishlist on every render. Cart and wishlist writes
+invalidate it, and the next read rebuilds it with two small queries. With
+the summary cache off, they are made once per request.
+Anonymous visitors' summaries come straight from their basket cookie
+(see basket.py). Async views use the ``a``-prefixed variants.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .basket import Basket
+from .models import CartItem, Wishlist
+
+SUMMARY_TIMEOUT = 300
+
+EMPTY_SUMMARY = {'cart_count': 0, 'wishlist_ids': frozenset()}
+
+
+def _key(user_id):
+    return f'summary:user:{user_id}'
+
+
+def _build(user):
+    carts = CartItem.objects.filter(user=user)
+    wishlist = Wishlist.objects.filter(user=user)
+    return {
+        'cart_count': carts.aggregate(total=Sum('quantity'))['total'] or 0,
+        'wishlist_ids': frozenset(wishlist.values_list('product_id', flat=True)),
+    }
+
+
+async def _abuild(user):
+    carts = CartItem.objects.filter(user=user)
+    wishlist = Wishlist.objects.filter(user=user)
+    return {
+        'cart_count': (await carts.aaggregate(total=Sum('quantity')))['total'] or 0,
+        'wishlist_ids': frozenset([p async for p in wishlist.values_list('product_id', flat=True)]),
+    }
+
+
+def _from_basket(request):
+    basket = Basket.from_request(request)
+    if not basket:
+        return EMPTY_SUMMARY
+    return {'cart_count': basket.count, 'wishlist_ids': frozenset(basket.wishlist)}
+
+
+def get_summary(request):
+    """Return ``{'cart_count': int, 'wishlist_ids': frozenset}`` for the visitor."""
+    if not request.user.is_authenticated:
+        return _from_basket(request)
+    if not settings.SUMMARY_CACHE:
+        # Several parts of a page read it; build it once per request
+        built = getattr(request, '_summary', None)
+        if built is None or built[0] != request.user.pk:
+            built = request._summary = request.user.pk, _build(request.user)
+        return built[1]
+    key = _key(request.user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _build(request.user)
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+async def aget_summary(request, user):
+    """Async :func:`get_summary`; ``user`` is the awaited ``request.auser()``."""
+    if not user.is_authenticated:
+        return _from_basket(request)
+    if not settings.SUMMARY_CACHE:
+        return await _abuild(user)
+    key = _key(user.pk)
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await _abuild(user)
+        await cache.aset(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_summary(request=None, user_id=None):
+    """Drop the cached summary of the request's user and/or of ``user_id``."""
+    keys = []
+    if request is not None:
+        request.__dict__.pop('_summary', None)
+    if request is not None and request.user.is_authenticated:
+        keys.append(_key(request.user.pk))
+    if user_id:
+        keys.append(_key(user_id))
+    if keys:
+        cache.delete_many(keys)
+
+
+async def ainvalidate_summary(user_id):
+    await cache.adelete(_key(user_id))
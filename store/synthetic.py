@@ -0,0 +1,482 @@
+"""Deterministic synthetic store data for load and performance testing.
+
+``seed_data --scale`` drives this. Every value comes from one seeded
+``random.Random``, and rows get explicit primary keys, so the same seed and
+counts always produce the same rows. Timestamps are offsets back from the
+start of the current day. Rows are built and bulk-inserted one chunk at a
+time. Only a compact per-product and per-user summary stays in memory; orders
+never do.
+
+Popularity follows a Zipf law. A few products take most of the sales and
+reviews, and a few customers place most of the orders, with a long tail of
+one-time buyers. Order volume grows over the window, and orders follow a daily
+traffic curve.
+"""
+import bisect
+import io
+import itertools
+import math
+import random
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .checkout import format_order_number, shipping_for
+from .models import (
+    Address, BestSeller, CartItem, CatalogVersion, CustomerStats, Order, OrderItem, Product, ProductNeighbour,
+    ProductSalesDaily, ProductVariant, Review, SalesDaily, SalesHourly, Wishlist,
+)
+
+USERNAME_PREFIX = 'synth-'
+PASSWORD = 'synthetic-pass'
+
+# Row counts at --scale 1; each grows linearly with the scale
+BASE_COUNTS = {'products': 1000, 'users': 10000, 'orders': 100000, 'reviews': 20000}
+
+# Zipf exponents: product popularity is steeper than customer loyalty
+PRODUCT_SKEW = 1.07
+CUSTOMER_SKEW = 0.8
+
+GUEST_ORDER_RATE = 0.1
+CANCEL_RATE = 0.05
+CART_RATE = 0.03
+WISHLIST_RATE = 0.08
+ANONYMOUS_RATE = 0.02
+
+# Relative order volume per hour of the day, midnight first
+HOURLY_TRAFFIC = (2, 1, 1, 1, 1, 2, 3, 5, 7, 8, 9, 10, 11, 10, 9, 9, 10, 11, 13, 15, 16, 14, 9, 5)
+
+CATEGORY_WEIGHTS = {'streetwear': 30, 'essentials': 30, 'outerwear': 20, 'new': 15, 'limited': 5}
+ADJECTIVES = ('Shadow', 'Noir', 'Classic', 'Street', 'Onyx', 'Minimal', 'Gold', 'Stealth', 'Luxe', 'Tech',
+              'Raw', 'Essential', 'Phantom', 'Cyber', 'Apex', 'Urban', 'Midnight', 'Vapor', 'Carbon', 'Nova')
+GARMENTS = {
+    'streetwear': ('Oversized Tee', 'Cargo Pants', 'Track Set', 'Shorts', 'Graphic Tee'),
+    'essentials': ('Hoodie', 'Logo Tee', 'Joggers', 'Crewneck', 'Sweatpants'),
+    'outerwear': ('Bomber Jacket', 'Puffer Vest', 'Windbreaker', 'Denim Jacket', 'Parka'),
+    'new': ('Hoodie', 'Performance Tee', 'Utility Vest', 'Overshirt', 'Jersey'),
+    'limited': ('Edition Hoodie', 'Collection Jacket', 'Varsity Jacket', 'Signature Tee', 'Coach Jacket'),
+}
+SIZE_RUNS = ('S,M,L,XL', 'S,M,L,XL,XXL', 'S,M,L', 'XS,S,M,L,XL')
+COLORS = ('#000', '#FFF', '#1a1a2e', '#2d2d2d', '#00D4FF', '#556B2F', '#0d1b2a', '#191970')
+IMAGES = (
+    'https://images.unsplash.com/photo-1521572163474-6864f9cf17ab?w=600&h=750&fit=crop',
+    'https://images.unsplash.com/photo-1556821840-3a63f95609a7?w=600&h=750&fit=crop',
+    'https://images.unsplash.com/photo-1551028719-00167b16eac5?w=600&h=750&fit=crop',
+    'https://images.unsplash.com/photo-1624378439575-d8705ad7ae80?w=600&h=750&fit=crop',
+    'https://images.unsplash.com/photo-1506629082955-511b1aa562c8?w=600&h=750&fit=crop',
+    'https://images.unsplash.com/photo-1578587018452-892bacefd3f2?w=600&h=750&fit=crop',
+)
+FIRST_NAMES = ('Rahul', 'Alex', 'Dev', 'Arjun', 'Karthik', 'Priya', 'Ananya', 'Rohan', 'Sneha', 'Vikram',
+               'Isha', 'Aditya', 'Meera', 'Kabir', 'Nikhil', 'Tara', 'Sahil', 'Zoya', 'Varun', 'Neha')
+LAST_NAMES = ('Mehta', 'Kumar', 'Sharma', 'Patel', 'Reddy', 'Iyer', 'Singh', 'Gupta', 'Nair', 'Das',
+              'Rao', 'Khan', 'Joshi', 'Bose', 'Menon')
+CITIES = (('Mumbai', 'Maharashtra', '400001'), ('Delhi', 'Delhi', '110001'), ('Bengaluru', 'Karnataka', '560001'),
+          ('Hyderabad', 'Telangana', '500001'), ('Chennai', 'Tamil Nadu', '600001'), ('Pune', 'Maharashtra', '411001'),
+          ('Kolkata', 'West Bengal', '700001'), ('Ahmedabad', 'Gujarat', '380001'), ('Jaipur', 'Rajasthan', '302001'))
+CARRIERS = ('Delhivery', 'BlueDart', 'DTDC', 'Ekart')
+REVIEW_TEXTS = {
+    5: ('Absolutely insane quality. The fit is perfect.', 'Best streetwear piece I own. Worth every rupee.'),
+    4: ('Great quality, runs slightly oversized.', 'Solid piece, shipping was fast.'),
+    3: ('Decent, but the fabric is thinner than expected.', 'Okay fit. Colour is a bit off from the photos.'),
+    2: ('Sizing was way off and the exchange took weeks.', 'Faded after a few washes.'),
+    1: ('Stitching came apart in the first week.', 'Not what was shown. Returned it.'),
+}
+
+
+# What order, review and cart generation need to know about each product
+CatalogEntry = namedtuple('CatalogEntry', 'id name slug image price category variants quality')
+
+
+class Zipf:
+    """Draws ranks ``0..n-1`` with probability proportional to ``1 / (rank + 1) ** s``."""
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate((k ** -s for k in range(1, n + 1))))
+        self.last = n - 1
+
+    def draw(self):
+        return min(bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1]), self.last)
+
+
+def scaled_counts(scale, **overrides):
+    """Row counts for ``scale``, with any explicit count in ``overrides`` winning."""
+    counts = {name: max(int(base * scale), 1) for name, base in BASE_COUNTS.items()}
+    counts.update({name: n for name, n in overrides.items() if n is not None})
+    return counts
+
+
+def reset():
+    """Delete the catalog and everything built on it, every order, review and rollup, and earlier synthetic users.
+
+    Runs plain DELETEs: per-row signals would be pointless here, and the
+    rollups are rebuilt afterwards anyway.
+    """
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in (OrderItem, Order, Review, CartItem, Wishlist, ProductSalesDaily, SalesDaily,
+                      SalesHourly, CustomerStats, BestSeller, ProductNeighbour, ProductVariant, Product):
+            cursor.execute(f'DELETE FROM {qn(model._meta.db_table)}')
+        Address.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+        cursor.execute(f'DELETE FROM {qn(User._meta.db_table)} WHERE username LIKE %s', [USERNAME_PREFIX + '%'])
+        CatalogVersion.bump()
+
+
+@contextmanager
+def _backdated():
+    # bulk_create would otherwise stamp every row with the current time
+    fields = [model._meta.get_field('created_at') for model in (Product, Order, Review, Address)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _next_id(model):
+    return (model.objects.aggregate(n=Max('pk'))['n'] or 0) + 1
+
+
+def _copy_value(value):
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def write_rows(model, objs):
+    """Insert ``objs`` (with their primary keys set) in one statement.
+
+    PostgreSQL gets a COPY, which skips the per-field work of compiling an
+    INSERT and is several times faster at this volume. Other databases use
+    ``bulk_create``.
+    """
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs)
+        return
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    for obj in objs:
+        # pre_save fills auto_now columns, as bulk_create would
+        buffer.write('\t'.join(_copy_value(f.pre_save(obj, True)) for f in fields) + '\n')
+    qn = connection.ops.quote_name
+    sql = f"COPY {qn(model._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) FROM STDIN"
+    with connection.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def _person(i):
+    return FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+
+
+class Generator:
+    """Builds one synthetic dataset; see :func:`generate`."""
+
+    def __init__(self, counts, seed, days, chunk_size, log):
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.days = days
+        self.chunk_size = chunk_size
+        self.log = log
+        self.end = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+        self.hours = list(itertools.accumulate(HOURLY_TRAFFIC))
+        self.next_ids = {}
+
+    def _claim(self, model, count):
+        """Reserve ``count`` primary keys for ``model``; returns the first."""
+        first = self.next_ids.get(model) or _next_id(model)
+        self.next_ids[model] = first + count
+        return first
+
+    def _insert(self, model, rows):
+        total = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            if chunk[0].pk is None:
+                for pk, obj in enumerate(chunk, self._claim(model, len(chunk))):
+                    obj.pk = pk
+            with transaction.atomic():
+                write_rows(model, chunk)
+            total += len(chunk)
+        self.log(f'  {model.__name__}: {total}')
+        return total
+
+    def _moment(self, not_before=None):
+        # Volume grows linearly over the window (sqrt of a uniform draw), and
+        # the hour of day follows HOURLY_TRAFFIC
+        day = min(int(self.days * math.sqrt(self.rng.random())), self.days - 1)
+        hour = bisect.bisect(self.hours, self.rng.random() * self.hours[-1])
+        when = self.start + timedelta(days=day, hours=hour, seconds=self.rng.randrange(3600))
+        return max(when, not_before) if not_before else when
+
+    # ----- Catalog -----
+
+    def products(self):
+        rng, categories = self.rng, list(CATEGORY_WEIGHTS)
+        weights = list(CATEGORY_WEIGHTS.values())
+        first_id = self._claim(Product, self.counts['products'])
+        self.catalog = []
+
+        def rows():
+            for i in range(self.counts['products']):
+                pk = first_id + i
+                category = rng.choices(categories, weights)[0]
+                name = f'{rng.choice(ADJECTIVES)} {rng.choice(GARMENTS[category])} {pk}'
+                # Log-normal prices, mostly ₹60–₹300 with a long premium tail
+                price = Decimal(max(29, int(rng.lognormvariate(4.8, 0.45))))
+                old_price = (price * Decimal('1.3')).quantize(Decimal('1')) if rng.random() < 0.25 else None
+                sizes = rng.choice(SIZE_RUNS)
+                colors = ','.join(rng.sample(COLORS, rng.randint(1, 4)))
+                image = rng.choice(IMAGES)
+                product = Product(
+                    id=pk, name=name, slug=slugify(name), price=price, old_price=old_price,
+                    category=category, image=image, image_hover=rng.choice(IMAGES),
+                    description=f'{name}: heavyweight cotton, relaxed fit, built for everyday wear.',
+                    sizes=sizes, colors=colors,
+                    badge=rng.choice(('', '', '', 'New', 'Best Seller', 'Limited')),
+                    created_at=self.start + timedelta(seconds=rng.randrange(self.days * 86400 // 4)),
+                )
+                self.catalog.append(CatalogEntry(pk, name, product.slug, image, price, category,
+                                                 list(ProductVariant.combinations(sizes, colors)), rng.random()))
+                yield product
+
+        self._insert(Product, rows())
+        self._insert(ProductVariant, (
+            ProductVariant(product_id=entry.id, size=size, color=color, position=position)
+            for entry in self.catalog
+            for position, (size, color) in enumerate(entry.variants)
+        ))
+        # Popularity rank -> catalog index, so bestsellers are not simply the oldest products
+        self.popular = list(range(len(self.catalog)))
+        rng.shuffle(self.popular)
+        self.product_zipf = Zipf(len(self.catalog), PRODUCT_SKEW, rng)
+
+    def _popular_product(self):
+        return self.catalog[self.popular[self.product_zipf.draw()]]
+
+    # ----- Customers -----
+
+    def users(self):
+        rng, password = self.rng, make_password(PASSWORD)
+        first_id = self._claim(User, self.counts['users'])
+        self.joined = []
+
+        def rows():
+            for i in range(self.counts['users']):
+                first, last = _person(i)
+                joined = self.start + timedelta(seconds=rng.randrange(self.days * 86400))
+                self.joined.append((first_id + i, joined))
+                yield User(
+                    id=first_id + i, username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com',
+                    first_name=first, last_name=last, password=password, date_joined=joined,
+                )
+
+        self._insert(User, rows())
+        self.customer_zipf = Zipf(len(self.joined), CUSTOMER_SKEW, rng)
+
+    def _address(self, i):
+        city, state, pincode = CITIES[i % len(CITIES)]
+        return f'{i % 300 + 1}, {LAST_NAMES[i % len(LAST_NAMES)]} Road', city, state, pincode
+
+    def addresses(self):
+        rng = self.rng
+
+        def rows():
+            for i, (user_id, joined) in enumerate(self.joined):
+                if rng.random() < 0.3:
+                    continue
+                for n in range(1 if rng.random() < 0.8 else 2):
+                    line, city, state, pincode = self._address(i + n)
+                    yield Address(
+                        user_id=user_id, label=('home', 'work')[n], full_name=' '.join(_person(i)),
+                        phone=f'9{i:09d}'[-10:], address_line=line, city=city, state=state, pincode=pincode,
+                        is_default=n == 0, created_at=joined,
+                    )
+
+        self._insert(Address, rows())
+
+    # ----- Orders -----
+
+    def _status(self, placed):
+        age = (self.end - placed).days
+        if self.rng.random() < CANCEL_RATE:
+            return 'cancelled'
+        if age >= 7:
+            return 'delivered'
+        if age >= 3:
+            return self.rng.choice(('shipped', 'out_for_delivery', 'delivered'))
+        if age >= 1:
+            return self.rng.choice(('confirmed', 'shipped'))
+        return 'processing'
+
+    def _order(self, pk, items):
+        rng = self.rng
+        if rng.random() < GUEST_ORDER_RATE:
+            i, user_id, placed = rng.randrange(len(self.joined)), None, self._moment()
+        else:
+            i = self.customer_zipf.draw()
+            user_id, joined = self.joined[i]
+            placed = self._moment(not_before=joined)
+        first, last = _person(i)
+        line, city, state, pincode = self._address(i)
+        lines, seen = [], set()
+        # 1 + geometric lines: most orders hold one or two products
+        for _ in range(min(1 + int(rng.expovariate(1.2)), 6)):
+            product = self._popular_product()
+            if product.id in seen:
+                continue
+            seen.add(product.id)
+            size, color = rng.choice(product.variants)
+            quantity = 1 if rng.random() < 0.8 else rng.randint(2, 3)
+            lines.append((product.name, quantity, product.price * quantity))
+            items.append(OrderItem(
+                order_id=pk, product_id=product.id, product_name=product.name, product_slug=product.slug,
+                product_image=product.image, price=product.price, size=size, color=color, quantity=quantity,
+            ))
+        subtotal = sum(total for _, _, total in lines)
+        shipping = shipping_for(subtotal)
+        status = self._status(placed)
+        shipped = delivered = None
+        if status in ('shipped', 'out_for_delivery', 'delivered'):
+            shipped = placed + timedelta(hours=rng.randint(12, 48))
+            if status == 'delivered':
+                delivered = shipped + timedelta(hours=rng.randint(24, 96))
+        return Order(
+            id=pk, order_number=format_order_number(pk), session_key=f'synth-{i}', user_id=user_id,
+            first_name=first, last_name=last, email=f'{USERNAME_PREFIX}{i}@example.com', phone=f'9{i:09d}'[-10:],
+            address=line, city=city, state=state, zip_code=pincode, payment_method=rng.choice(('card', 'upi', 'cod')),
+            subtotal=subtotal, shipping=shipping, total=subtotal + shipping, status=status,
+            tracking_number=f'TRK{pk:010d}' if shipped else '', carrier=rng.choice(CARRIERS) if shipped else '',
+            shipped_at=shipped, delivered_at=delivered, created_at=placed,
+            item_count=sum(q for _, q, _ in lines), items_preview=Order.build_preview((n, q) for n, q, _ in lines),
+        )
+
+    def orders(self):
+        total, lines = self.counts['orders'], 0
+        first_id = self._claim(Order, total)
+        for offset in range(0, total, self.chunk_size):
+            items = []
+            orders = [self._order(first_id + n, items)
+                      for n in range(offset, min(offset + self.chunk_size, total))]
+            for pk, item in enumerate(items, self._claim(OrderItem, len(items))):
+                item.pk = pk
+            with transaction.atomic():
+                write_rows(Order, orders)
+                write_rows(OrderItem, items)
+            lines += len(items)
+            if (offset // self.chunk_size) % 20 == 19:
+                self.log(f'  ... {offset + len(orders)} orders')
+        self.log(f'  orders: {total} ({lines} lines)')
+
+    # ----- Reviews, carts, wishlists -----
+
+    def reviews(self):
+        rng, seen = self.rng, set()
+
+        def rows():
+            # Bounded: a crowded catalog can run out of unused (user, product) pairs
+            for _ in range(self.counts['reviews'] * 3):
+                if len(seen) >= self.counts['reviews']:
+                    return
+                product = self._popular_product()
+                i = rng.randrange(len(self.joined))
+                user_id, joined = self.joined[i]
+                if (user_id, product.id) in seen:
+                    continue
+                seen.add((user_id, product.id))
+                # Skewed positive like real shops; better products skew further
+                rating = max(1, 5 - int(rng.expovariate(1 / (0.3 + 1.2 * (1 - product.quality)))))
+                first, last = _person(i)
+                yield Review(
+                    product_id=product.id, user_id=user_id, name=f'{first} {last[0]}.', rating=rating,
+                    text=rng.choice(REVIEW_TEXTS[rating]), created_at=self._moment(not_before=joined),
+                )
+
+        self._insert(Review, rows())
+
+    def _basket(self, make, low, high):
+        picked = {}
+        for _ in range(self.rng.randint(low, high)):
+            product = self._popular_product()
+            if product.id not in picked:
+                picked[product.id] = make(product)
+        return picked.values()
+
+    def carts(self):
+        rng = self.rng
+
+        def line(user_id, key):
+            def make(product):
+                size, color = rng.choice(product.variants)
+                return CartItem(user_id=user_id, session_key=key, product_id=product.id,
+                                size=size, color=color, quantity=rng.randint(1, 2))
+            return make
+
+        def rows():
+            for i, (user_id, _) in enumerate(self.joined):
+                if rng.random() < CART_RATE:
+                    yield from self._basket(line(user_id, f'synth-{i}'), 1, 3)
+                if rng.random() < ANONYMOUS_RATE:
+                    yield from self._basket(line(None, f'synth-anon-{i}'), 1, 3)
+
+        self._insert(CartItem, rows())
+
+    def wishlists(self):
+        rng = self.rng
+
+        def rows():
+            for i, (user_id, _) in enumerate(self.joined):
+                if rng.random() < WISHLIST_RATE:
+                    yield from self._basket(
+                        lambda p: Wishlist(user_id=user_id, session_key=f'synth-{i}', product_id=p.id), 1, 6)
+                if rng.random() < ANONYMOUS_RATE:
+                    yield from self._basket(
+                        lambda p: Wishlist(session_key=f'synth-anon-{i}', product_id=p.id), 1, 3)
+
+        self._insert(Wishlist, rows())
+
+
+def generate(counts, seed=42, days=365, chunk_size=5000, log=print):
+    """Insert a synthetic dataset of ``counts`` (see :func:`scaled_counts`).
+
+    Inserts go through ``bulk_create``, so no per-row signals fire. The
+    caller rebuilds the rating aggregates and the sales rollups afterwards.
+    """
+    generator = Generator(counts, seed, days, chunk_size, log)
+    with _backdated():
+        generator.products()
+        generator.users()
+        generator.addresses()
+        generator.orders()
+        generator.reviews()
+        generator.carts()
+        generator.wishlists()
+    # Explicit ids bypass the PostgreSQL sequences; move them past the new rows
+    models = [Product, ProductVariant, User, Address, Order, OrderItem, Review, CartItem, Wishlist]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+    CatalogVersion.bump()
@@ -1,3 +1,1854 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    basket, bestsellers, catalog, checkout, exports, facets, housekeeping, inventory, profiling, recommendations,
+    rollups, search, snapshot, synthetic,
+)
+from .models import (
+    Address, BestSeller, CartItem, CatalogVersion, Order, OrderItem, Product, ProductNeighbour, ProductSalesDaily,
+    ProductVariant, Review, SalesDaily, Wishlist,
+)
+from .pagination import encode_cursor, keyset_page
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(TestCase):
+    """Pin the number of queries each view in store/urls.py runs.
+
+    The fixtures have several products, orders, order lines, reviews and
+    customers, so a per-row query (N+1) breaks a budget. Caches and the
+    catalog snapshot are cleared before every test, so the budgets are
+    cold-cache counts. Pages served conditionally (store/conditional.py)
+    include their version query.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ['streetwear', 'essentials', 'outerwear']
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {i}', slug=f'product-{i}', price=40 + i * 45,
+                old_price=(60 + i * 45) if i % 2 else None, category=categories[i % 3],
+                description=f'Heavyweight cotton piece number {i}', image=f'https://example.com/{i}.jpg',
+                sizes='S,M,L', colors='#000,#FFF',
+            )
+            for i in range(6)
+        ]
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'secret123', is_staff=True)
+        cls.customer = User.objects.create_user(
+            'buyer', 'buyer@example.com', 'secret123', first_name='Buyer', last_name='One')
+        others = [User.objects.create_user(f'shopper{i}', f'shopper{i}@example.com', 'secret123') for i in range(3)]
+        customer = checkout.customer_fields({'first_name': 'Buyer', 'last_name': 'One', 'email': 'buyer@example.com'})
+        for user in [cls.customer, cls.customer, cls.customer] + others:
+            for product in cls.products[:2]:
+                CartItem.objects.create(user=user, session_key=f'fixture-{user.pk}', product=product,
+                                        size='M', color='#000', quantity=2)
+            cls.order = checkout.place_order(CartItem.objects.filter(user=user), customer, user=user)
+        cls.order = Order.objects.filter(user=cls.customer).latest('id')
+        for user in others:
+            for product in cls.products[:3]:
+                Review.objects.create(product=product, user=user, name=user.username, rating=4, text='Solid.')
+        cls.review = Review.objects.filter(product=cls.products[0]).first()
+        for product in cls.products[:3]:
+            Wishlist.objects.create(user=cls.customer, session_key='fixture', product=product)
+        for product in cls.products[2:4]:
+            CartItem.objects.create(user=cls.customer, session_key='fixture', product=product,
+                                    size='L', color='#FFF', quantity=1)
+        cls.addresses = [
+            Address.objects.create(user=cls.customer, label=label, full_name='Buyer One', phone='9999999999',
+                                   address_line='1 Road', city='Pune', state='MH', pincode='411001',
+                                   is_default=label == 'home')
+            for label in ('home', 'work')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        snapshot.clear()
+
+    def assertBudget(self, budget, url, method='get', data=None, user=None, json_body=True):
+        if user:
+            self.client.force_login(user)
+        kwargs = {}
+        if data is not None:
+            kwargs = {'data': json.dumps(data), 'content_type': 'application/json'} if json_body else {'data': data}
+        with self.assertNumQueries(budget):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, url)
+        return response
+
+    def assertNotModifiedBudget(self, budget, url, user=None):
+        """A repeat GET with the first response's ETag is a 304 within ``budget`` queries."""
+        if user:
+            self.client.force_login(user)
+        # The first visit sets the CSRF cookie, which is part of the ETag
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    # ----- Storefront, anonymous -----
+
+    def test_home(self):
+        self.assertBudget(4, reverse('home'))
+
+    def test_shop(self):
+        self.assertBudget(3, reverse('shop'))
+
+    def test_shop_filtered(self):
+        self.assertBudget(3, reverse('shop') + '?cat=essentials&size=M&color=%23000&price=0-100&sort=low')
+
+    def test_shop_search(self):
+        self.assertBudget(3, reverse('shop') + '?q=cotton')
+
+    def test_shop_warm_snapshot(self):
+        self.client.get(reverse('shop'))
+        cache.clear()
+        self.assertBudget(1, reverse('shop') + '?cat=essentials&size=M&sort=low')
+
+    def test_shop_bestselling(self):
+        self.assertBudget(5, reverse('shop') + '?sort=bestselling')
+
+    def test_shop_json_page(self):
+        self.assertBudget(3, reverse('shop') + '?format=json&sort=high')
+
+    def test_shop_not_modified(self):
+        self.assertNotModifiedBudget(1, reverse('shop'))
+
+    def test_product_detail(self):
+        self.assertBudget(6, reverse('product_detail', args=['product-0']))
+
+    def test_search_api(self):
+        self.assertBudget(2, reverse('search_api') + '?q=product')
+
+    def test_login_page(self):
+        self.assertBudget(0, reverse('login'))
+
+    def test_register_page(self):
+        self.assertBudget(0, reverse('register'))
+
+    def test_forgot_password_page(self):
+        self.assertBudget(0, reverse('forgot_password'))
+
+    def test_logout(self):
+        self.assertBudget(4, reverse('logout'), user=self.customer)
+
+    def test_login_merges_anonymous_cart(self):
+        self.client.post(reverse('add_to_cart'), json.dumps({'product_id': self.products[5].id}),
+                         content_type='application/json')
+        self.assertBudget(15, reverse('login'), 'post',
+                          {'email': 'buyer@example.com', 'password': 'secret123'}, json_body=False)
+
+    def test_register(self):
+        self.assertBudget(13, reverse('register'), 'post', {
+            'name': 'New Person', 'email': 'new@example.com',
+            'password': 'secret123', 'confirm_password': 'secret123',
+        }, json_body=False)
+
+    def test_add_to_cart_anonymous(self):
+        self.assertBudget(1, reverse('add_to_cart'), 'post', {'product_id': self.products[4].id})
+
+    def test_toggle_wishlist_anonymous(self):
+        self.assertBudget(1, reverse('toggle_wishlist'), 'post', {'product_id': self.products[4].id})
+
+    # ----- Storefront, signed in -----
+
+    def test_shop_signed_in(self):
+        self.assertBudget(7, reverse('shop'), user=self.customer)
+
+    def test_product_detail_signed_in(self):
+        self.assertBudget(11, reverse('product_detail', args=['product-0']), user=self.customer)
+
+    def test_cart_page(self):
+        self.assertBudget(5, reverse('cart'), user=self.customer)
+
+    def test_checkout_page(self):
+        self.assertBudget(5, reverse('checkout'), user=self.customer)
+
+    def test_wishlist_page(self):
+        self.assertBudget(6, reverse('wishlist'), user=self.customer)
+
+    def test_account_page(self):
+        self.assertBudget(6, reverse('account'), user=self.customer)
+
+    def test_my_orders_page(self):
+        self.assertBudget(6, reverse('my_orders'), user=self.customer)
+
+    def test_order_detail_not_modified(self):
+        # The viewer's summary is part of the ETag: two queries without a shared cache
+        self.assertNotModifiedBudget(5, reverse('order_detail_page', args=[self.order.order_number]),
+                                     user=self.customer)
+
+    @override_settings(SUMMARY_CACHE=True)
+    def test_order_detail_not_modified_summary_cached(self):
+        self.assertNotModifiedBudget(3, reverse('order_detail_page', args=[self.order.order_number]),
+                                     user=self.customer)
+
+    def test_order_detail_page(self):
+        self.assertBudget(7, reverse('order_detail_page', args=[self.order.order_number]), user=self.customer)
+
+    def test_update_profile(self):
+        self.assertBudget(3, reverse('update_profile'), 'post', {'first_name': 'Renamed'}, user=self.customer)
+
+    def test_change_password(self):
+        self.assertBudget(12, reverse('change_password'), 'post', {
+            'current_password': 'secret123', 'new_password': 'secret456', 'confirm_password': 'secret456',
+        }, user=self.customer)
+
+    def test_add_to_cart(self):
+        self.assertBudget(8, reverse('add_to_cart'), 'post', {'product_id': self.products[4].id}, user=self.customer)
+
+    def test_update_cart(self):
+        item = CartItem.objects.filter(user=self.customer).first()
+        self.assertBudget(6, reverse('update_cart'), 'post', {'item_id': item.id, 'action': 'increase'},
+                          user=self.customer)
+
+    def test_cart_batch(self):
+        item = CartItem.objects.filter(user=self.customer).first()
+        self.assertBudget(8, reverse('cart_batch'), 'post', {'operations': [
+            {'op': 'increase', 'item_id': item.id}, {'op': 'set', 'item_id': item.id, 'quantity': 4},
+            {'op': 'add', 'product_id': self.products[4].id}, {'op': 'add', 'product_id': self.products[5].id},
+        ]}, user=self.customer)
+
+    def test_toggle_wishlist(self):
+        self.assertBudget(7, reverse('toggle_wishlist'), 'post', {'product_id': self.products[5].id},
+                          user=self.customer)
+
+    def test_place_order(self):
+        self.assertBudget(20, reverse('place_order'), 'post', {'first_name': 'Buyer'}, user=self.customer)
+
+    def test_place_order_tracked_stock(self):
+        # One conditional UPDATE takes the stock of every tracked line; one
+        # more moves updated_at of any product that sold out
+        ProductVariant.objects.filter(product__in=self.products[2:4], size='L', color='#FFF').update(stock=5)
+        self.assertBudget(22, reverse('place_order'), 'post', {'first_name': 'Buyer'}, user=self.customer)
+
+    def test_submit_review(self):
+        self.assertBudget(7, reverse('submit_review', args=['product-5']), 'post',
+                          {'rating': 5, 'text': 'Great fit.'}, user=self.customer)
+
+    def test_address_list(self):
+        self.assertBudget(3, reverse('address_list'), user=self.customer)
+
+    def test_address_save(self):
+        self.assertBudget(4, reverse('address_save'), 'post', {
+            'full_name': 'Buyer One', 'phone': '9999999999', 'address_line': '2 Road',
+            'city': 'Pune', 'state': 'MH', 'pincode': '411002',
+        }, user=self.customer)
+
+    def test_address_delete(self):
+        self.assertBudget(6, reverse('address_delete', args=[self.addresses[0].id]), 'post', user=self.customer)
+
+    def test_address_set_default(self):
+        self.assertBudget(5, reverse('address_set_default', args=[self.addresses[1].id]), 'post',
+                          user=self.customer)
+
+    # ----- Dashboard -----
+
+    def test_admin_login_page(self):
+        self.assertBudget(0, reverse('admin_login'))
+
+    def test_admin_logout(self):
+        self.assertBudget(4, reverse('admin_logout'), user=self.staff)
+
+    def test_admin_dashboard(self):
+        self.assertBudget(8, reverse('admin_dashboard'), user=self.staff)
+
+    def test_admin_products(self):
+        self.assertBudget(4, reverse('admin_products'), user=self.staff)
+
+    def test_admin_product_add_page(self):
+        self.assertBudget(2, reverse('admin_product_add'), user=self.staff)
+
+    def test_admin_product_edit_page(self):
+        self.assertBudget(3, reverse('admin_product_edit', args=[self.products[0].id]), user=self.staff)
+
+    def test_admin_product_save(self):
+        p = self.products[0]
+        self.assertBudget(6, reverse('admin_product_edit', args=[p.id]), 'post', {
+            'name': p.name, 'slug': p.slug, 'price': '99', 'category': p.category,
+            'description': p.description, 'image': p.image, 'sizes': 'S,M,L', 'colors': '#000,#FFF',
+        }, user=self.staff, json_body=False)
+
+    def test_admin_product_delete_page(self):
+        self.assertBudget(3, reverse('admin_product_delete', args=[self.products[0].id]), user=self.staff)
+
+    def test_admin_orders(self):
+        self.assertBudget(4, reverse('admin_orders'), user=self.staff)
+
+    def test_admin_order_detail(self):
+        self.assertBudget(5, reverse('admin_order_detail', args=[self.order.id]), user=self.staff)
+
+    def test_admin_order_status_change(self):
+        # Includes the UPDATE that returns the cancelled order's units to stock
+        self.assertBudget(10, reverse('admin_order_detail', args=[self.order.id]), 'post',
+                          {'status': 'cancelled'}, user=self.staff, json_body=False)
+
+    def test_admin_orders_filtered(self):
+        self.assertBudget(4, reverse('admin_orders') + '?status=processing&payment=card&from=2020-01-01'
+                          '&to=2100-01-01&sort=total_desc', user=self.staff)
+
+    def test_admin_reviews(self):
+        self.assertBudget(4, reverse('admin_reviews'), user=self.staff)
+
+    def test_admin_review_edit_page(self):
+        self.assertBudget(4, reverse('admin_review_edit', args=[self.review.id]), user=self.staff)
+
+    def test_admin_review_edit(self):
+        self.assertBudget(6, reverse('admin_review_edit', args=[self.review.id]), 'post',
+                          {'name': 'Edited', 'rating': '2', 'text': 'Changed my mind.'},
+                          user=self.staff, json_body=False)
+
+    def test_admin_review_delete(self):
+        self.assertBudget(6, reverse('admin_review_delete', args=[self.review.id]), 'post', user=self.staff)
+
+    def test_admin_customers(self):
+        self.assertBudget(5, reverse('admin_customers'), user=self.staff)
+
+    def test_admin_order_export(self):
+        self.client.force_login(self.staff)
+        # The queries run as the body streams, so it is read inside the budget;
+        # lines cost one query per chunk of orders, never one per order
+        for chunk_size, budget in ((exports.CHUNK_SIZE, 4), (2, 6)):
+            for fmt in ('csv', 'jsonl'):
+                with self.subTest(fmt=fmt, chunk_size=chunk_size), \
+                        mock.patch.object(exports, 'CHUNK_SIZE', chunk_size), self.assertNumQueries(budget):
+                    response = self.client.get(reverse('admin_order_export'), {'format': fmt})
+                    self.assertEqual(response.status_code, 200)
+                    b''.join(response.streaming_content)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BasketCookieTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f'Product {i}', slug=f'product-{i}', price=50, category='essentials',
+                                   description='x', image='https://example.com/x.jpg')
+            for i in range(3)
+        ]
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret123')
+        CartItem.objects.create(user=cls.user, session_key='fixture', product=cls.products[0],
+                                size='M', color='#000', quantity=2)
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json').json()
+
+    def test_anonymous_visitor_gets_a_cookie_not_rows(self):
+        self.assertEqual(self.post('add_to_cart', {'product_id': self.products[0].id, 'quantity': 3})['cart_count'], 3)
+        self.assertTrue(self.post('toggle_wishlist', {'product_id': self.products[1].id})['added'])
+        self.assertIn(basket.COOKIE_NAME, self.client.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.assertFalse(CartItem.objects.filter(user__isnull=True).exists())
+        self.assertFalse(Wishlist.objects.exists())
+
+        line = basket.Basket.line_id(self.products[0].id, 'M', '#000')
+        self.assertEqual(self.post('update_cart', {'item_id': line, 'action': 'decrease'})['cart_count'], 2)
+
+    def test_tampered_cookie_is_ignored(self):
+        self.post('add_to_cart', {'product_id': self.products[0].id})
+        self.client.cookies[basket.COOKIE_NAME] = self.client.cookies[basket.COOKIE_NAME].value + 'x'
+        self.assertEqual(self.post('add_to_cart', {'product_id': self.products[1].id})['cart_count'], 1)
+
+    def test_login_merges_the_basket(self):
+        self.post('add_to_cart', {'product_id': self.products[0].id, 'quantity': 3})
+        self.post('add_to_cart', {'product_id': self.products[2].id, 'size': 'L'})
+        self.post('toggle_wishlist', {'product_id': self.products[1].id})
+        self.client.post(reverse('login'), {'email': 'buyer@example.com', 'password': 'secret123'})
+
+        cart = dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+        self.assertEqual(cart, {self.products[0].id: 5, self.products[2].id: 1})
+        self.assertEqual(list(Wishlist.objects.filter(user=self.user).values_list('product_id', flat=True)),
+                         [self.products[1].id])
+        self.assertEqual(self.client.cookies[basket.COOKIE_NAME].value, '')
+
+    def test_summary_is_only_cached_in_a_shared_cache(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('shop'))
+        # Written by another worker, whose invalidation would miss this one's local cache
+        CartItem.objects.filter(user=self.user).update(quantity=4)
+        self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 4)
+        with self.settings(SUMMARY_CACHE=True):
+            self.client.get(reverse('shop'))
+            CartItem.objects.filter(user=self.user).update(quantity=6)
+            self.assertEqual(self.client.get(reverse('shop')).context['cart_count'], 4)
+
+    def test_guest_checkout_from_the_cookie(self):
+        self.post('add_to_cart', {'product_id': self.products[1].id, 'quantity': 2})
+        result = self.post('place_order', {'first_name': 'Guest', 'email': 'guest@example.com'})
+        order = Order.objects.get(order_number=result['order_number'])
+        self.assertIsNone(order.user)
+        self.assertEqual(order.subtotal, 100)
+        self.assertFalse(self.post('place_order', {'first_name': 'Guest'})['success'])
+
+
+class AsyncApiTests(TestCase):
+    """The async JSON APIs, driven through the ASGI handler."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='P', slug='p', price=30, category='essentials',
+                                             description='x', image='https://example.com/x.jpg')
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', first_name='Ada')
+
+    async def test_cart_wishlist_and_review(self):
+        await self.async_client.aforce_login(self.user)
+        post = self.async_client.post
+        body = json.dumps({'product_id': self.product.id, 'quantity': 2})
+        self.assertEqual((await post(reverse('add_to_cart'), body, content_type='application/json')).json(),
+                         {'success': True, 'cart_count': 2})
+        item = await CartItem.objects.aget(user=self.user)
+        response = await post(reverse('update_cart'), json.dumps({'item_id': item.id, 'action': 'increase'}),
+                              content_type='application/json')
+        self.assertEqual(response.json()['cart_count'], 3)
+        response = await post(reverse('toggle_wishlist'), json.dumps({'product_id': self.product.id}),
+                              content_type='application/json')
+        self.assertTrue(response.json()['added'])
+        response = await post(reverse('submit_review', args=['p']), json.dumps({'rating': 4, 'text': 'Good.'}),
+                              content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Review.objects.aget(product=self.product)).name, 'Ada')
+
+    async def test_add_to_cart_rejects_bad_quantities(self):
+        post = self.async_client.post
+        bodies = [
+            {'product_id': self.product.id, 'quantity': 'two'}, {'product_id': self.product.id, 'quantity': None},
+            {'quantity': 1}, {'product_id': 'x'}, [1, 2],
+        ]
+        for signed_in in (False, True):
+            if signed_in:
+                await self.async_client.aforce_login(self.user)
+            for body in bodies:
+                response = await post(reverse('add_to_cart'), json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400, body)
+        for quantity in ('3', 500):
+            await post(reverse('add_to_cart'), json.dumps({'product_id': self.product.id, 'quantity': quantity}),
+                       content_type='application/json')
+        self.assertEqual((await CartItem.objects.aget(user=self.user)).quantity, 99)
+
+    async def test_signed_in_cart_is_capped(self):
+        await self.async_client.aforce_login(self.user)
+        post = self.async_client.post
+        item = await CartItem.objects.acreate(user=self.user, product=self.product, size='M', color='#000',
+                                              quantity=99)
+        response = await post(reverse('update_cart'), json.dumps({'item_id': item.id, 'action': 'increase'}),
+                              content_type='application/json')
+        self.assertEqual(response.json()['cart_count'], 99)
+        with mock.patch('store.views.MAX_CART_LINES', 2):
+            for size in ('S', 'L'):
+                response = await post(reverse('add_to_cart'), json.dumps({'product_id': self.product.id, 'size': size}),
+                                      content_type='application/json')
+            self.assertEqual(response.json(), {'success': False, 'error': 'Your cart is full.'})
+            # A line already in the cart still takes more
+            response = await post(reverse('add_to_cart'), json.dumps({'product_id': self.product.id, 'size': 'S'}),
+                                  content_type='application/json')
+            self.assertTrue(response.json()['success'])
+        self.assertEqual({(i.size, i.quantity) async for i in CartItem.objects.filter(user=self.user)},
+                         {('M', 99), ('S', 2)})
+
+    async def test_update_cart_and_wishlist_reject_malformed_bodies(self):
+        post = self.async_client.post
+        item = await CartItem.objects.acreate(user=self.user, product=self.product, size='M', color='#000')
+        updates = [[1, 2], 'x', {'action': 'increase'}, {'item_id': item.id},
+                   {'item_id': item.id, 'action': 'explode'}, {'item_id': item.id, 'action': 'add'}]
+        wishes = [[1, 2], {}, {'product_id': 'x'}, {'product_id': None}, {'product_id': [1]}]
+        for signed_in in (False, True):
+            if signed_in:
+                await self.async_client.aforce_login(self.user)
+                updates.append({'item_id': 'x', 'action': 'increase'})
+            for body in updates:
+                response = await post(reverse('update_cart'), json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400, body)
+            for body in wishes:
+                response = await post(reverse('toggle_wishlist'), json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400, body)
+            response = await post(reverse('toggle_wishlist'), b'{', content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual((await CartItem.objects.aget(user=self.user)).quantity, 1)
+        self.assertFalse(await Wishlist.objects.filter(user=self.user).aexists())
+
+    async def test_addresses(self):
+        await self.async_client.aforce_login(self.user)
+        fields = {'full_name': 'Ada', 'phone': '1', 'address_line': '1 Road', 'city': 'C', 'state': 'S',
+                  'pincode': '100'}
+        for label in ('home', 'work'):
+            await self.async_client.post(reverse('address_save'), json.dumps({**fields, 'label': label}),
+                                         content_type='application/json')
+        addresses = (await self.async_client.get(reverse('address_list'))).json()['addresses']
+        self.assertEqual([(a['label'], a['is_default']) for a in addresses], [('home', True), ('work', False)])
+        await self.async_client.post(reverse('address_delete', args=[addresses[0]['id']]))
+        self.assertTrue((await Address.objects.aget(user=self.user)).is_default)
+
+    async def test_login_required(self):
+        response = await self.async_client.get(reverse('address_list'))
+        self.assertRedirects(response, '/login/?next=' + reverse('address_list'), fetch_redirect_response=False)
+
+
+class AdminListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        day = timezone.make_aware(timezone.datetime(2026, 3, 1, 12))
+        cls.orders = [
+            Order.objects.create(
+                order_number=f'T-{i}', subtotal=10 * i, total=10 * i, payment_method=('card', 'upi')[i % 2],
+                status=('processing', 'shipped')[i % 3 == 0],
+            )
+            for i in range(60)
+        ]
+        for i, order in enumerate(cls.orders):
+            # Three orders a day, so date ranges and created_at ties both occur
+            Order.objects.filter(pk=order.pk).update(created_at=day + timedelta(days=i // 3))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def pages(self, query):
+        """Every order number on every page of the admin list for ``query``, and the count shown."""
+        numbers, count = [], None
+        while query is not None:
+            response = self.client.get(reverse('admin_orders') + '?' + query)
+            count = count or response.context['total_count']
+            numbers += [o.order_number for o in response.context['orders']]
+            query = response.context['next_query'] or None
+        return numbers, count
+
+    def test_filters_and_sort_walk_every_page(self):
+        numbers, count = self.pages('payment=upi&status=processing&from=2026-03-03&to=2026-03-12&sort=total_desc')
+        expected = [o for o in self.orders
+                    if o.payment_method == 'upi' and o.status == 'processing' and 6 <= self.orders.index(o) < 36]
+        self.assertEqual(numbers, [o.order_number for o in sorted(expected, key=lambda o: -o.total)])
+        self.assertEqual(count, len(expected))
+
+    def test_default_order_is_newest_first_across_pages(self):
+        numbers, count = self.pages('')
+        self.assertEqual(numbers, [o.order_number for o in reversed(self.orders)])
+        self.assertEqual(count, 60)
+
+    def test_bad_parameters_are_ignored(self):
+        numbers, _ = self.pages('from=yesterday&to=2026-02-30&sort=bogus&cursor=!!')
+        self.assertEqual(len(numbers), 60)
+
+    def test_reviews_and_products_filters(self):
+        products = [
+            Product.objects.create(name=f'P{i}', slug=f'p-{i}', price=10, category='essentials',
+                                   description='x', image='https://example.com/x.jpg', in_stock=i != 1)
+            for i in range(3)
+        ]
+        for i, product in enumerate(products):
+            Review.objects.create(product=product, name='R', rating=i + 3, text='ok')
+        response = self.client.get(reverse('admin_reviews') + '?rating=4')
+        self.assertEqual([r.product_id for r in response.context['reviews']], [products[1].id])
+        response = self.client.get(reverse('admin_reviews') + '?sort=rating')
+        self.assertEqual([r.rating for r in response.context['reviews']], [3, 4, 5])
+        response = self.client.get(reverse('admin_products') + '?cat=essentials&stock=out')
+        self.assertEqual(list(response.context['products']), [products[1]])
+
+
+class AdminCustomerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        day = timezone.make_aware(timezone.datetime(2026, 3, 1, 12))
+        cls.customers = [
+            User.objects.create_user(f'shopper{i:02d}', f'shopper{i:02d}@example.com', first_name=('Ada', 'Bo')[i % 2])
+            for i in range(30)
+        ]
+        for i, user in enumerate(cls.customers):
+            # Spend ties between pairs of customers; every third one has no orders
+            for n in range(i % 3):
+                order = Order.objects.create(order_number=f'C-{i}-{n}', user=user, subtotal=1, total=10 * (i // 2),
+                                             shipping=0)
+                Order.objects.filter(pk=order.pk).update(created_at=day + timedelta(hours=i * 3 + n))
+        rollups.rebuild_customers()
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def pages(self, query):
+        """Every customer on every page of the customer list for ``query``."""
+        names = []
+        while query is not None:
+            response = self.client.get(reverse('admin_customers') + '?' + query)
+            names += [c.username for c in response.context['customers']]
+            query = response.context['next_query'] or None
+        return names
+
+    def recount(self, user):
+        orders = Order.objects.filter(user=user)
+        return (orders.count(), sum((o.total for o in orders), Decimal('0')),
+                max((o.created_at for o in orders), default=user.date_joined))
+
+    def test_sorts_walk_every_page(self):
+        by_id = sorted(self.customers, key=lambda u: -u.pk)
+        self.assertEqual(self.pages(''), [u.username for u in sorted(by_id, key=lambda u: u.date_joined,
+                                                                     reverse=True)])
+        self.assertEqual(self.pages('sort=spend'), [
+            u.username for u in sorted(by_id, key=lambda u: self.recount(u)[1], reverse=True)])
+        self.assertEqual(self.pages('sort=recent'), [
+            u.username for u in sorted(by_id, key=lambda u: self.recount(u)[2], reverse=True)])
+
+    def test_search_and_columns(self):
+        response = self.client.get(reverse('admin_customers') + '?q=shopper05')
+        [customer] = response.context['customers']
+        self.assertEqual((customer.order_count, customer.total_spent), (2, 40))
+        self.assertEqual(self.pages('q=bo&sort=spend'), [
+            u.username for u in sorted(self.customers[1::2], key=lambda u: (self.recount(u)[1], u.pk), reverse=True)])
+        self.assertNotIn('staff', self.pages('q=staff'))
+
+    def test_checkout_and_deletes_keep_the_totals(self):
+        user = self.customers[3]
+        product = Product.objects.create(name='P', slug='p', price=40, category='essentials', description='x',
+                                         image='https://example.com/x.jpg')
+        CartItem.objects.create(user=user, product=product, size='M', color='#000', quantity=2)
+        order = checkout.place_order(CartItem.objects.filter(user=user), checkout.customer_fields({}), user=user)
+
+        def stats():
+            return User.objects.values_list(
+                'stats__order_count', 'stats__total_spent', 'stats__last_active').get(pk=user.pk)
+
+        self.assertEqual(stats(), self.recount(user))
+        self.assertEqual(stats()[2], order.created_at)
+        order.delete()
+        self.assertEqual(stats(), self.recount(user))
+        Order.objects.filter(user=user).delete()
+        self.assertEqual(stats(), (0, 0, user.date_joined))
+
+
+class OrderSnapshotBackfillTests(TestCase):
+    """The data migration that filled the order history snapshot columns (0005)."""
+
+    def test_backfill_copies_slugs_and_builds_previews_in_batches(self):
+        backfill = importlib.import_module('store.migrations.0005_order_history_snapshot')
+        product = Product.objects.create(name='Tee', slug='tee', price=10, category='essentials', description='x',
+                                         image='https://example.com/tee.jpg')
+        orders = [Order.objects.create(order_number=f'B-{i}', subtotal=1, total=1) for i in range(3)]
+        for i, order in enumerate(orders):
+            for n in range(1 + i * 20):
+                OrderItem.objects.create(order=order, product=product if n % 2 else None,
+                                         product_name=f'A rather long product name {n}', price=10, size='M',
+                                         color='#000', quantity=n + 1)
+        with mock.patch.object(backfill, 'BATCH_SIZE', 2):
+            backfill.backfill_snapshots(django_apps, None)
+
+        self.assertEqual(set(OrderItem.objects.filter(product=product).values_list('product_slug', 'product_image')),
+                         {('tee', 'https://example.com/tee.jpg')})
+        self.assertEqual(set(OrderItem.objects.filter(product=None).values_list('product_slug', flat=True)), {''})
+        for order in Order.objects.filter(pk__in=[o.pk for o in orders]):
+            lines = list(order.items.order_by('id').values_list('product_name', 'quantity'))
+            self.assertEqual(order.item_count, sum(q for _, q in lines))
+            self.assertEqual(order.items_preview, Order.build_preview(lines))
+        self.assertEqual(len(Order.objects.get(order_number='B-2').items_preview), 255)
+
+
+class OrderExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        product = Product.objects.create(name='Tee, "Classic"', slug='tee', price=25, category='essentials',
+                                         description='x', image='https://example.com/x.jpg')
+        day = timezone.make_aware(timezone.datetime(2026, 5, 1, 9))
+        for i in range(5):
+            order = Order.objects.create(order_number=f'E-{i}', subtotal=50, total=62, shipping=12,
+                                         status=('processing', 'delivered')[i % 2], email=f'e{i}@example.com')
+            Order.objects.filter(pk=order.pk).update(created_at=day + timedelta(days=i))
+            for size in ('S', 'L'):
+                OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                         product_slug='tee', price=25, size=size, color='#000', quantity=1 + i)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_csv_has_a_row_per_line_and_honours_filters(self):
+        response = self.client.get(reverse('admin_order_export') + '?status=processing&from=2026-05-02&to=2026-05-05')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(r['order_number'], r['size']) for r in rows],
+                         [('E-2', 'S'), ('E-2', 'L'), ('E-4', 'S'), ('E-4', 'L')])
+        self.assertEqual((rows[0]['product_name'], rows[0]['quantity'], rows[0]['line_total']),
+                         ('Tee, "Classic"', '3', '75.00'))
+
+    def test_csv_defuses_formulas(self):
+        Order.objects.filter(order_number='E-0').update(first_name='=HYPERLINK("http://x")', city='@SUM(A1)')
+        response = self.client.get(reverse('admin_order_export'))
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual((rows[0]['first_name'], rows[0]['city']), ('\'=HYPERLINK("http://x")', "'@SUM(A1)"))
+        self.assertEqual(rows[0]['total'], '62.00')
+
+    def test_jsonl_nests_lines_under_each_order(self):
+        with mock.patch.object(exports, 'BUFFER_SIZE', 100):
+            response = self.client.get(reverse('admin_order_export') + '?format=jsonl')
+            content = list(response.streaming_content)
+        self.assertGreater(len(content), 1)
+        records = [json.loads(line) for line in b''.join(content).decode().splitlines()]
+        self.assertEqual([r['order_number'] for r in records], [f'E-{i}' for i in range(5)])
+        self.assertEqual(records[1]['items'][1], {
+            'product_slug': 'tee', 'product_name': 'Tee, "Classic"', 'size': 'L', 'color': '#000',
+            'quantity': 2, 'price': '25.00',
+        })
+
+    async def test_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('admin_order_export') + '?format=jsonl&status=delivered')
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 2)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_orders', '--from', '2026-05-04', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 4)
+        with self.assertRaises(CommandError):
+            call_command('export_orders', '--to', 'May 5', stdout=io.StringIO())
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertRedirects(self.client.get(reverse('admin_order_export')), reverse('admin_login'),
+                             fetch_redirect_response=False)
+
+
+class CartBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f'P{i}', slug=f'p-{i}', price=40, category='essentials',
+                                   description='x', image='https://example.com/x.jpg')
+            for i in range(3)
+        ]
+        cls.user = User.objects.create_user('buyer')
+
+    def setUp(self):
+        self.keep = CartItem.objects.create(user=self.user, session_key='s', product=self.products[0],
+                                            size='M', color='#000', quantity=1)
+        self.drop = CartItem.objects.create(user=self.user, session_key='s', product=self.products[1],
+                                            size='M', color='#000', quantity=1)
+
+    def batch(self, *operations):
+        return self.client.post(reverse('cart_batch'), json.dumps({'operations': list(operations)}),
+                                content_type='application/json')
+
+    def test_operations_apply_in_order_and_return_the_repriced_cart(self):
+        self.client.force_login(self.user)
+        cart = self.batch(
+            {'op': 'increase', 'item_id': self.keep.id},
+            {'op': 'increase', 'item_id': self.keep.id},
+            {'op': 'decrease', 'item_id': self.drop.id},
+            {'op': 'add', 'product_id': self.products[2].id, 'size': 'L'},
+            {'op': 'add', 'product_id': self.products[2].id, 'size': 'L', 'quantity': 2},
+            {'op': 'add', 'product_id': self.products[0].id},
+            {'op': 'add', 'product_id': 99999},
+            {'op': 'remove', 'item_id': 12345},
+        ).json()['cart']
+
+        self.assertEqual([(line['product_id'], line['quantity']) for line in cart['lines']],
+                         [(self.products[0].id, 4), (self.products[2].id, 3)])
+        self.assertEqual((cart['count'], cart['subtotal'], cart['shipping'], cart['total']),
+                         (7, '280.00', 0, '280.00'))
+        self.assertEqual(dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+                         {self.products[0].id: 4, self.products[2].id: 3})
+
+    def test_set_to_zero_removes(self):
+        self.client.force_login(self.user)
+        cart = self.batch({'op': 'set', 'item_id': self.keep.id, 'quantity': 0},
+                          {'op': 'set', 'item_id': self.drop.id, 'quantity': 2}).json()['cart']
+        self.assertEqual([line['id'] for line in cart['lines']], [self.drop.id])
+        self.assertEqual(cart['shipping'], checkout.SHIPPING_FEE)
+
+    def test_signed_in_carts_have_the_basket_limits(self):
+        self.client.force_login(self.user)
+        extra = Product.objects.create(name='P3', slug='p-3', price=40, category='essentials',
+                                       description='x', image='https://example.com/x.jpg')
+        with mock.patch('store.cart.MAX_CART_LINES', 3):
+            cart = self.batch(
+                {'op': 'set', 'item_id': self.keep.id, 'quantity': 10 ** 6},
+                {'op': 'add', 'product_id': self.products[2].id, 'quantity': 500},
+                {'op': 'add', 'product_id': extra.id},
+            ).json()['cart']
+        self.assertEqual([(line['product_id'], line['quantity']) for line in cart['lines']],
+                         [(self.products[0].id, 99), (self.products[1].id, 1), (self.products[2].id, 99)])
+        self.assertEqual(dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+                         {self.products[0].id: 99, self.products[1].id: 1, self.products[2].id: 99})
+
+    def test_rejects_bad_operations_without_writing(self):
+        self.client.force_login(self.user)
+        for operations in ([], [{'op': 'increase', 'item_id': self.keep.id}, {'op': 'explode'}],
+                           [{'op': 'add'}], [{'op': 'set', 'item_id': self.keep.id, 'quantity': 'x'}]):
+            self.assertEqual(self.batch(*operations).status_code, 400)
+        self.assertEqual(CartItem.objects.get(pk=self.keep.pk).quantity, 1)
+
+    def test_anonymous_basket(self):
+        cart = self.batch({'op': 'add', 'product_id': self.products[1].id, 'quantity': 2}).json()['cart']
+        line = cart['lines'][0]['id']
+        self.assertEqual(line, basket.Basket.line_id(self.products[1].id, 'M', '#000'))
+        cart = self.batch({'op': 'increase', 'item_id': line},
+                          {'op': 'add', 'product_id': self.products[2].id}).json()['cart']
+        self.assertEqual(cart['count'], 4)
+        self.assertFalse(CartItem.objects.filter(user__isnull=True).exists())
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        cls.products = [
+            Product.objects.create(name=f'Piece {i}', slug=f'piece-{i}', price=40 + i * 30, category=category,
+                                   description='x', image='https://example.com/x.jpg')
+            for i, category in enumerate(('essentials', 'essentials', 'outerwear'))
+        ]
+        cls.customers = [User.objects.create_user(f'customer{i}') for i in range(3)]
+
+    def place(self, user, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(user=user, session_key=f'rollup-{user.pk}', product=product,
+                                    size='M', color='#000', quantity=quantity)
+        return checkout.place_order(CartItem.objects.filter(user=user), checkout.customer_fields({}), user=user)
+
+    def assertMatchesOrders(self):
+        """The rollups equal a recount from the orders and their lines."""
+        sold = Order.objects.exclude(status='cancelled')
+        day = SalesDaily.objects.get(day=timezone.localdate())
+        self.assertEqual(
+            (day.orders, day.cancelled, day.revenue, day.units, day.new_customers),
+            (Order.objects.count(), Order.objects.filter(status='cancelled').count(),
+             sum((o.total for o in sold), Decimal('0')), sum(o.item_count for o in sold), len(self.customers)),
+        )
+        expected = {}
+        for item in OrderItem.objects.filter(order__in=sold):
+            units, revenue = expected.get(item.product_id, (0, Decimal('0')))
+            expected[item.product_id] = units + item.quantity, revenue + item.price * item.quantity
+        self.assertEqual({
+            row.product_id: (row.units, row.revenue)
+            for row in ProductSalesDaily.objects.filter(day=timezone.localdate()) if row.units
+        }, expected)
+
+    def test_orders_cancellations_and_the_dashboard_follow_the_order_lines(self):
+        first = self.place(self.customers[0], (self.products[0], 2), (self.products[2], 1))
+        self.place(self.customers[1], (self.products[0], 1), (self.products[1], 3))
+        self.place(self.customers[2], (self.products[1], 1))
+        self.assertMatchesOrders()
+
+        first.status = 'cancelled'
+        first.save()
+        self.assertMatchesOrders()
+        first.status = 'cancelled'
+        first.save()
+        self.assertMatchesOrders()
+        first.status = 'processing'
+        first.save()
+        self.assertMatchesOrders()
+        Order.objects.get(pk=first.pk).delete()
+        self.assertMatchesOrders()
+
+        self.client.force_login(self.staff)
+        context = self.client.get(reverse('admin_dashboard')).context
+        sold = Order.objects.exclude(status='cancelled')
+        self.assertEqual(context['total_orders'], 2)
+        self.assertEqual(context['total_revenue'], sum(o.total for o in sold))
+        self.assertEqual(context['total_customers'], 3)
+        self.assertEqual(context['sales_days'][-1]['orders'], 2)
+
+        # A rebuild from the orders table writes the same rows
+        before = list(SalesDaily.objects.values_list('day', 'orders', 'cancelled', 'revenue', 'units'))
+        call_command('rebuild_rollups', stdout=io.StringIO())
+        self.assertEqual(list(SalesDaily.objects.values_list('day', 'orders', 'cancelled', 'revenue', 'units')),
+                         before)
+        self.assertMatchesOrders()
+
+    def test_if_empty_says_why_it_skipped(self):
+        SalesDaily.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_rollups', if_empty=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'No orders yet; nothing to roll up')
+
+        self.place(self.customers[0], (self.products[0], 1))
+        SalesDaily.objects.all().delete()
+        # A signup before the deploy's backfill only counts a new customer
+        User.objects.create_user('newcomer')
+        self.assertEqual(list(SalesDaily.objects.values_list('orders', 'new_customers')), [(0, 1)])
+        out = io.StringIO()
+        call_command('rebuild_rollups', if_empty=True, stdout=out)
+        self.assertIn('Rebuilt 1 days', out.getvalue())
+        self.assertEqual(SalesDaily.objects.get().orders, 1)
+        out = io.StringIO()
+        call_command('rebuild_rollups', if_empty=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Sales rollups already populated; skipping')
+
+
+class HousekeepingTests(TestCase):
+
+    def test_purges_expired_sessions_and_their_orphans(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'old-{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+        user = User.objects.create_user('keeper')
+        products = [
+            Product.objects.create(name=f'P{i}', slug=f'p-{i}', price=10, category='essentials',
+                                   description='x', image='https://example.com/x.jpg')
+            for i in range(2)
+        ]
+        for key in ['old-0', 'old-3', 'live', 'never-existed']:
+            for product in products:
+                CartItem.objects.create(session_key=key, product=product, size='M', color='#000')
+            Wishlist.objects.create(session_key=key, product=products[0])
+        CartItem.objects.create(session_key='old-1', user=user, product=products[0], size='M', color='#000')
+
+        deleted, _ = housekeeping.collect(batch_size=2)
+
+        self.assertEqual(deleted, {'sessions': 5, 'cart items': 6, 'wishlist items': 3})
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)), ['live'])
+        self.assertEqual(set(CartItem.objects.values_list('session_key', flat=True)), {'live', 'old-1'})
+        self.assertEqual(list(Wishlist.objects.values_list('session_key', flat=True)), ['live'])
+
+    def test_command_reports(self):
+        out = io.StringIO()
+        call_command('purge_expired', pause=0, stdout=out)
+        self.assertIn('Purged 0 sessions, 0 cart items, 0 wishlist items', out.getvalue())
+
+    @override_settings(HOUSEKEEPING_BATCH_SIZE=250, HOUSEKEEPING_PAUSE=0.5)
+    def test_command_defaults_come_from_settings(self):
+        with mock.patch.object(housekeeping, 'collect', return_value=({}, 0.0)) as collect:
+            call_command('purge_expired', stdout=io.StringIO())
+            call_command('purge_expired', batch_size=10, pause=0, stdout=io.StringIO())
+        self.assertEqual([c.args for c in collect.call_args_list], [(250, 0.5), (10, 0)])
+
+
+class SeedDataTests(TestCase):
+
+    def test_seed_data_leaves_an_existing_catalog_alone(self):
+        call_command('seed_data', stdout=io.StringIO())
+        Product.objects.filter(slug='cyber-hoodie').update(price=1)
+        call_command('seed_data', stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 16)
+        self.assertEqual(Product.objects.get(slug='cyber-hoodie').price, 1)
+
+    def test_scale_is_deterministic(self):
+        def snapshot():
+            call_command('seed_data', scale=0.01, reset=True, seed=7, chunk_size=40, stdout=io.StringIO())
+            return (
+                list(Order.objects.order_by('pk').values_list('pk', 'user__username', 'total', 'status', 'created_at')),
+                list(OrderItem.objects.order_by('pk').values_list('order_id', 'product__slug', 'size', 'quantity')),
+                list(Review.objects.order_by('pk').values_list('product__slug', 'user__username', 'rating')),
+                list(Product.objects.order_by('pk').values_list('slug', 'rating', 'reviews_count')),
+            )
+
+        first = snapshot()
+        self.assertEqual(len(first[0]), synthetic.BASE_COUNTS['orders'] // 100)
+        self.assertEqual(snapshot(), first)
+
+
+    def test_reset_clears_rankings_and_recommendations(self):
+        tee, cap = [
+            Product.objects.create(name=name, slug=name, price=10, category='essentials', description='x',
+                                   image='https://example.com/x.jpg')
+            for name in ('tee', 'cap')
+        ]
+        BestSeller.objects.create(category='', product=tee, rank=0, score=1)
+        ProductNeighbour.objects.create(product=tee, neighbour=cap, rank=0, score=1)
+        synthetic.reset()
+        connection.check_constraints()
+        self.assertFalse(Product.objects.exists() or BestSeller.objects.exists() or ProductNeighbour.objects.exists())
+
+
+class InventoryTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Gold Edition Hoodie', slug='gold-edition-hoodie', price=299, category='limited',
+            description='Numbered.', image='https://example.com/g.jpg', sizes='S,M', colors='#000')
+        self.variant = self.product.variants.get(size='M')
+        self.variant.stock = 3
+        self.variant.save()
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'secret123')
+        self.client.force_login(self.buyer)
+
+    def checkout(self, quantity, size='M'):
+        CartItem.objects.create(user=self.buyer, product=self.product, size=size, color='#000', quantity=quantity)
+        return self.client.post(reverse('place_order'), json.dumps({'first_name': 'Buyer'}),
+                                content_type='application/json')
+
+    def stock(self):
+        self.variant.refresh_from_db()
+        return self.variant.stock
+
+    def test_checkout_takes_stock_and_refuses_a_shortfall(self):
+        self.assertTrue(self.checkout(2).json()['success'])
+        self.assertEqual(self.stock(), 1)
+
+        response = self.checkout(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'Gold Edition Hoodie (M): only 1 left')
+        self.assertEqual(response.json()['unavailable'][0]['available'], 1)
+        self.assertEqual((self.stock(), Order.objects.count()), (1, 1))
+        self.assertTrue(CartItem.objects.filter(user=self.buyer).exists())
+
+    def test_untracked_variants_never_sell_out(self):
+        self.assertTrue(self.checkout(50, size='S').json()['success'])
+        self.assertEqual(self.stock(), 3)
+
+    def test_the_conditional_update_catches_a_stale_read(self):
+        item = CartItem(product=self.product, size='M', color='#000', quantity=2)
+        item.available = 3
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=1)
+        with self.assertRaises(inventory.OutOfStock) as caught:
+            inventory.reserve([item])
+        self.assertEqual(caught.exception.shortages(), [(self.product.pk, 'M', '#000', 2, 1)])
+        self.assertEqual(self.stock(), 1)
+
+    def test_cancelling_returns_units_to_stock(self):
+        self.checkout(2)
+        order = Order.objects.get()
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self.stock(), 3)
+        order.status = 'processing'
+        order.save()
+        self.assertEqual(self.stock(), 1)
+
+    def test_guest_checkout_and_listing_see_stock(self):
+        self.client.logout()
+        self.client.post(reverse('add_to_cart'), json.dumps({'product_id': self.product.pk, 'quantity': 4}),
+                         content_type='application/json')
+        response = self.client.post(reverse('place_order'), json.dumps({'first_name': 'Guest'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+
+        ProductVariant.objects.filter(product=self.product).update(stock=0)
+        CatalogVersion.bump()
+        card = self.client.get(reverse('shop'), {'format': 'json'}).json()['products'][0]
+        self.assertTrue(card['sold_out'])
+        self.assertContains(self.client.get(reverse('shop')), 'Sold Out')
+
+    def test_wishlist_cards_show_sold_out(self):
+        Wishlist.objects.create(user=self.buyer, session_key='s', product=self.product)
+        self.assertNotContains(self.client.get(reverse('wishlist')), 'Sold Out')
+        ProductVariant.objects.filter(product=self.product).update(stock=0)
+        self.assertContains(self.client.get(reverse('wishlist')), 'Sold Out')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent writers (PostgreSQL)')
+class InventoryRaceTests(TransactionTestCase):
+    """Many buyers racing for the last units never oversell."""
+
+    def test_concurrent_buyers_cannot_oversell(self):
+        product = Product.objects.create(
+            name='Drop', slug='drop', price=99, category='limited', description='x',
+            image='https://example.com/d.jpg', sizes='M', colors='#000')
+        ProductVariant.objects.filter(product=product).update(stock=10)
+        buyers = [User.objects.create_user(f'racer{i}') for i in range(40)]
+        for user in buyers:
+            CartItem.objects.create(user=user, session_key=f'race-{user.pk}', product=product,
+                                    size='M', color='#000', quantity=1)
+        customer = checkout.customer_fields({'first_name': 'Racer'})
+        start, results = threading.Barrier(len(buyers)), []
+
+        def buy(user):
+            try:
+                start.wait()
+                checkout.place_order(CartItem.objects.filter(user=user), customer, user=user)
+                results.append(True)
+            except inventory.OutOfStock:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in buyers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual((results.count(True), results.count(False)), (10, 30))
+        self.assertEqual(ProductVariant.objects.get(product=product).stock, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 10)
+
+
+class OrderNumberTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='Tee', slug='tee', price=50, category='essentials',
+                                             description='x', image='https://example.com/t.jpg')
+        cls.customer = checkout.customer_fields({'first_name': 'Ada'})
+
+    def place(self):
+        return checkout.place_guest_order([(self.product.pk, 'M', '#000', 1)], self.customer)
+
+    def test_number_is_the_zero_padded_id(self):
+        self.assertEqual(checkout.format_order_number(7), 'AKV-00000007')
+        order = self.place()
+        self.assertRegex(order.order_number, r'^AKV-\d{8}$')
+        self.assertEqual(Order.objects.get(pk=order.pk).order_number, f'AKV-{order.pk:08d}')
+
+    def test_placeholder_is_replaced_inside_the_order_transaction(self):
+        seen = []
+
+        def order_placed(order, lines):
+            # Runs after the number is written and before the transaction commits
+            seen.append(Order.objects.get(pk=order.pk).order_number)
+            raise RuntimeError
+
+        with mock.patch('store.checkout.rollups.order_placed', order_placed), self.assertRaises(RuntimeError):
+            self.place()
+        self.assertRegex(seen[0], r'^AKV-\d{8}$')
+        # Nothing committed, so no row is ever left holding the placeholder
+        self.assertFalse(Order.objects.exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent writers (PostgreSQL)')
+class OrderNumberRaceTests(TransactionTestCase):
+    """Concurrent checkouts each get their own order number."""
+
+    def test_concurrent_checkouts_get_unique_numbers(self):
+        product = Product.objects.create(
+            name='Tee', slug='tee', price=50, category='essentials', description='x',
+            image='https://example.com/t.jpg')
+        customer = checkout.customer_fields({'first_name': 'Racer'})
+        start, numbers = threading.Barrier(20), []
+
+        def buy():
+            try:
+                start.wait()
+                numbers.append(checkout.place_guest_order([(product.pk, 'M', '#000', 1)], customer).order_number)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(numbers)), 20)
+        self.assertEqual(sorted(numbers), sorted(f'AKV-{pk:08d}' for pk in Order.objects.values_list('pk', flat=True)))
+
+
+class SearchPagingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                name=f'{"Cotton " if i % 3 == 0 else ""}Piece {i}', slug=f'piece-{i}', price=40,
+                category=('essentials', 'outerwear')[i % 2], description=f'Brushed cotton, number {i} of the run',
+                image='https://example.com/x.jpg')
+            for i in range(30)
+        ]
+
+    def walk(self, query):
+        """Every card of a search, following next_cursor; fails on a repeated card."""
+        seen, cursor = [], None
+        for _ in range(10):
+            page = self.client.get(reverse('shop'), {'q': 'cotton', 'format': 'json', **query,
+                                                     **({'cursor': cursor} if cursor else {})}).json()
+            seen += [card['id'] for card in page['products']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(set(seen)))
+        return seen
+
+    def test_relevance_order_pages_through_every_match(self):
+        ids = self.walk({})
+        self.assertEqual(len(ids), 30)
+        names_first = [p.id for p in self.products if p.name.startswith('Cotton')]
+        self.assertEqual(ids[:len(names_first)], names_first)
+        self.assertEqual(ids[len(names_first):], sorted(set(ids) - set(names_first)))
+
+    def test_bestselling_puts_the_ranking_first_then_relevance(self):
+        picks = [self.products[7], self.products[3]]
+        BestSeller.objects.bulk_create([
+            BestSeller(category='', product=p, rank=rank, score=10 - rank) for rank, p in enumerate(picks)])
+        ids = self.walk({'sort': 'bestselling'})
+        self.assertEqual(len(ids), 30)
+        self.assertEqual(ids[:2], [p.id for p in picks])
+        self.assertEqual(ids[2:], [i for i in self.walk({}) if i not in ids[:2]])
+
+    def test_tampered_cursor_starts_over(self):
+        first = self.client.get(reverse('shop'), {'q': 'cotton', 'format': 'json'}).json()['products']
+        cursor = encode_cursor(['not a rank', 'x'])
+        again = self.client.get(reverse('shop'), {'q': 'cotton', 'format': 'json', 'cursor': cursor}).json()
+        self.assertEqual(again['products'], first)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs the full-text and trigram indexes (PostgreSQL)')
+class PostgresSearchTests(TestCase):
+    """websearch_to_tsquery, the search_vector trigger and the trigram suggest path."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (name, description) in enumerate([
+            ('Linen Shirt', 'A light linen shirt for summer'),
+            ('Blue Linen Shirt', 'Linen, dyed blue'),
+            ('Wool Coat', 'Heavy wool for winter'),
+            ('Coated Linen Trousers', 'Wide waxed linen trousers'),
+        ]):
+            Product.objects.create(name=name, slug=f'p-{i}', price=50, category='essentials',
+                                   description=description, image='https://example.com/x.jpg')
+
+    def names(self, q):
+        return [p.name for p in search.ranked(Product.objects.all(), q)]
+
+    def test_websearch_syntax(self):
+        self.assertEqual(set(self.names('linen shirt')), {'Linen Shirt', 'Blue Linen Shirt'})
+        self.assertEqual(self.names('"linen shirt" -blue'), ['Linen Shirt'])
+        self.assertEqual(set(self.names('wool or trousers')), {'Wool Coat', 'Coated Linen Trousers'})
+
+    def test_trigger_keeps_the_vector_current(self):
+        coat = Product.objects.get(name='Wool Coat')
+        self.assertEqual(self.names('parka'), [])
+        coat.name = 'Wool Parka'
+        coat.save()
+        self.assertEqual(self.names('parka'), ['Wool Parka'])
+        Product.objects.filter(pk=coat.pk).update(description='Now in cashmere')
+        self.assertEqual(self.names('cashmere'), ['Wool Parka'])
+
+    def test_suggest_puts_the_closest_name_first(self):
+        # By name alone 'Coated Linen Trousers' would come first
+        self.assertEqual([p.name for p in search.suggest('coat')], ['Wool Coat', 'Coated Linen Trousers'])
+        self.assertEqual([p.name for p in search.suggest('TROUS')], ['Coated Linen Trousers'])
+
+    def test_ranked_results_page_without_gaps(self):
+        matches = search.search_products(Product.objects.all(), 'linen')
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(matches, search.RELEVANCE, cursor, page_size=1)
+            seen += [(row.rank, row.id) for row in rows]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 3)
+        self.assertEqual(seen, sorted(seen, key=lambda key: (-key[0], key[1])))
+
+
+class RatingAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tee, cls.cap = [
+            Product.objects.create(name=name.title(), slug=name, price=50, category='essentials', description='x',
+                                   image='https://example.com/x.jpg')
+            for name in ('tee', 'cap')
+        ]
+        cls.users = [User.objects.create_user(f'reviewer{i}') for i in range(3)]
+
+    def aggregates(self, product):
+        return Product.objects.values(*Product.RATING_FIELDS).get(pk=product.pk)
+
+    def assertMatchesReviews(self):
+        """Stored aggregates equal a recount from the Review table."""
+        for product in (self.tee, self.cap):
+            reviews = list(Review.objects.filter(product=product).values_list('rating', flat=True))
+            expected = {
+                'reviews_count': len(reviews), 'rating_sum': sum(reviews),
+                'rating': round(sum(reviews) / len(reviews), 1) if reviews else 0,
+                **{f'stars_{n}': reviews.count(n) for n in range(1, 6)},
+            }
+            self.assertEqual(self.aggregates(product), expected)
+
+    def review(self, product, user, rating):
+        return Review.objects.create(product=product, user=user, name=user.username, rating=rating, text='x')
+
+    def test_create_edit_move_and_delete(self):
+        first = self.review(self.tee, self.users[0], 5)
+        self.review(self.tee, self.users[1], 2)
+        self.review(self.cap, self.users[2], 4)
+        self.assertMatchesReviews()
+        self.assertEqual(self.aggregates(self.tee)['rating'], 3.5)
+
+        # A loaded review remembers what was counted (Review.from_db), so edits apply the difference
+        loaded = Review.objects.get(pk=first.pk)
+        self.assertEqual(loaded._counted, (self.tee.pk, 5))
+        loaded.rating = 3
+        loaded.save()
+        loaded.text = 'Edited'
+        loaded.save()
+        self.assertMatchesReviews()
+
+        loaded.product = self.cap
+        loaded.rating = 1
+        loaded.save()
+        self.assertMatchesReviews()
+        self.assertEqual(self.aggregates(self.cap)['reviews_count'], 2)
+
+        Review.objects.get(pk=first.pk).delete()
+        Review.objects.filter(product=self.tee).delete()
+        self.assertMatchesReviews()
+        self.assertEqual(self.aggregates(self.tee)['rating'], 0)
+
+    def test_edits_keep_concurrent_review_counts(self):
+        stale = Product.objects.get(pk=self.tee.pk)
+        self.review(self.tee, self.users[0], 4)
+        stale.name = 'Renamed Tee'
+        stale.save_details()
+        self.assertEqual(Product.objects.get(pk=self.tee.pk).name, 'Renamed Tee')
+        self.assertMatchesReviews()
+
+    def test_plain_save_writes_every_field(self):
+        product = Product.objects.get(pk=self.cap.pk)
+        product.rating = 4.2
+        product.save()
+        self.assertEqual(self.aggregates(self.cap)['rating'], 4.2)
+        self.assertEqual(call_command('reconcile_ratings', stdout=io.StringIO()), None)
+        self.assertMatchesReviews()
+
+    def test_dashboard_edit_leaves_the_aggregates_alone(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.review(self.tee, self.users[0], 5)
+        self.client.post(reverse('admin_product_edit', args=[self.tee.pk]), {
+            'name': 'Tee', 'slug': 'tee', 'price': '55', 'category': 'essentials', 'description': 'x',
+            'image': 'https://example.com/x.jpg', 'rating': '1', 'reviews_count': '0',
+        })
+        self.assertEqual(Product.objects.get(pk=self.tee.pk).price, 55)
+        self.assertMatchesReviews()
+
+
+class FacetCountTests(TestCase):
+    """facet_counts straight from the database, against hand-counted answers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for slug, category, price, old_price, sizes, colors in [
+            ('a', 'essentials', 50, 80, 'S,M', '#000'),
+            ('b', 'essentials', 150, None, 'M,L', '#000,#FFF'),
+            ('c', 'essentials', 250, 300, 'XL', '#FFF'),
+            ('d', 'outerwear', 350, None, 'M', '#F00'),
+        ]:
+            Product.objects.create(name=slug.upper(), slug=slug, price=price, old_price=old_price, category=category,
+                                   description='x', image='https://example.com/x.jpg', sizes=sizes, colors=colors)
+
+    def counts(self, params, cat=None):
+        with self.assertNumQueries(1):
+            counts = facets.facet_counts(catalog.listing_queryset(cat), facets.parse_filters(QueryDict(params)))
+        return counts['sizes'], counts['colors'], [n for _, _, n in counts['prices']], counts['sale']
+
+    def test_unfiltered(self):
+        self.assertEqual(self.counts(''), (
+            [('S', 1), ('M', 3), ('L', 1), ('XL', 1)], [('#000', 2), ('#FFF', 2), ('#F00', 1)], [1, 1, 1, 1], 2))
+
+    def test_each_facet_ignores_its_own_filter(self):
+        # Only B has an M in #FFF
+        self.assertEqual(self.counts('size=M&color=%23FFF'), (
+            [('M', 1), ('L', 1), ('XL', 1)], [('#000', 2), ('#F00', 1), ('#FFF', 1)], [0, 1, 0, 0], 0))
+        self.assertEqual(self.counts('sale=1&price=0-100&price=200-300'), (
+            [('S', 1), ('M', 1), ('XL', 1)], [('#000', 1), ('#FFF', 1)], [1, 0, 1, 0], 2))
+
+    def test_zero_counts(self):
+        self.assertEqual(self.counts('price=300-&sale=1', cat='essentials'), ([], [], [1, 0, 1, 0], 0))
+        # A selected value stays listed with 0 even when nothing has it
+        self.assertEqual(self.counts('size=XXS'), (
+            [('XXS', 0), ('S', 1), ('M', 3), ('L', 1), ('XL', 1)], [], [0, 0, 0, 0], 0))
+
+
+class SnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ['streetwear', 'essentials', 'outerwear']
+        cls.products = [
+            Product.objects.create(
+                name=f'Piece {i}', slug=f'piece-{i}', price=[90, 150, 90, 320, 45, 210, 150][i % 7] + i // 7,
+                old_price=200 if i % 3 == 0 else None, category=categories[i % 3], description='Piece',
+                image='https://example.com/p.jpg', sizes=['S,M', 'M,L', 'XL'][i % 3], colors=['#000', '#000,#FFF'][i % 2],
+                rating=[4.5, 3.0, 4.5, 5.0][i % 4],
+            )
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        snapshot.clear()
+        self.snapshot = snapshot.current(RequestFactory().get('/'))
+
+    def all_pages(self, page, *args):
+        rows, cursor = page(*args, None)
+        while cursor:
+            more, cursor = page(*args, cursor)
+            rows += more
+        return [p.id for p in rows]
+
+    def test_pages_and_facets_match_the_database(self):
+        cases = [
+            (None, ''), ('essentials', ''), (None, 'size=M&color=%23FFF'),
+            ('streetwear', 'price=0-100&price=200-300'), (None, 'sale=1&size=XL'),
+        ]
+        for cat, params in cases:
+            filters = facets.parse_filters(QueryDict(params))
+            base = catalog.listing_queryset(cat)
+            for sort in catalog.SORT_ORDERINGS:
+                with self.subTest(cat=cat, params=params, sort=sort):
+                    expected = self.all_pages(
+                        lambda c: catalog.product_page(facets.apply_filters(base, filters), sort, c))
+                    with self.assertNumQueries(0):
+                        got = self.all_pages(lambda c: self.snapshot.page(cat, filters, sort, c, page_size=4))
+                    self.assertEqual(got, expected)
+            self.assertEqual(facets.card_facet_counts(self.snapshot.listing(cat), filters),
+                             facets.facet_counts(base, filters))
+
+    def test_database_cursors_carry_over(self):
+        filters = facets.parse_filters(QueryDict())
+        for sort in ('low', 'newest', 'rating'):
+            _, cursor = keyset_page(catalog.listing_queryset(), catalog.SORT_ORDERINGS[sort], page_size=5)
+            expected, _ = keyset_page(catalog.listing_queryset(), catalog.SORT_ORDERINGS[sort], cursor, page_size=5)
+            got, _ = self.snapshot.page(None, filters, sort, cursor, page_size=5)
+            self.assertEqual([p.id for p in got], [p.id for p in expected])
+        self.assertEqual(len(self.snapshot.page(None, filters, 'low', 'not-a-cursor')[0]), 24)
+
+    def test_refreshes_when_the_catalog_moves(self):
+        request = RequestFactory().get('/')
+        self.assertIs(snapshot.current(request), self.snapshot)
+        product = self.products[0]
+        product.price = 10
+        product.save()
+        fresh = snapshot.current(RequestFactory().get('/'))
+        self.assertIsNot(fresh, self.snapshot)
+        self.assertEqual(fresh.by_slug['piece-0'].price, 10)
+        # Writes that bypass the models bump the version themselves
+        ProductVariant.objects.filter(product=product).update(stock=0)
+        CatalogVersion.bump()
+        self.assertTrue(snapshot.current(RequestFactory().get('/')).by_id[product.pk].sold_out)
+
+    def test_cards_are_read_only_and_precomputed(self):
+        card = self.snapshot.by_slug['piece-1']
+        self.assertEqual((card.sizes, card.colors), (('M', 'L'), ('#000', '#FFF')))
+        self.assertEqual(card.get_sizes_list(), self.products[1].get_sizes_list())
+        self.assertEqual(self.snapshot.by_slug['piece-0'].discount_percent, self.products[0].discount_percent)
+        with self.assertRaises(AttributeError):
+            card.price = 1
+        with self.assertRaises(AttributeError):
+            card.extra = 1
+
+    def test_pages_render_from_the_snapshot(self):
+        response = self.client.get(reverse('product_detail', args=['piece-3']))
+        self.assertContains(response, 'Piece 3')
+        self.assertEqual([p.category for p in response.context['related']], ['streetwear'] * 4)
+        self.assertEqual(self.client.get(reverse('product_detail', args=['nope'])).status_code, 404)
+        response = self.client.get(reverse('shop') + '?cat=outerwear&sort=high&format=json')
+        prices = [Decimal(p['price']) for p in response.json()['products']]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+    def test_cached_product_cards_follow_edits(self):
+        cache.clear()
+        product = self.products[1]
+
+        def card():
+            html = self.client.get(reverse('shop'), {'cat': 'essentials'}).content.decode()
+            [card] = [c for c in html.split('<div class="product-card"') if f'/product/{product.slug}/' in c]
+            return card
+
+        self.assertIn('₹150', card())
+        product.price = 175
+        product.save()
+        self.assertIn('₹175', card())
+
+        variant = ProductVariant.objects.get(product=product, size='M', color='#000')
+        for stock in (0, 4):
+            ProductVariant.objects.filter(product=product).exclude(pk=variant.pk).update(stock=0)
+            variant.stock = stock
+            variant.save()
+            self.assertEqual('Sold Out' in card(), stock == 0)
+
+        # Only updated_at is in the key, so a bulk write must move it to show
+        Product.objects.filter(pk=product.pk).update(name='Renamed Piece', updated_at=timezone.now())
+        CatalogVersion.bump()
+        self.assertIn('Renamed Piece', card())
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = {
+            name: Product.objects.create(
+                name=name.title(), slug=name, price=100, category=category, description='Piece',
+                image='https://example.com/p.jpg', sizes='M', colors='#000')
+            for name, category in [('hoodie', 'streetwear'), ('cap', 'essentials'), ('socks', 'essentials'),
+                                   ('tee', 'essentials'), ('jacket', 'outerwear'), ('beanie', 'streetwear'),
+                                   ('scarf', 'streetwear')]
+        }
+        cls.buyer = User.objects.create_user('buyer')
+        customer = checkout.customer_fields({'first_name': 'Buyer'})
+        baskets = [['hoodie', 'cap']] * 3 + [['hoodie', 'socks'], ['hoodie', 'tee']] + [['tee', 'jacket']] * 6
+        for names in baskets + [['hoodie', 'jacket']]:
+            for name in names:
+                CartItem.objects.create(user=cls.buyer, product=cls.products[name], size='M', color='#000')
+            order = checkout.place_order(CartItem.objects.filter(user=cls.buyer), customer, user=cls.buyer)
+        order.status = 'cancelled'
+        order.save()
+
+    def neighbours(self, slug):
+        return list(ProductNeighbour.objects.filter(product__slug=slug).order_by('rank').values_list(
+            'neighbour__slug', flat=True))
+
+    def test_neighbours_are_ranked_by_cosine_similarity(self):
+        self.assertEqual(recommendations.rebuild(), (5, 8))
+        # socks (1 of 1 orders) beats tee (1 of 8), though both were bought with the hoodie once;
+        # the cancelled order does not count
+        self.assertEqual(self.neighbours('hoodie'), ['cap', 'socks', 'tee'])
+        self.assertEqual(self.neighbours('tee'), ['jacket', 'hoodie'])
+        recommendations.rebuild(top_k=1)
+        self.assertEqual(self.neighbours('hoodie'), ['cap'])
+
+    def test_wishlists_count_when_weighted(self):
+        for name in ('scarf', 'beanie'):
+            Wishlist.objects.create(user=self.buyer, session_key='s', product=self.products[name])
+        recommendations.rebuild()
+        self.assertEqual(self.neighbours('scarf'), [])
+        recommendations.rebuild(wishlist_weight=0.5)
+        self.assertEqual(self.neighbours('scarf'), ['beanie'])
+
+    def test_a_rebuild_changes_the_product_page_etag(self):
+        url = reverse('product_detail', args=['hoodie'])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 304)
+        recommendations.rebuild()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 200)
+
+    def test_product_page_falls_back_to_the_category(self):
+        call_command('build_recommendations', stdout=io.StringIO())
+        response = self.client.get(reverse('product_detail', args=['hoodie']))
+        self.assertEqual([p.slug for p in response.context['related']], ['cap', 'socks', 'tee', 'beanie'])
+        response = self.client.get(reverse('product_detail', args=['scarf']))
+        self.assertEqual([p.slug for p in response.context['related']], ['hoodie', 'beanie'])
+
+
+class BestSellerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = {
+            name: Product.objects.create(
+                name=name.title(), slug=name, price=price, category=category, description='Piece',
+                image='https://example.com/p.jpg', sizes='M', colors='#000', rating=rating)
+            for name, category, price, rating in [
+                ('hoodie', 'streetwear', 150, 3.0), ('cap', 'essentials', 40, 4.0), ('tee', 'essentials', 60, 5.0),
+                ('jacket', 'outerwear', 300, 2.0), ('beanie', 'streetwear', 30, 1.0)]
+        }
+        today = timezone.localdate()
+        for name, days_ago, units in [('hoodie', 14, 10), ('cap', 0, 3), ('tee', 1, 1), ('tee', 0, 1),
+                                      ('jacket', 100, 50), ('beanie', 7, 2)]:
+            product = cls.products[name]
+            ProductSalesDaily.objects.create(day=today - timedelta(days=days_ago), product=product,
+                                             category=product.category, units=units)
+
+    def setUp(self):
+        snapshot.clear()
+
+    def slugs(self, ids):
+        return [Product.objects.get(pk=pk).slug for pk in ids]
+
+    def test_recent_sales_count_most(self):
+        self.assertEqual(bestsellers.rebuild(), 4)
+        # 3 today beats 10 two half-lives ago (2.5); the jacket's sales are older than the window
+        self.assertEqual(self.slugs(bestsellers.ranking()), ['cap', 'hoodie', 'tee', 'beanie'])
+        self.assertEqual(self.slugs(bestsellers.ranking('streetwear')), ['hoodie', 'beanie'])
+        self.assertEqual(self.slugs(bestsellers.ranking('outerwear')), [])
+        self.assertEqual(self.slugs(bestsellers.ranking(limit=2)), ['cap', 'hoodie'])
+        bestsellers.rebuild(half_life=100, window=365)
+        self.assertEqual(self.slugs(bestsellers.ranking())[:2], ['jacket', 'hoodie'])
+
+    def test_home_shows_the_ranking(self):
+        self.assertEqual([p.slug for p in self.client.get(reverse('home')).context['best_sellers']],
+                         ['tee', 'cap', 'hoodie', 'jacket', 'beanie'])
+        call_command('rank_bestsellers', stdout=io.StringIO())
+        self.assertEqual([p.slug for p in self.client.get(reverse('home')).context['best_sellers']],
+                         ['cap', 'hoodie', 'tee', 'beanie'])
+
+    def test_shop_sorts_by_the_ranking(self):
+        bestsellers.rebuild()
+        url = reverse('shop') + '?sort=bestselling&format=json'
+        self.assertEqual([p['name'] for p in self.client.get(url).json()['products']],
+                         ['Cap', 'Hoodie', 'Tee', 'Beanie', 'Jacket'])
+        self.assertEqual([p['name'] for p in self.client.get(url + '&cat=essentials').json()['products']],
+                         ['Cap', 'Tee'])
+        catalog_snapshot = snapshot.current(RequestFactory().get('/'))
+        filters = facets.parse_filters(QueryDict('price=0-100'))
+        rows, cursor = catalog_snapshot.ranked_page(None, filters, page_size=2)
+        more, end = catalog_snapshot.ranked_page(None, filters, cursor, page_size=2)
+        self.assertEqual([p.slug for p in rows + more], ['cap', 'tee', 'beanie'])
+        self.assertIsNone(end)
+
+    def test_shop_reads_only_a_window_of_the_ranking(self):
+        bestsellers.rebuild()
+        catalog_snapshot = snapshot.current(RequestFactory().get('/'))
+
+        def walk(params):
+            slugs, cursor = [], None
+            while True:
+                rows, cursor = catalog_snapshot.ranked_page(None, facets.parse_filters(QueryDict(params)), cursor,
+                                                            page_size=1)
+                slugs += [p.slug for p in rows]
+                if cursor is None:
+                    return slugs
+
+        # Three rows answer a page of two: two cards and the one that shows there is more
+        with CaptureQueriesContext(connection) as queries:
+            rows, _ = catalog_snapshot.ranked_page(None, facets.parse_filters(QueryDict()), page_size=2)
+        self.assertEqual(([p.slug for p in rows], len(queries)), (['cap', 'hoodie'], 1))
+        self.assertIn('LIMIT 3', queries[0]['sql'])
+        self.assertEqual(walk(''), ['cap', 'hoodie', 'tee', 'beanie', 'jacket'])
+        # Only the unranked jacket passes, found after windows of filtered-out ranking
+        self.assertEqual(walk('price=300-'), ['jacket'])
+
+    def test_a_new_ranking_changes_the_etag(self):
+        url = reverse('shop') + '?sort=bestselling'
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        bestsellers.rebuild()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Shadow Tee', slug='shadow-tee', price=89, category='streetwear', description='Tee',
+            image='https://example.com/s.jpg', sizes='M', colors='#000')
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'secret123')
+
+    def revalidate(self, url):
+        """GET ``url`` twice (the first sets the CSRF cookie); returns the ETag and a conditional GET."""
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        return etag, self.client.get(url, headers={'if-none-match': etag})
+
+    def test_shop_is_not_modified_until_the_catalog_changes(self):
+        etag, response = self.revalidate(reverse('shop'))
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        self.product.price = 79
+        self.product.save()
+        response = self.client.get(reverse('shop'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_an_edit_stamped_before_the_newest_still_moves_the_version(self):
+        # Two concurrent edits: the later commit carries the older auto_now time
+        Product.objects.create(name='Newer', slug='newer', price=10, category='streetwear', description='x',
+                               image='https://example.com/n.jpg')
+        url = reverse('shop')
+        etag, _ = self.revalidate(url)
+        stale = snapshot.current(RequestFactory().get(url))
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(minutes=5)):
+            self.product.price = 49
+            self.product.save_details()
+        self.assertLess(Product.objects.get(pk=self.product.pk).updated_at,
+                        Product.objects.get(slug='newer').updated_at)
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+        fresh = snapshot.current(RequestFactory().get(url))
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(fresh.by_id[self.product.pk].price, 49)
+
+    def test_etag_follows_the_viewer(self):
+        url = reverse('product_detail', args=['shadow-tee'])
+        anonymous, _ = self.revalidate(url)
+        self.client.post(reverse('toggle_wishlist'), json.dumps({'product_id': self.product.pk}),
+                         content_type='application/json')
+        self.assertEqual(self.client.get(url, headers={'if-none-match': anonymous}).status_code, 200)
+
+        self.client.force_login(self.buyer)
+        signed_in, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(signed_in, anonymous)
+
+    def test_a_review_refreshes_the_product_page(self):
+        url = reverse('product_detail', args=['shadow-tee'])
+        etag, _ = self.revalidate(url)
+        Review.objects.create(product=self.product, name='Dev', rating=5, text='Great.')
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_order_tracking_page_changes_with_the_status(self):
+        self.client.force_login(self.buyer)
+        CartItem.objects.create(user=self.buyer, product=self.product, size='M', color='#000')
+        order = checkout.place_order(CartItem.objects.filter(user=self.buyer),
+                                     checkout.customer_fields({'first_name': 'Buyer'}), user=self.buyer)
+        url = reverse('order_detail_page', args=[order.order_number])
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, headers={'if-modified-since': last_modified}).status_code, 304)
+
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+        self.client.force_login(User.objects.create_user('other'))
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 404)
+
+    def test_order_page_links_to_the_renamed_product(self):
+        self.client.force_login(self.buyer)
+        CartItem.objects.create(user=self.buyer, product=self.product, size='M', color='#000')
+        order = checkout.place_order(CartItem.objects.filter(user=self.buyer),
+                                     checkout.customer_fields({'first_name': 'Buyer'}), user=self.buyer)
+        url = reverse('order_detail_page', args=[order.order_number])
+        etag, _ = self.revalidate(url)
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.slug = 'shadow-tee-v2'
+        product.save_details()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('product_detail', args=['shadow-tee-v2']))
+        self.assertNotContains(response, reverse('product_detail', args=['shadow-tee']))
+        self.assertEqual(order.items.get().product_slug, 'shadow-tee')
+
+    def test_selling_out_moves_the_catalog_version(self):
+        ProductVariant.objects.filter(product=self.product).update(stock=1)
+        before = Product.objects.get(pk=self.product.pk).updated_at
+        CartItem.objects.create(user=self.buyer, product=self.product, size='M', color='#000')
+        checkout.place_order(CartItem.objects.filter(user=self.buyer),
+                             checkout.customer_fields({'first_name': 'Buyer'}), user=self.buyer)
+        self.assertGreater(Product.objects.get(pk=self.product.pk).updated_at, before)
+
+
+class CatalogImportTests(TestCase):
+
+    def import_file(self, content, suffix='.jsonl', *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.unlink, f.name)
+        out = io.StringIO()
+        call_command('import_catalog', f.name, *args, stdout=out, stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_upsert_by_slug_touches_only_changed_products(self):
+        rows = [
+            {'slug': f'tee-{i}', 'name': f'Tee {i}', 'category': 'essentials', 'price': 50 + i,
+             'image': 'https://example.com/t.jpg', 'description': 'Tee', 'sizes': 'S,M', 'colors': '#000'}
+            for i in range(5)
+        ]
+        catalog = ''.join(json.dumps(row) + '\n' for row in rows)
+        self.assertIn('5 inserted, 0 updated, 0 unchanged', self.import_file(catalog, '.jsonl', '--batch-size', '2'))
+        self.assertEqual(Product.objects.get(slug='tee-0').get_sizes_list(), ['S', 'M'])
+        versions = dict(Product.objects.values_list('slug', 'updated_at'))
+
+        self.assertIn('0 inserted, 0 updated, 5 unchanged', self.import_file(catalog))
+        self.assertEqual(dict(Product.objects.values_list('slug', 'updated_at')), versions)
+
+        rows[1].update(price='45.50', sizes='M,L,XL')
+        out = self.import_file(''.join(json.dumps(row) + '\n' for row in rows))
+        self.assertIn('0 inserted, 1 updated, 4 unchanged', out)
+        tee = Product.objects.get(slug='tee-1')
+        self.assertEqual((tee.price, tee.get_sizes_list()), (Decimal('45.50'), ['M', 'L', 'XL']))
+        self.assertGreater(tee.updated_at, versions['tee-1'])
+        self.assertEqual(Product.objects.get(slug='tee-2').updated_at, versions['tee-2'])
+
+    def test_csv_dry_run_prints_a_diff_and_writes_nothing(self):
+        call_command('seed_data', stdout=io.StringIO())
+        csv_file = 'slug,price,old_price,in_stock,name\ncyber-hoodie,149,,false,\nshadow-oversized-tee,89,120,yes,\n'
+        out = self.import_file(csv_file, '.csv', '--dry-run')
+        self.assertIn('~ cyber-hoodie: price 159.00 -> 149', out)
+        self.assertIn('~ cyber-hoodie: in_stock True -> False', out)
+        self.assertNotIn('shadow-oversized-tee', out.split('Dry run')[0])
+        self.assertIn('Dry run, would have: 0 inserted, 1 updated, 1 unchanged', out)
+        self.assertEqual(Product.objects.get(slug='cyber-hoodie').price, 159)
+
+        self.import_file(csv_file, '.csv')
+        hoodie = Product.objects.get(slug='cyber-hoodie')
+        self.assertEqual((hoodie.price, hoodie.in_stock, hoodie.name), (149, False, 'Cyber Hoodie'))
+
+    def test_any_invalid_row_aborts_the_whole_import(self):
+        catalog = (
+            '{"slug": "fresh", "name": "Fresh", "category": "new", "price": 10, '
+            '"image": "https://example.com/f.jpg", "description": "x"}\n'
+            '{"slug": "fresh", "price": 12}\n'
+            '{"slug": "unknown-slug", "price": 5}\n'
+            '{"slug": "bad", "price": "abc", "category": "hats"}\n'
+        )
+        with self.assertRaisesMessage(CommandError, '3 of 4 rows are invalid; nothing was imported'):
+            self.import_file(catalog)
+        self.assertFalse(Product.objects.exists())
+
+    def test_insert_only_keeps_dashboard_edits(self):
+        call_command('seed_data', stdout=io.StringIO())
+        Product.objects.filter(slug='cyber-hoodie').update(price=1)
+        Product.objects.filter(slug='tech-windbreaker').delete()
+        with open(settings.BASE_DIR / 'store' / 'data' / 'catalog.jsonl') as f:
+            out = self.import_file(f.read(), '.jsonl', '--insert-only')
+        self.assertIn('1 inserted, 0 updated, 15 unchanged', out)
+        self.assertEqual(Product.objects.get(slug='cyber-hoodie').price, 1)
+        self.assertTrue(Product.objects.filter(slug='tech-windbreaker').exists())
+
+
+@override_settings(
+    MIDDLEWARE=['store.profiling.ProfilingMiddleware'] + settings.MIDDLEWARE,
+    TEMPLATES=[{**settings.TEMPLATES[0], 'BACKEND': 'store.profiling.TimedDjangoTemplates'}],
+    PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_REQUEST_MS=0, PROFILE_SLOW_QUERIES=2, PROFILE_LOG_PARAMS=False,
+)
+class ProfilingMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name='Tee', slug='tee', price=50, category='essentials', description='Tee',
+                               image='https://example.com/tee.jpg')
+
+    def test_server_timing_and_slow_log(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        with self.assertLogs('store.profiling', 'WARNING') as logs:
+            response = self.client.get(reverse('product_detail', args=['tee']))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('app;dur=', timing)
+        self.assertIn('GET /product/tee/ -> 200', logs.output[0])
+        # Each of the slowest queries is followed by its indented EXPLAIN rows
+        self.assertRegex(logs.output[0], r'\n  [\d.]+ms \[default\] SELECT .*\n    \S')
+
+    @override_settings(PROFILE_SLOW_QUERIES=50)
+    def test_slow_log_leaves_out_customer_data(self):
+        self.client.force_login(User.objects.create_user('buyer'))
+        session_key = self.client.session.session_key
+        with self.assertLogs('store.profiling', 'WARNING') as logs:
+            self.client.get(reverse('product_detail', args=['tee']) + '?email=someone@example.com')
+        self.assertNotIn('someone@example.com', logs.output[0])
+        self.assertNotIn(session_key, logs.output[0])
+        self.assertEqual(profiling.redact("Filter: ((slug)::text = 'tee'::text)"), "Filter: ((slug)::text = '?'::text)")
+        with override_settings(PROFILE_LOG_PARAMS=True), self.assertLogs('store.profiling', 'WARNING') as logs:
+            self.client.get(reverse('product_detail', args=['tee']) + '?email=someone@example.com')
+        self.assertIn('someone@example.com', logs.output[0])
+        self.assertIn(session_key, logs.output[0])
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        for user in (None, User.objects.create_user('buyer')):
+            if user:
+                self.client.force_login(user)
+            with self.assertLogs('store.profiling', 'WARNING'):
+                response = self.client.get(reverse('product_detail', args=['tee']))
+            self.assertNotIn('Server-Timing', response)
+        with override_settings(DEBUG=True), self.assertLogs('store.profiling', 'WARNING'):
+            self.assertIn('Server-Timing', self.client.get(reverse('product_detail', args=['tee'])))
+
+    @override_settings(PROFILE_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        response = self.client.get(reverse('product_detail', args=['tee']))
+        self.assertNotIn('Server-Timing', response)
@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('shop/', views.shop, name='shop'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('api/search/', views.search_api, name='search_api'),
     # Auth pages
     path('login/', views.login_page, name='login'),
     path('register/', views.register_page, name='register'),
@@ -24,6 +25,7 @@ urlpatterns = [
     # Cart & Wishlist APIs
     path('api/cart/add/', views.add_to_cart, name='add_to_cart'),
     path('api/cart/update/', views.update_cart, name='update_cart'),
+    path('api/cart/batch/', views.cart_batch, name='cart_batch'),
     path('api/wishlist/toggle/', views.toggle_wishlist, name='toggle_wishlist'),
     path('api/order/place/', views.place_order, name='place_order'),
     # Admin Dashboard
@@ -35,6 +37,7 @@ urlpatterns = [
     path('dashboard/products/<int:product_id>/edit/', admin_views.admin_product_edit, name='admin_product_edit'),
     path('dashboard/products/<int:product_id>/delete/', admin_views.admin_product_delete, name='admin_product_delete'),
     path('dashboard/orders/', admin_views.admin_orders, name='admin_orders'),
+    path('dashboard/orders/export/', admin_views.admin_order_export, name='admin_order_export'),
     path('dashboard/orders/<int:order_id>/', admin_views.admin_order_detail, name='admin_order_detail'),
     path('dashboard/reviews/', admin_views.admin_reviews, name='admin_reviews'),
     path('dashboard/reviews/<int:review_id>/edit/', admin_views.admin_review_edit, name='admin_review_edit'),
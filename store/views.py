@@ -1,11 +1,25 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.http import Http404, JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_POST
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.models import User
-from django.db import models
+from django.db.models import F, Prefetch
+from django.db.models.functions import Least
 from .models import Product, CartItem, Wishlist, Order, OrderItem, Review, Address
-import json, random, string
+from . import bestsellers, cart, catalog, checkout, facets, inventory, recommendations, search, snapshot
+from .conditional import conditional, listing_version, order_version, product_version
+from .pagination import keyset_page, cursor_querystring
+from .basket import MAX_CART_LINES, MAX_QUANTITY, Basket, merge_into_user
+from .summary import aget_summary, ainvalidate_summary, get_summary, invalidate_summary
+import json
+
+
+ACCOUNT_RECENT_ORDERS = 5
+ORDERS_PAGE_SIZE = 10
+# What update_cart's 'action' may be; the other cart.parse operations go through cart_batch
+UPDATE_ACTIONS = ('increase', 'decrease', 'remove')
 
 
 def get_session(request):
@@ -14,11 +28,43 @@ def get_session(request):
     return request.session.session_key
 
 
+async def aget_session(request):
+    if not request.session.session_key:
+        await request.session.acreate()
+    return request.session.session_key
+
+
+def sign_in(request, user):
+    """Log ``user`` in and move the visitor's basket cookie into their cart and wishlist.
+
+    The caller saves the (now empty) basket on its response to drop the cookie.
+    """
+    # login() rotates the session key, so grab the anonymous one first
+    old_key = request.session.session_key
+    login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+    basket = Basket.from_request(request)
+    merge_into_user(basket, user, request.session.session_key)
+    basket.clear()
+    if old_key:
+        # Session-keyed rows from before anonymous baskets moved into the cookie
+        CartItem.objects.filter(session_key=old_key, user__isnull=True).update(user=user)
+        Wishlist.objects.filter(session_key=old_key, user__isnull=True).update(user=user)
+    invalidate_summary(user_id=user.pk)
+    return basket
+
+
 def is_logged_in(request):
     return request.user.is_authenticated
 
 
 def login_required_view(view_func):
+    if iscoroutinefunction(view_func):
+        async def async_wrapper(request, *args, **kwargs):
+            if not (await request.auser()).is_authenticated:
+                return redirect('/login/?next=' + request.path)
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     def wrapper(request, *args, **kwargs):
         if not is_logged_in(request):
             return redirect('/login/?next=' + request.path)
@@ -27,10 +73,11 @@ def login_required_view(view_func):
 
 
 def cart_count(request):
-    if request.user.is_authenticated:
-        return CartItem.objects.filter(user=request.user).aggregate(total=models.Sum('quantity'))['total'] or 0
-    sk = get_session(request)
-    return CartItem.objects.filter(session_key=sk, user__isnull=True).aggregate(total=models.Sum('quantity'))['total'] or 0
+    return get_summary(request)['cart_count']
+
+
+async def acart_count(request, user):
+    return (await aget_summary(request, user))['cart_count']
 
 
 def base_context(request):
@@ -54,51 +101,95 @@ def home(request):
     if request.user.is_authenticated:
         return redirect('shop')
     ctx = base_context(request)
-    ctx['best_sellers'] = Product.objects.filter(badge='Best Seller').order_by('-rating')[:8]
-    if ctx['best_sellers'].count() < 4:
-        ctx['best_sellers'] = Product.objects.all().order_by('-rating')[:8]
+    catalog_snapshot = snapshot.current(request)
+    # Read a few spare ids in case ranked products were deleted since the last rank_bestsellers
+    ranked = [catalog_snapshot.by_id[i] for i in bestsellers.ranking(limit=24) if i in catalog_snapshot.by_id]
+    # Too few sales yet to fill the row: fall back to the best rated
+    ctx['best_sellers'] = ranked[:8] if len(ranked) >= 4 else catalog_snapshot.ordered('rating')[:8]
     ctx['categories'] = [
         {'name': 'Streetwear', 'slug': 'streetwear', 'img': 'https://images.unsplash.com/photo-1617137968427-85924c800a22?w=600&h=800&fit=crop'},
         {'name': 'Essentials', 'slug': 'essentials', 'img': 'https://images.unsplash.com/photo-1552374196-1ab2a1c593e8?w=600&h=800&fit=crop'},
         {'name': 'New Arrivals', 'slug': 'new', 'img': 'https://images.unsplash.com/photo-1551488831-00ddcb6c6bd3?w=600&h=800&fit=crop'},
         {'name': 'Limited Edition', 'slug': 'limited', 'img': 'https://images.unsplash.com/photo-1520367445093-50dc08a59d9d?w=600&h=800&fit=crop'},
     ]
-    ctx['wishlist_ids'] = list(Wishlist.objects.filter(session_key=get_session(request)).values_list('product_id', flat=True))
+    ctx['wishlist_ids'] = get_summary(request)['wishlist_ids']
     return render(request, 'store/home.html', ctx)
 
 
+@conditional(listing_version)
 def shop(request):
-    ctx = base_context(request)
-    products = Product.objects.all()
     cat = request.GET.get('cat')
-    if cat:
-        products = products.filter(category=cat)
+    q = request.GET.get('q', '').strip()
     sort = request.GET.get('sort', 'featured')
-    if sort == 'low': products = products.order_by('price')
-    elif sort == 'high': products = products.order_by('-price')
-    elif sort == 'newest': products = products.order_by('-created_at')
-    elif sort == 'rating': products = products.order_by('-rating')
+    if sort not in catalog.SORT_ORDERINGS and sort != 'bestselling':
+        sort = 'featured'
+    filters = facets.parse_filters(request.GET)
+    if q:
+        # Search needs the database's text index; everything else is served from the snapshot
+        base = search.search_products(catalog.listing_queryset(cat), q)
+        products = facets.apply_filters(base, filters)
+        if sort == 'featured':
+            products, next_cursor = search.ranked_page(products, request.GET.get('cursor'))
+        elif sort == 'bestselling':
+            products, next_cursor = search.ranked_page(
+                bestsellers.annotate_place(products, cat), request.GET.get('cursor'),
+                ('bestseller_place',) + search.RELEVANCE)
+        else:
+            products, next_cursor = catalog.product_page(products, sort, request.GET.get('cursor'))
+    else:
+        catalog_snapshot = snapshot.current(request)
+        if sort == 'bestselling':
+            products, next_cursor = catalog_snapshot.ranked_page(cat, filters, request.GET.get('cursor'))
+        else:
+            products, next_cursor = catalog_snapshot.page(cat, filters, sort, request.GET.get('cursor'))
+    # JSON variant feeds the infinite scroll in app.js
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'products': [catalog.card_json(p) for p in products],
+            'next_cursor': next_cursor,
+        })
+    ctx = base_context(request)
     ctx['products'] = products
+    ctx['next_cursor'] = next_cursor
     ctx['current_cat'] = cat or ''
     ctx['current_sort'] = sort
-    if request.user.is_authenticated:
-        ctx['wishlist_ids'] = list(Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True))
+    ctx['current_q'] = q
+    ctx['filters'] = filters
+    if q:
+        ctx['facets'] = facets.facet_counts(base, filters)
     else:
-        ctx['wishlist_ids'] = list(Wishlist.objects.filter(session_key=get_session(request)).values_list('product_id', flat=True))
+        ctx['facets'] = facets.card_facet_counts(catalog_snapshot.listing(cat), filters)
+    ctx['wishlist_ids'] = get_summary(request)['wishlist_ids']
     return render(request, 'store/shop.html', ctx)
 
 
+def search_api(request):
+    q = request.GET.get('q', '').strip()
+    if len(q) < search.MIN_QUERY_LENGTH:
+        return JsonResponse({'success': True, 'suggestions': [], 'results': []})
+    suggestions = [{
+        'id': p.id, 'name': p.name, 'price': str(p.price), 'image': p.image,
+        'url': reverse('product_detail', args=[p.slug]),
+    } for p in search.suggest(q)]
+    results = [catalog.card_json(p) for p in search.ranked(catalog.listing_queryset(), q, limit=search.SUGGEST_LIMIT)]
+    return JsonResponse({'success': True, 'suggestions': suggestions, 'results': results})
+
+
+@conditional(product_version)
 def product_detail(request, slug):
+    catalog_snapshot = snapshot.current(request)
+    p = catalog_snapshot.by_slug.get(slug)
+    if p is None:
+        raise Http404('No product matches the given query.')
     ctx = base_context(request)
-    p = get_object_or_404(Product, slug=slug)
     ctx['product'] = p
-    ctx['related'] = Product.objects.filter(category=p.category).exclude(id=p.id)[:4]
-    ctx['reviews'] = p.reviews.all().order_by('-created_at')
+    ctx['related'] = recommendations.related(catalog_snapshot, p)
+    # Lazy: only evaluated when the cached reviews fragment is rebuilt
+    ctx['reviews'] = Review.objects.filter(product_id=p.id).order_by('-created_at')
+    ctx['in_wishlist'] = p.id in get_summary(request)['wishlist_ids']
     if request.user.is_authenticated:
-        ctx['in_wishlist'] = Wishlist.objects.filter(user=request.user, product=p).exists()
-        ctx['has_reviewed'] = Review.objects.filter(user=request.user, product=p).exists()
+        ctx['has_reviewed'] = Review.objects.filter(user=request.user, product_id=p.id).exists()
     else:
-        ctx['in_wishlist'] = Wishlist.objects.filter(session_key=get_session(request), product=p).exists()
         ctx['has_reviewed'] = False
     return render(request, 'store/product_detail.html', ctx)
 
@@ -123,13 +214,11 @@ def login_page(request):
         if user is None:
             user = authenticate(request, username=identifier, password=password)
         if user is not None:
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-            # Migrate session cart/wishlist to user
-            sk = get_session(request)
-            CartItem.objects.filter(session_key=sk, user__isnull=True).update(user=user)
-            Wishlist.objects.filter(session_key=sk, user__isnull=True).update(user=user)
+            basket = sign_in(request, user)
             next_url = request.GET.get('next', '/shop/')
-            return redirect(next_url)
+            response = redirect(next_url)
+            basket.save(response)
+            return response
         ctx['error'] = 'Invalid email/username or password. Please try again.'
     return render(request, 'store/login.html', ctx)
 
@@ -164,12 +253,11 @@ def register_page(request):
                 username=username, email=email, password=password,
                 first_name=first_name, last_name=last_name
             )
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-            sk = get_session(request)
-            CartItem.objects.filter(session_key=sk, user__isnull=True).update(user=user)
-            Wishlist.objects.filter(session_key=sk, user__isnull=True).update(user=user)
+            basket = sign_in(request, user)
             next_url = request.GET.get('next', '/shop/')
-            return redirect(next_url)
+            response = redirect(next_url)
+            basket.save(response)
+            return response
     return render(request, 'store/register.html', ctx)
 
 
@@ -194,9 +282,10 @@ def logout_view(request):
 @login_required_view
 def cart_page(request):
     ctx = base_context(request)
-    items = CartItem.objects.filter(user=request.user).select_related('product')
+    items = CartItem.objects.filter(user=request.user).select_related('product').annotate(
+        available=inventory.units_left())
     subtotal = sum(i.total for i in items)
-    shipping = 0 if subtotal > 150 else 12
+    shipping = checkout.shipping_for(subtotal)
     ctx['items'] = items
     ctx['subtotal'] = subtotal
     ctx['shipping'] = shipping
@@ -209,7 +298,7 @@ def checkout_page(request):
     ctx = base_context(request)
     items = CartItem.objects.filter(user=request.user).select_related('product')
     subtotal = sum(i.total for i in items)
-    shipping = 0 if subtotal > 150 else 12
+    shipping = checkout.shipping_for(subtotal)
     ctx['items'] = items
     ctx['subtotal'] = subtotal
     ctx['shipping'] = shipping
@@ -221,7 +310,9 @@ def checkout_page(request):
 @login_required_view
 def wishlist_page(request):
     ctx = base_context(request)
-    ctx['wishlist_items'] = Wishlist.objects.filter(user=request.user).select_related('product')
+    # The cards need the listing annotations (sold_out is in their cache key)
+    ctx['wishlist_items'] = Wishlist.objects.filter(user=request.user).prefetch_related(
+        Prefetch('product', queryset=catalog.listing_queryset()))
     return render(request, 'store/wishlist.html', ctx)
 
 
@@ -229,7 +320,8 @@ def wishlist_page(request):
 def account_page(request):
     ctx = base_context(request)
     ctx['user'] = request.user
-    ctx['orders'] = Order.objects.filter(user=request.user).order_by('-created_at')
+    # Latest few only; the full history is paginated on my_orders_page
+    ctx['orders'] = Order.objects.filter(user=request.user).order_by('-created_at', '-id')[:ACCOUNT_RECENT_ORDERS]
     ctx['wishlist'] = Wishlist.objects.filter(user=request.user).select_related('product')
     ctx['addresses'] = Address.objects.filter(user=request.user)
     return render(request, 'store/account.html', ctx)
@@ -238,16 +330,21 @@ def account_page(request):
 @login_required_view
 def my_orders_page(request):
     ctx = base_context(request)
-    ctx['orders'] = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = Order.objects.filter(user=request.user).prefetch_related('items')
+    ctx['orders'], next_cursor = keyset_page(
+        orders, ('-created_at', '-id'), request.GET.get('cursor'), page_size=ORDERS_PAGE_SIZE)
+    ctx['next_query'] = cursor_querystring(request, next_cursor) if next_cursor else ''
     return render(request, 'store/my_orders.html', ctx)
 
 
 @login_required_view
+@conditional(order_version)
 def order_detail_page(request, order_number):
     ctx = base_context(request)
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
     ctx['order'] = order
-    ctx['items'] = order.items.all().select_related('product')
+    # Link to the product's slug as it is now; the one copied at checkout may have changed
+    ctx['items'] = order.items.annotate(current_slug=F('product__slug'))
     ctx['tracking_steps'] = order.get_tracking_steps()
     return render(request, 'store/order_detail.html', ctx)
 
@@ -300,115 +397,178 @@ def change_password(request):
 
 
 # ===== API ENDPOINTS =====
+# The small JSON endpoints are async, so under ASGI (akvrix_project/asgi.py)
+# a request waiting on the database does not hold a worker. Under WSGI Django
+# runs them in an event loop per request. In async code ``request.user``
+# would query synchronously, so it is always read through ``request.auser()``.
 
 @require_POST
-def add_to_cart(request):
-    data = json.loads(request.body)
-    sk = get_session(request)
-    product = get_object_or_404(Product, id=data['product_id'])
-    user = request.user if request.user.is_authenticated else None
-    if user:
-        item, created = CartItem.objects.get_or_create(
-            user=user, product=product,
-            size=data.get('size', 'M'), color=data.get('color', '#000'),
-            defaults={'quantity': data.get('quantity', 1), 'session_key': sk}
-        )
-    else:
-        item, created = CartItem.objects.get_or_create(
-            session_key=sk, product=product,
-            size=data.get('size', 'M'), color=data.get('color', '#000'),
-            defaults={'quantity': data.get('quantity', 1)}
-        )
-    if not created:
-        item.quantity += data.get('quantity', 1)
-        item.save()
-    return JsonResponse({'success': True, 'cart_count': cart_count(request)})
+async def add_to_cart(request):
+    try:
+        # Same validation as an 'add' in a cart batch
+        [(_, (product_id, size, color), quantity)] = cart.parse([{**json.loads(request.body), 'op': 'add'}])
+    except (json.JSONDecodeError, TypeError, cart.InvalidOperation):
+        return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
+    quantity = min(quantity, MAX_QUANTITY)
+    product = await aget_object_or_404(Product, id=product_id)
+    user = await request.auser()
+    if not user.is_authenticated:
+        basket = Basket.from_request(request)
+        if not basket.add(product.id, size, color, quantity):
+            return JsonResponse({'success': False, 'error': 'Your cart is full.'})
+        response = JsonResponse({'success': True, 'cart_count': await acart_count(request, user)})
+        basket.save(response)
+        return response
+    lines = CartItem.objects.filter(user=user)
+    if not await lines.filter(product=product, size=size, color=color).aupdate(
+            quantity=Least(F('quantity') + quantity, MAX_QUANTITY)):
+        if await lines.acount() >= MAX_CART_LINES:
+            return JsonResponse({'success': False, 'error': 'Your cart is full.'})
+        await CartItem.objects.acreate(user=user, product=product, size=size, color=color,
+                                       quantity=quantity, session_key=await aget_session(request))
+    await ainvalidate_summary(user.pk)
+    return JsonResponse({'success': True, 'cart_count': await acart_count(request, user)})
 
 
 @require_POST
-def update_cart(request):
-    data = json.loads(request.body)
+async def update_cart(request):
+    user = await request.auser()
     try:
-        if request.user.is_authenticated:
-            item = CartItem.objects.get(id=data['item_id'], user=request.user)
-        else:
-            item = CartItem.objects.get(id=data['item_id'], session_key=get_session(request))
-        if data['action'] == 'increase':
-            item.quantity += 1
-            item.save()
-        elif data['action'] == 'decrease':
+        data = json.loads(request.body)
+        [(action, item_id, _)] = cart.parse([{'op': data['action'], 'item_id': data['item_id']}])
+        if action not in UPDATE_ACTIONS:
+            raise cart.InvalidOperation(f'Unknown action {action!r}.')
+        if user.is_authenticated:
+            item_id = int(item_id)
+    except (json.JSONDecodeError, TypeError, KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
+    if not user.is_authenticated:
+        basket = Basket.from_request(request)
+        basket.update(item_id, action)
+        response = JsonResponse({'success': True, 'cart_count': await acart_count(request, user)})
+        basket.save(response)
+        return response
+    try:
+        item = await CartItem.objects.aget(id=item_id, user=user)
+        if action == 'increase':
+            if item.quantity < MAX_QUANTITY:
+                item.quantity += 1
+                await item.asave()
+        elif action == 'decrease':
             if item.quantity > 1:
                 item.quantity -= 1
-                item.save()
+                await item.asave()
             else:
-                item.delete()
-        elif data['action'] == 'remove':
-            item.delete()
+                await item.adelete()
+        elif action == 'remove':
+            await item.adelete()
+        await ainvalidate_summary(user.pk)
     except CartItem.DoesNotExist:
         pass
-    return JsonResponse({'success': True, 'cart_count': cart_count(request)})
+    return JsonResponse({'success': True, 'cart_count': await acart_count(request, user)})
 
 
 @require_POST
-def toggle_wishlist(request):
-    data = json.loads(request.body)
-    product = get_object_or_404(Product, id=data['product_id'])
-    if request.user.is_authenticated:
-        wl, created = Wishlist.objects.get_or_create(
-            user=request.user, product=product,
-            defaults={'session_key': get_session(request)}
-        )
-    else:
-        sk = get_session(request)
-        wl, created = Wishlist.objects.get_or_create(
-            session_key=sk, product=product,
-        )
+async def toggle_wishlist(request):
+    try:
+        product_id = int(json.loads(request.body)['product_id'])
+    except (json.JSONDecodeError, TypeError, KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid data'}, status=400)
+    product = await aget_object_or_404(Product, id=product_id)
+    user = await request.auser()
+    if not user.is_authenticated:
+        basket = Basket.from_request(request)
+        response = JsonResponse({'success': True, 'added': basket.toggle_wishlist(product.id)})
+        basket.save(response)
+        return response
+    wl, created = await Wishlist.objects.aget_or_create(
+        user=user, product=product,
+        defaults={'session_key': await aget_session(request)}
+    )
     if not created:
-        wl.delete()
+        await wl.adelete()
+    await ainvalidate_summary(user.pk)
     return JsonResponse({'success': True, 'added': created})
 
 
+@require_POST
+def cart_batch(request):
+    """Apply a list of cart operations at once and return the repriced cart (see cart.py)."""
+    try:
+        operations = cart.parse(json.loads(request.body).get('operations'))
+    except (json.JSONDecodeError, AttributeError, cart.InvalidOperation) as exc:
+        error = str(exc) if isinstance(exc, cart.InvalidOperation) else 'Invalid data'
+        return JsonResponse({'success': False, 'error': error}, status=400)
+    if not request.user.is_authenticated:
+        basket = Basket.from_request(request)
+        state = cart.apply_to_basket(basket, operations)
+        response = JsonResponse({'success': True, 'cart_count': state['count'], 'cart': state})
+        basket.save(response)
+        return response
+    state = cart.apply(request.user, operations, get_session(request))
+    invalidate_summary(request)
+    return JsonResponse({'success': True, 'cart_count': state['count'], 'cart': state})
+
+
 @require_POST
 def place_order(request):
     data = json.loads(request.body)
-    sk = get_session(request)
-    if request.user.is_authenticated:
-        items = CartItem.objects.filter(user=request.user).select_related('product')
-    else:
-        items = CartItem.objects.filter(session_key=sk, user__isnull=True).select_related('product')
-    if not items:
+    customer = checkout.customer_fields(data)
+    if not request.user.is_authenticated:
+        # Guest checkout straight from the basket cookie
+        basket = Basket.from_request(request)
+        try:
+            order = checkout.place_guest_order(basket.lines, customer)
+        except checkout.EmptyCart:
+            return JsonResponse({'success': False, 'error': 'Cart is empty'})
+        except inventory.OutOfStock as exc:
+            return out_of_stock(exc)
+        basket.clear()
+        response = JsonResponse({'success': True, 'order_number': order.order_number})
+        basket.save(response)
+        return response
+    try:
+        order = checkout.place_order(
+            CartItem.objects.filter(user=request.user), customer,
+            user=request.user, session_key=get_session(request),
+        )
+    except checkout.EmptyCart:
         return JsonResponse({'success': False, 'error': 'Cart is empty'})
-    subtotal = sum(i.total for i in items)
-    shipping = 0 if subtotal > 150 else 12
-    order_num = 'AKV-' + ''.join(random.choices(string.digits, k=6))
-    order = Order.objects.create(
-        session_key=sk,
-        user=request.user if request.user.is_authenticated else None,
-        order_number=order_num,
-        first_name=data.get('first_name', ''), last_name=data.get('last_name', ''),
-        email=data.get('email', ''), phone=data.get('phone', ''),
-        address=data.get('address', ''), city=data.get('city', ''),
-        state=data.get('state', ''), zip_code=data.get('zip_code', ''),
-        country=data.get('country', 'India'), payment_method=data.get('payment_method', 'card'),
-        subtotal=subtotal, shipping=shipping, total=subtotal + shipping
-    )
-    for item in items:
-        OrderItem.objects.create(
-            order=order, product=item.product, product_name=item.product.name,
-            price=item.product.price, size=item.size, color=item.color, quantity=item.quantity
+    except inventory.OutOfStock as exc:
+        return out_of_stock(exc)
+    invalidate_summary(request)
+    return JsonResponse({'success': True, 'order_number': order.order_number})
+
+
+def out_of_stock(exc):
+    """The failed checkout's answer, naming what is short and how many are left."""
+    shortages = exc.shortages()
+    names = dict(Product.objects.filter(id__in={s[0] for s in shortages}).values_list('id', 'name'))
+    unavailable = [
+        {'product_id': p, 'name': names.get(p, ''), 'size': size, 'color': color,
+         'quantity': wanted, 'available': available}
+        for p, size, color, wanted, available in shortages
+    ]
+    if unavailable:
+        error = '; '.join(
+            f'{u["name"]} ({u["size"]}): ' + (f'only {u["available"]} left' if u['available'] else 'sold out')
+            for u in unavailable
         )
-    items.delete()
-    return JsonResponse({'success': True, 'order_number': order_num})
+    else:
+        # Restocked between the failed checkout and this read
+        error = 'Stock changed while you were checking out; please try again'
+    return JsonResponse({'success': False, 'error': error, 'unavailable': unavailable}, status=409)
 
 
 # ===== REVIEWS =====
 
 @login_required_view
 @require_POST
-def submit_review(request, slug):
-    product = get_object_or_404(Product, slug=slug)
+async def submit_review(request, slug):
+    product = await aget_object_or_404(Product, slug=slug)
+    user = await request.auser()
     # One review per user per product
-    if Review.objects.filter(user=request.user, product=product).exists():
+    if await Review.objects.filter(user=user, product=product).aexists():
         return JsonResponse({'success': False, 'error': 'You have already reviewed this product.'}, status=400)
     try:
         data = json.loads(request.body)
@@ -422,10 +582,10 @@ def submit_review(request, slug):
     if not text:
         return JsonResponse({'success': False, 'error': 'Review text is required'}, status=400)
 
-    name = request.user.get_full_name() or request.user.username
-    Review.objects.create(
+    name = user.get_full_name() or user.username
+    await Review.objects.acreate(
         product=product,
-        user=request.user,
+        user=user,
         name=name,
         rating=rating,
         text=text,
@@ -436,26 +596,27 @@ def submit_review(request, slug):
 # ===== ADDRESSES =====
 
 @login_required_view
-def address_list(request):
-    addrs = Address.objects.filter(user=request.user)
+async def address_list(request):
+    user = await request.auser()
     data = [{
         'id': a.id, 'label': a.label, 'full_name': a.full_name,
         'phone': a.phone, 'address_line': a.address_line,
         'city': a.city, 'state': a.state, 'pincode': a.pincode,
         'is_default': a.is_default,
-    } for a in addrs]
+    } async for a in Address.objects.filter(user=user)]
     return JsonResponse({'success': True, 'addresses': data})
 
 
 @login_required_view
 @require_POST
-def address_save(request):
+async def address_save(request):
     data = json.loads(request.body)
+    user = await request.auser()
     addr_id = data.get('id')
     if addr_id:
-        addr = get_object_or_404(Address, id=addr_id, user=request.user)
+        addr = await aget_object_or_404(Address, id=addr_id, user=user)
     else:
-        addr = Address(user=request.user)
+        addr = Address(user=user)
     addr.label = data.get('label', 'home')
     addr.full_name = data.get('full_name', '').strip()
     addr.phone = data.get('phone', '').strip()
@@ -467,34 +628,35 @@ def address_save(request):
         return JsonResponse({'success': False, 'error': 'All fields are required.'})
     is_default = data.get('is_default', False)
     if is_default:
-        Address.objects.filter(user=request.user).update(is_default=False)
+        await Address.objects.filter(user=user).aupdate(is_default=False)
         addr.is_default = True
-    elif not Address.objects.filter(user=request.user).exclude(id=addr.id if addr.id else 0).exists():
+    elif not await Address.objects.filter(user=user).exclude(id=addr.id if addr.id else 0).aexists():
         addr.is_default = True
-    addr.save()
+    await addr.asave()
     return JsonResponse({'success': True, 'id': addr.id})
 
 
 @login_required_view
 @require_POST
-def address_delete(request, address_id):
-    addr = get_object_or_404(Address, id=address_id, user=request.user)
+async def address_delete(request, address_id):
+    user = await request.auser()
+    addr = await aget_object_or_404(Address, id=address_id, user=user)
     was_default = addr.is_default
-    addr.delete()
+    await addr.adelete()
     if was_default:
-        first = Address.objects.filter(user=request.user).first()
+        first = await Address.objects.filter(user=user).afirst()
         if first:
             first.is_default = True
-            first.save()
+            await first.asave()
     return JsonResponse({'success': True})
 
 
 @login_required_view
 @require_POST
-def address_set_default(request, address_id):
-    addr = get_object_or_404(Address, id=address_id, user=request.user)
-    Address.objects.filter(user=request.user).update(is_default=False)
+async def address_set_default(request, address_id):
+    user = await request.auser()
+    addr = await aget_object_or_404(Address, id=address_id, user=user)
+    await Address.objects.filter(user=user).aupdate(is_default=False)
     addr.is_default = True
-    addr.save()
+    await addr.asave()
     return JsonResponse({'success': True})
-